@@ -1,4 +1,8 @@
+import numpy as np
+
 from sssg.custom_types import *
+from sssg.behavior import batch_version
+from sssg.models import EmpiricalBranchingFunction, TableTranspositionSpaceFunction
 
 
 def branching_function_midgame_heavy(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
@@ -14,11 +18,29 @@ def branching_function_midgame_heavy(randint: RandomIntFunction, randf: RandomFl
     return branching_factor
 
 
+@batch_version(branching_function_midgame_heavy)
+def branching_function_midgame_heavy_batch(randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of branching_function_midgame_heavy."""
+    x = 2 * params.self.depth / params.globals.max_depth
+    y = -(x-1)**2 + 1
+    branching_factor = y * params.globals.branching_factor_base
+    variance = (randf() - 0.5) * 2 * params.globals.branching_factor_variance
+    branching_factor = np.maximum(0, branching_factor + np.round(variance)).astype(np.int64)
+    shallow = params.self.depth < params.globals.terminal_minimum_depth
+    return np.where(shallow, np.minimum(1, branching_factor), branching_factor)
+
+
 def branching_function_simple_constant(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
     """Generates a tree with a constant branching factor."""
     return params.globals.branching_factor_base
 
 
+@batch_version(branching_function_simple_constant)
+def branching_function_simple_constant_batch(randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of branching_function_simple_constant."""
+    return np.full(len(params.self.depth), params.globals.branching_factor_base, dtype=np.int64)
+
+
 def child_depth_function_random(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
     """Generate children at any random depth."""
     return randint(low=0, high=params.globals.max_depth)
@@ -45,6 +67,15 @@ def branching_function_tictactoe(randint: RandomIntFunction, randf: RandomFloatF
     return 9 - params.self.depth
 
 
+@batch_version(branching_function_tictactoe)
+def branching_function_tictactoe_batch(randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of branching_function_tictactoe. Only states past the terminal minimum
+    depth draw, like in the scalar version."""
+    late = params.self.depth >= params.globals.terminal_minimum_depth
+    terminal = late & (randf(where=late) < params.globals.terminal_chance)
+    return np.where(terminal, 0, 9 - params.self.depth)
+
+
 def branching_function_connect_four_complex(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
     """Approximates the branching factor of the real Connect-4 game tree using hard-coded
     statistics gathered from analysis of actual game data.
@@ -86,6 +117,33 @@ def branching_function_connect_four_complex(randint: RandomIntFunction, randf: R
     return 7
 
 
+# thresholds of branching_function_connect_four_complex below which a random number leads to
+# 6 and 0 children, indexed by depth (the last entry applies to all deeper states)
+CONNECT_FOUR_SIX_THRESHOLDS = np.array([-1.0] * 6 + [
+    7/(7+16415),
+    294/(294+728+53837),
+    4326/(4326+1892+178057),
+    31984/(31984+19412+506790),
+    157734/(157734+4425+1460664)])
+CONNECT_FOUR_ZERO_THRESHOLDS = np.array([-1.0] * 6 + [
+    7/(7+16415),
+    (294+728)/(294+728+53837),
+    (4326+1892)/(4326+1892+178057),
+    (31984+19412)/(31984+19412+506790),
+    (157734+44225)/(157734+44225+1460664)])
+
+
+@batch_version(branching_function_connect_four_complex)
+def branching_function_connect_four_complex_batch(randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of branching_function_connect_four_complex, looking the thresholds of
+    every state's depth up in a table."""
+    rand_num = randf()
+    depth = np.minimum(params.self.depth, len(CONNECT_FOUR_SIX_THRESHOLDS) - 1)
+    six = rand_num < CONNECT_FOUR_SIX_THRESHOLDS[depth]
+    zero = rand_num < CONNECT_FOUR_ZERO_THRESHOLDS[depth]
+    return np.where(six, 6, np.where(zero, 0, 7))
+
+
 def transposition_space_function_connect_four_complex(randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
     """Uses the statistics from the real game to explicitly make the transpositon space 
     behave correctly in the synthetic game graph. Only has information on the first 10 
@@ -113,4 +171,17 @@ def transposition_space_function_connect_four_simple(randint: RandomIntFunction,
     if depth <= 1:
         return globals.max_transposition_space_size # No transpositions when depth < 2
     else:
-        return (4 ** (depth - 2)) * (7 ** 2)
\ No newline at end of file
+        return (4 ** (depth - 2)) * (7 ** 2)
+
+
+"""The Connect-4 statistics above, compiled into constant time samplers. Histograms of any
+size, e.g. mined from a game database, can be plugged in the same way."""
+branching_function_connect_four_model = EmpiricalBranchingFunction({
+    0: {7: 1},
+    6: {7: 16415, 6: 7},
+    7: {7: 53837, 6: 294, 0: 728},
+    8: {7: 178057, 6: 4326, 0: 1892},
+    9: {7: 506790, 6: 31984, 0: 19412},
+    10: {7: 1460664, 6: 157734, 0: 44225}})
+transposition_space_function_connect_four_model = TableTranspositionSpaceFunction({
+    0: 1, 1: None, 2: None, 3: 438, 4: 1950, 5: 5708, 6: 22209, 7: 66822, 8: 227191, 9: 649959, 10: 1662623})
@@ -37,6 +37,13 @@ state = SyntheticGraph(
     transposition_space_function=transposition_space_function_connect_four_complex)
 
 
+"""The same statistics as constant time samplers built by sssg.models."""
+state = SyntheticGraph(
+    max_depth=42,
+    branching_function=branching_function_connect_four_model,
+    transposition_space_function=transposition_space_function_connect_four_model)
+
+
 """Example implementation of a "P-game with critical moves" as described in 
 "Lookahead Pathology in Monte-Carlo Tree Search" By Nguyen and Ramanujan."""
 state = SyntheticGraph(
@@ -5,6 +5,7 @@ setup(
     version="1.0",
     packages=find_packages(),
     install_requires=[
-        "mmh3"
+        "mmh3",
+        "numpy",
     ],
 )
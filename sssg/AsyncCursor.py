@@ -0,0 +1,266 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Protocol
+import asyncio
+import time
+import numpy as np
+
+from .SyntheticGraph import SyntheticGraph
+from .StateNode import StateNode, execute_randomness_dependant_functions_batch
+from .OpeningBook import _init_worker, _expand_worker
+from .custom_types import Expansion
+
+
+LATENCY_BUCKET_COUNT = 32 # bucket i holds latencies in [2**(i-1), 2**i) microseconds, the last one everything longer
+
+
+class ExpansionBackend(Protocol):
+    """Computes the requests of a batch. `evaluate` must leave every state with its branching
+    factor and heuristic value, `expand` with its children as well."""
+    async def evaluate(self, nodes: list[StateNode]) -> None: ...
+    async def expand(self, nodes: list[StateNode]) -> None: ...
+
+
+class LocalBackend():
+    """Computes batches in the calling process, through the batch versions of the behavior
+    functions where they have them (see `behavior.batch_version`)."""
+    async def evaluate(self, nodes: list[StateNode]) -> None:
+        execute_randomness_dependant_functions_batch(nodes)
+
+    async def expand(self, nodes: list[StateNode]) -> None:
+        execute_randomness_dependant_functions_batch(nodes)
+        for node in nodes:
+            node._generate_children()
+
+
+class ProcessBackend():
+    """Computes batches in a pool of worker processes, each holding a copy of `graph`, and
+    loads the expansions they return. Custom behavior functions must be picklable."""
+    def __init__(self, graph: SyntheticGraph, workers: int=2, chunk_size: int=64):
+        if not workers > 0:
+            raise ValueError("workers must be > 0.")
+        if not chunk_size > 0:
+            raise ValueError("chunk_size must be > 0.")
+        self.chunk_size = chunk_size
+        self._executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph,))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    async def evaluate(self, nodes: list[StateNode]) -> None:
+        await self.expand([node for node in nodes if not node._random_values_generated])
+
+    async def expand(self, nodes: list[StateNode]) -> None:
+        # states which already have some children continue generating them locally
+        remote = [node for node in nodes if not node._children]
+        chunks = [remote[i:i+self.chunk_size] for i in range(0, len(remote), self.chunk_size)]
+        results = await asyncio.gather(*[
+            asyncio.wrap_future(self._executor.submit(_expand_worker, [node.id for node in chunk])) for chunk in chunks])
+        for chunk, expansions in zip(chunks, results):
+            for node, expansion in zip(chunk, expansions):
+                _load_remote_expansion(node, expansion)
+        for node in nodes:
+            node._generate_children()
+
+
+def _load_remote_expansion(node: StateNode, expansion: Expansion) -> None:
+    """Load an expansion computed elsewhere, unless the state generated children meanwhile."""
+    if node._children or node._children_generated:
+        return
+    node._random_values_generated = True
+    node._load_expansion(expansion)
+
+
+@dataclass
+class Request:
+    node: StateNode
+    waiting: list[tuple["asyncio.Future[None]", float]] = field(default_factory=list) # futures and start times
+
+
+@dataclass
+class SchedulerStats:
+    requests: int
+    batches: int
+    batch_sizes: np.ndarray # number of batches of each size, indexed by size
+    latencies: np.ndarray # number of requests per latency bucket, see LATENCY_BUCKET_COUNT
+
+    def mean_batch_size(self) -> float:
+        """Mean number of distinct states per batch (requests for the same state share it)."""
+        return float(self.batch_sizes @ np.arange(len(self.batch_sizes))) / self.batches if self.batches else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Return an upper bound of the given latency percentile in seconds, from the buckets."""
+        if not self.requests:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(self.latencies), percentile / 100 * self.requests))
+        return 2.0**min(bucket, LATENCY_BUCKET_COUNT - 1) / 1e6
+
+
+class ExpansionScheduler():
+    """Gathers the evaluation and expansion requests of many coroutines, and hands them to
+    `backend` in batches. A batch is dispatched once it holds `max_batch_size` states, or
+    `max_wait` seconds after its first request. With the default `max_wait` of 0, it is
+    dispatched as soon as every coroutine which is ready to run has run, so coroutines
+    which advance in lockstep always share their batches.
+
+    Must be used from a single event loop. Sizes of the dispatched batches and latencies of
+    the requests (from the request to its result) are kept in histograms, see `stats()`."""
+    def __init__(self, backend: ExpansionBackend|None=None, max_batch_size: int=256, max_wait: float=0.0):
+        if not max_batch_size > 0:
+            raise ValueError("max_batch_size must be > 0.")
+        if not max_wait >= 0:
+            raise ValueError("max_wait must be >= 0.")
+        self.backend: ExpansionBackend = backend if backend is not None else LocalBackend()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # pending states of each kind of request by object id (states compare by state id), with
+        # the futures and start times of their requests
+        self._pending: dict[str, dict[int, Request]] = {"evaluate": {}, "expand": {}}
+        self._pending_count = 0
+        self._timer: asyncio.Handle|None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes = np.zeros(max_batch_size + 1, dtype=np.int64)
+        self._latencies = np.zeros(LATENCY_BUCKET_COUNT, dtype=np.int64)
+
+    def stats(self) -> SchedulerStats:
+        return SchedulerStats(self._requests, self._batches, self._batch_sizes.copy(), self._latencies.copy())
+
+    async def evaluate(self, nodes: list[StateNode]) -> None:
+        """Wait until every state has its branching factor and heuristic value."""
+        await self._request("evaluate", [node for node in nodes if not node._random_values_generated])
+
+    async def expand(self, nodes: list[StateNode]) -> None:
+        """Wait until every state has all its children (terminal states have none)."""
+        await self._request("expand", [node for node in nodes if not node._children_generated
+                                       and not (node._random_values_generated and node.is_terminal())])
+
+    async def _request(self, kind: str, nodes: list[StateNode]) -> None:
+        if not nodes:
+            return
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        futures: list[asyncio.Future[None]] = []
+        for node in nodes:
+            future: asyncio.Future[None] = loop.create_future()
+            request = self._pending[kind].get(id(node))
+            if request is None:
+                request = self._pending[kind][id(node)] = Request(node)
+                self._pending_count += 1
+            request.waiting.append((future, now))
+            futures.append(future)
+            if self._pending_count >= self.max_batch_size:
+                self._dispatch()
+        if self._pending_count and self._timer is None:
+            if self.max_wait > 0:
+                self._timer = loop.call_later(self.max_wait, self._dispatch)
+            else:
+                self._timer = loop.call_soon(self._dispatch)
+        await asyncio.gather(*futures)
+
+    def _dispatch(self) -> None:
+        """Hand everything pending to the backend, as one batch per kind of request."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {"evaluate": {}, "expand": {}}
+        self._pending_count = 0
+        for kind, requests in pending.items():
+            if requests:
+                task = asyncio.ensure_future(self._run(kind, requests))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, kind: str, requests: dict[int, "Request"]) -> None:
+        nodes = [request.node for request in requests.values()]
+        try:
+            if kind == "evaluate":
+                await self.backend.evaluate(nodes)
+            else:
+                await self.backend.expand(nodes)
+        except Exception as error:
+            for request in requests.values():
+                for future, _ in request.waiting:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+        now = time.perf_counter()
+        self._batches += 1
+        self._batch_sizes[len(nodes)] += 1
+        for request in requests.values():
+            for future, start in request.waiting:
+                self._requests += 1
+                microseconds = int((now - start) * 1e6)
+                self._latencies[min(microseconds.bit_length(), LATENCY_BUCKET_COUNT - 1)] += 1
+                if not future.done():
+                    future.set_result(None)
+
+
+class AsyncCursor():
+    """A cursor for coroutines, whose evaluations and expansions are gathered by a scheduler
+    into batches shared with every other cursor on it. Each cursor moves a fork of `graph`,
+    so that cursors share the states generated so far:
+
+        scheduler = ExpansionScheduler(max_batch_size=512)
+        async def game(seed):
+            cursor = AsyncCursor(graph, scheduler)
+            while not await cursor.is_terminal():
+                actions = await cursor.actions()
+                cursor.make(random.Random(seed).choice(actions))
+            return cursor.true_value()
+        await asyncio.gather(*(game(seed) for seed in range(1000)))
+
+    Methods which might evaluate or expand a state are coroutines, the others are the
+    graph's own. `graph` holds the underlying cursor, for anything else."""
+    def __init__(self, graph: SyntheticGraph, scheduler: ExpansionScheduler):
+        self.graph = graph.fork()
+        self.scheduler = scheduler
+
+    async def _evaluated(self) -> StateNode:
+        node = self.graph._owned_current()
+        if not node._random_values_generated:
+            await self.scheduler.evaluate([node])
+        return node
+
+    async def is_terminal(self) -> bool:
+        await self._evaluated()
+        return self.graph.is_terminal()
+
+    async def heuristic(self) -> float:
+        await self._evaluated()
+        return self.graph.heuristic_value()
+
+    async def actions(self) -> list[int]:
+        node = self.graph._owned_current()
+        if not node._children_generated:
+            await self.scheduler.expand([node])
+        return self.graph.actions()
+
+    async def child_heuristics(self) -> list[float]:
+        """Return the heuristic values of the current state's children, indexed by action."""
+        node = self.graph._owned_current()
+        if not node._children_generated:
+            await self.scheduler.expand([node])
+        await self.scheduler.evaluate(node.children)
+        return self.graph.child_heuristics()
+
+    def make(self, action: int) -> "AsyncCursor":
+        self.graph.make(action)
+        return self
+
+    def undo(self) -> "AsyncCursor":
+        self.graph.undo()
+        return self
+
+    def id(self) -> int:
+        return self.graph.id()
+
+    def depth(self) -> int:
+        return self.graph.depth()
+
+    def true_value(self) -> int:
+        return self.graph.true_value()
+
+    def path(self) -> list[int]:
+        return self.graph.path()
@@ -0,0 +1,237 @@
+from dataclasses import dataclass, field, asdict
+from typing import Any, Iterable, Iterator
+import copy
+import heapq
+import json
+import os
+import numpy as np
+
+from .SyntheticGraph import SyntheticGraph
+from .utils import extract_depth_from_id
+
+
+WORD_MASK = 2**64 - 1
+RECORD_DTYPE = np.dtype([("id_hi", ">u8"), ("id_lo", ">u8")]) # 16 byte big-endian ids, so files sort bytewise
+MANIFEST = "manifest.json"
+# bytes of memory needed per buffered child id: the Python int and its list slot while
+# expanding, then the split words, the sort permutation, the sorted words and the record
+RUN_BYTES_PER_ID = 56 + 16 + 8 + 16 + RECORD_DTYPE.itemsize
+# bytes of memory needed per id read from a file: the record, and the Python ints and list
+# slots of its two words while decoding
+READ_BYTES_PER_ID = RECORD_DTYPE.itemsize + 2 * (32 + 8)
+READ_SHARE = 8 # an expansion reads its level with 1/READ_SHARE of the memory limit
+
+
+@dataclass
+class BFSLevel:
+    ply: int
+    states: int # distinct states first reached at this ply
+    terminals: int|None = None # known once the level has been expanded
+    depths: list[int] = field(default_factory=list) # depths of the states of this level, one file each
+
+
+def _level_path(directory: str, ply: int, depth: int) -> str:
+    return os.path.join(directory, f"level_{ply:06d}_{depth:06d}.bin")
+
+def _run_path(directory: str, ply: int, depth: int, run: int) -> str:
+    return os.path.join(directory, f"run_{ply:06d}_{depth:06d}_{run:06d}.bin")
+
+
+def _write_ids(path: str, id_hi: np.ndarray, id_lo: np.ndarray, append: bool=False) -> None:
+    records = np.empty(len(id_hi), dtype=RECORD_DTYPE)
+    records["id_hi"], records["id_lo"] = id_hi, id_lo
+    with open(path, "ab" if append else "wb") as file:
+        records.tofile(file)
+
+
+def _read_ids(path: str, block_size: int) -> Iterator[int]:
+    """Stream the ids of a file in blocks of `block_size` records."""
+    with open(path, "rb") as file:
+        while block := file.read(block_size * RECORD_DTYPE.itemsize):
+            records = np.frombuffer(block, dtype=RECORD_DTYPE)
+            for id_hi, id_lo in zip(records["id_hi"].tolist(), records["id_lo"].tolist()):
+                yield (id_hi << 64) | id_lo
+
+
+class _IdWriter():
+    """Buffered writer of sorted ids to a level file."""
+    def __init__(self, path: str, block_size: int):
+        self.path = path
+        self.count = 0
+        self._block_size = block_size
+        self._buffer: list[int] = []
+        open(path, "wb").close()
+
+    def write(self, state_id: int) -> None:
+        self._buffer.append(state_id)
+        self.count += 1
+        if len(self._buffer) >= self._block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            _write_ids(self.path, np.array([state_id >> 64 for state_id in self._buffer], dtype=np.uint64),
+                       np.array([state_id & WORD_MASK for state_id in self._buffer], dtype=np.uint64), append=True)
+            self._buffer.clear()
+
+
+class ExternalBFS():
+    """Breadth-first enumeration of every state reachable from a graph's current state,
+    keeping the levels on disk instead of in memory. Level k holds the distinct states whose
+    shortest path from the start state is k plies long.
+
+    Levels and runs are partitioned by the depth encoded in the ids, since states of
+    different depths can never be equal. Each level is expanded into sorted run files of child
+    ids, one per depth. The runs of each depth are then merged, deduplicated and filtered
+    against the previous levels' files of the same depth in a single streaming pass, producing
+    the next level. Unless children can skip depths, no depth appears in more than one level,
+    so every id is written and read back a constant number of times. Since ids are stored as
+    16 byte big-endian records, files sort the same way as ids. The read blocks and buffers
+    of both passes fit in `memory_limit` bytes.
+
+    Progress is recorded in a manifest at every level boundary. Running again on the same
+    directory resumes after the last completed level, provided the graph is constructed
+    with the same parameters and behavior functions."""
+    def __init__(self, graph: SyntheticGraph, directory: str, memory_limit: int=2**28):
+        self.directory = directory
+        self._graph = copy.copy(graph)
+        self._depth_bit_length = graph.globals.vars.max_depth.bit_length()
+        self._read_block_size = memory_limit // READ_SHARE // READ_BYTES_PER_ID
+        self._run_capacity = (memory_limit - self._read_block_size * READ_BYTES_PER_ID) // RUN_BYTES_PER_ID
+        if not self._read_block_size > 0:
+            raise ValueError(f"memory_limit must be >= {READ_SHARE * READ_BYTES_PER_ID}.")
+        self._memory_limit = memory_limit
+        os.makedirs(directory, exist_ok=True)
+        self._parameters: dict[str, Any] = {
+            "start_id": str(graph.id()),
+            "globals": json.loads(json.dumps(asdict(graph.globals.vars), default=str)),
+        }
+        self.levels = self._load_manifest()
+
+    def _load_manifest(self) -> list[BFSLevel]:
+        """Return the completed levels of an earlier run, or start a new one."""
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            depth = self._depth(self._graph.id())
+            _write_ids(_level_path(self.directory, 0, depth), np.array([self._graph.id() >> 64], dtype=np.uint64),
+                       np.array([self._graph.id() & WORD_MASK], dtype=np.uint64))
+            levels = [BFSLevel(ply=0, states=1, depths=[depth])]
+            self._save_manifest(levels)
+            return levels
+        with open(path) as file:
+            manifest = json.load(file)
+        if manifest["parameters"] != self._parameters:
+            raise ValueError(f"{self.directory} holds an enumeration of a different graph or start state.")
+        return [BFSLevel(**level) for level in manifest["levels"]]
+
+    def _save_manifest(self, levels: list[BFSLevel]) -> None:
+        """Atomically replace the manifest."""
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"parameters": self._parameters, "levels": [asdict(level) for level in levels]}, file)
+        os.replace(path + ".tmp", path)
+
+    def _depth(self, state_id: int) -> int:
+        return extract_depth_from_id(state_id, self._depth_bit_length)
+
+    def _read_level(self, level: BFSLevel, block_size: int) -> Iterator[int]:
+        """Stream the sorted ids of a level, merging its files of every depth."""
+        return heapq.merge(*[_read_ids(_level_path(self.directory, level.ply, depth), block_size)
+                             for depth in level.depths])
+
+    def _write_runs(self, ply: int, runs: dict[int, int], buffers: dict[int, list[int]]) -> None:
+        """Write each depth's buffered child ids as a sorted run, and empty the buffers."""
+        for depth, child_ids in buffers.items():
+            id_hi = np.array([child_id >> 64 for child_id in child_ids], dtype=np.uint64)
+            id_lo = np.array([child_id & WORD_MASK for child_id in child_ids], dtype=np.uint64)
+            order = np.lexsort((id_lo, id_hi))
+            run = runs.get(depth, 0)
+            _write_ids(_run_path(self.directory, ply, depth, run), id_hi[order], id_lo[order])
+            runs[depth] = run + 1
+        buffers.clear()
+
+    def _expand(self, level: BFSLevel) -> tuple[int, dict[int, int]]:
+        """Expand a level into sorted runs of child ids. Returns the number of terminals, and
+        the number of runs per child depth."""
+        terminals, runs = 0, {}
+        buffers: dict[int, list[int]] = {}
+        buffered = 0
+        for name in os.listdir(self.directory): # left behind by an interrupted expansion
+            if name.startswith(f"run_{level.ply:06d}_"):
+                os.remove(os.path.join(self.directory, name))
+        for state_id in self._read_level(level, max(1, self._read_block_size // len(level.depths))):
+            graph = self._graph.set_root(state_id)
+            if graph.is_terminal():
+                terminals += 1
+                continue
+            for child_id in dict.fromkeys(graph.child_ids()):
+                buffers.setdefault(self._depth(child_id), []).append(child_id)
+                buffered += 1
+            if buffered >= self._run_capacity:
+                self._write_runs(level.ply, runs, buffers)
+                buffered = 0
+        self._write_runs(level.ply, runs, buffers)
+        return terminals, runs
+
+    def _merge_depth(self, ply: int, depth: int, runs: int) -> int:
+        """Merge the runs of one depth into the next level's file of that depth, dropping
+        duplicates and states of earlier levels. Returns the number of states written."""
+        earlier = [level.ply for level in self.levels if depth in level.depths]
+        # each file read and the writer get an equal share of the memory limit
+        share = self._memory_limit // (runs + len(earlier) + 1)
+        block_size = max(1, share // READ_BYTES_PER_ID)
+        candidates = heapq.merge(*[_read_ids(_run_path(self.directory, ply, depth, run), block_size) for run in range(runs)])
+        seen: Iterator[int] = heapq.merge(*[_read_ids(_level_path(self.directory, level, depth), block_size) for level in earlier])
+        writer = _IdWriter(_level_path(self.directory, ply + 1, depth) + ".tmp", max(1, share // RUN_BYTES_PER_ID))
+        next_seen = next(seen, None)
+        previous = None
+        for state_id in candidates:
+            if state_id == previous:
+                continue
+            previous = state_id
+            while next_seen is not None and next_seen < state_id:
+                next_seen = next(seen, None)
+            if next_seen != state_id:
+                writer.write(state_id)
+        writer.flush()
+        if writer.count > 0:
+            os.replace(writer.path, _level_path(self.directory, ply + 1, depth))
+        else:
+            os.remove(writer.path)
+        for run in range(runs):
+            os.remove(_run_path(self.directory, ply, depth, run))
+        return writer.count
+
+    def _merge(self, ply: int, runs: dict[int, int]) -> BFSLevel:
+        """Merge the runs of a level into the next level, one depth at a time."""
+        next_level = BFSLevel(ply=ply + 1, states=0)
+        for depth in sorted(runs):
+            states = self._merge_depth(ply, depth, runs[depth])
+            if states > 0:
+                next_level.states += states
+                next_level.depths.append(depth)
+        return next_level
+
+    def done(self) -> bool:
+        """Return true once every reachable state has been enumerated."""
+        return self.levels[-1].terminals is not None
+
+    def run(self, max_plies: int|None=None) -> list[BFSLevel]:
+        """Enumerate until the search is exhausted, or until `max_plies` more levels have been
+        expanded. Returns all levels so far."""
+        expanded = 0
+        while not self.done() and (max_plies is None or expanded < max_plies):
+            terminals, runs = self._expand(self.levels[-1])
+            next_level = self._merge(self.levels[-1].ply, runs)
+            self.levels[-1].terminals = terminals
+            if next_level.states > 0:
+                self.levels.append(next_level)
+            self._save_manifest(self.levels)
+            expanded += 1
+        return self.levels
+
+    def level(self, ply: int) -> Iterable[int]:
+        """Stream the sorted ids of a completed level."""
+        if not 0 <= ply < len(self.levels):
+            raise ValueError(f"Level {ply} has not been enumerated.")
+        return self._read_level(self.levels[ply], max(1, self._read_block_size // len(self.levels[ply].depths)))
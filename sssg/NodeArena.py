@@ -0,0 +1,173 @@
+from typing import TYPE_CHECKING
+import numpy as np
+
+from .custom_types import Expansion
+from .constants import ID_TRUE_VALUE_BIT_LENGTH, ID_PLAYER_BIT_LENGTH
+if TYPE_CHECKING:
+    from .SyntheticGraph import SyntheticGraph
+
+
+WORD_MASK = 2**64 - 1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # 2**64 / golden ratio, spreads clustered ids over the table
+NO_HANDLE = -1
+UNEXPANDED = -1 # branching factor of states which are known as children, but were not expanded
+MAX_LOAD_FACTOR = 0.5
+HI_WORD_BIT_LENGTH = 63 # the high word holds the top 63 bits of a 127 bit id
+
+NODE_DTYPE = np.dtype([
+    ("id_hi", np.uint64),
+    ("id_lo", np.uint64),
+    ("branching_factor", np.int64),
+    ("heuristic_value", np.float64),
+    ("child_offset", np.int64),
+    ("child_count", np.int32),
+])
+
+
+class NodeArena():
+    """Expansion cache keeping the expansion of every state a graph expands in growable typed
+    arrays, so that they can be exported in bulk and revisited states are served without
+    running the behavior functions. The arena is kept in addition to the graph's StateNodes,
+    not in place of them: cursors still create StateNode objects along their paths, and an
+    attached arena adds about 50 bytes plus 8 per child for each expansion it holds.
+
+    A state is referenced by an integer handle, its row in the arrays, and children are
+    stored as the handles of their rows. Children get a row as soon as they appear in an
+    expansion, and their expansion is filled in once they are expanded themselves.
+
+    Handles are found through an open-addressed table of ids, which doubles in size when it
+    is half full. All arrays can be read directly (see `nodes` and `children`) for bulk
+    export, and true values, players and depths are decoded from the ids in bulk."""
+    def __init__(self, capacity: int=2**12):
+        if not capacity > 0:
+            raise ValueError("capacity must be > 0.")
+        self.size = 0 # rows in use
+        self.expanded = 0
+        self._nodes = np.empty(capacity, dtype=NODE_DTYPE)
+        self._children = np.empty(capacity, dtype=np.int64)
+        self._children_used = 0
+        self._table = np.full(2 * capacity, NO_HANDLE, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.expanded
+
+    @property
+    def nodes(self) -> np.ndarray:
+        """The rows in use, indexed by handle."""
+        return self._nodes[:self.size]
+
+    @property
+    def children(self) -> np.ndarray:
+        """Child handles; the children of a row are `children[child_offset:child_offset+child_count]`."""
+        return self._children[:self._children_used]
+
+    @property
+    def nbytes(self) -> int:
+        return self._nodes.nbytes + self._children.nbytes + self._table.nbytes
+
+    def _probe_start(self, id_hi: int, id_lo: int) -> int:
+        """Return the table slot at which probing for a state id begins."""
+        mixed = ((id_hi * HASH_MULTIPLIER) ^ id_lo) * HASH_MULTIPLIER & WORD_MASK
+        return (mixed >> 32) % len(self._table)
+
+    def _find(self, id_hi: int, id_lo: int) -> tuple[int, int]:
+        """Return the handle of a state id, or NO_HANDLE, and the table slot where probing stopped."""
+        table, nodes = self._table, self._nodes
+        slot = self._probe_start(id_hi, id_lo)
+        while True:
+            handle = int(table[slot])
+            if handle == NO_HANDLE or (nodes[handle]["id_lo"] == id_lo and nodes[handle]["id_hi"] == id_hi):
+                return handle, slot
+            slot = (slot + 1) % len(table)
+
+    def _grow_table(self) -> None:
+        """Double the table and reinsert every row."""
+        self._table = np.full(2 * len(self._table), NO_HANDLE, dtype=np.int64)
+        for handle, (id_hi, id_lo) in enumerate(zip(self.nodes["id_hi"].tolist(), self.nodes["id_lo"].tolist())):
+            _, slot = self._find(id_hi, id_lo)
+            self._table[slot] = handle
+
+    def _intern(self, state_id: int) -> int:
+        """Return the handle of a state id, adding an unexpanded row if there is none."""
+        id_hi, id_lo = state_id >> 64, state_id & WORD_MASK
+        handle, slot = self._find(id_hi, id_lo)
+        if handle != NO_HANDLE:
+            return handle
+        if self.size == len(self._nodes):
+            self._nodes = np.resize(self._nodes, 2 * len(self._nodes))
+        handle = self.size
+        self._nodes[handle] = (id_hi, id_lo, UNEXPANDED, 0.0, 0, 0)
+        self._table[slot] = handle
+        self.size += 1
+        if self.size > MAX_LOAD_FACTOR * len(self._table):
+            self._grow_table()
+        return handle
+
+    def handle(self, state_id: int) -> int|None:
+        """Return the handle of a state id, if the state is in the arena."""
+        handle, _ = self._find(state_id >> 64, state_id & WORD_MASK)
+        return None if handle == NO_HANDLE else handle
+
+    def state_id(self, handle: int) -> int:
+        node = self._nodes[handle]
+        return (int(node["id_hi"]) << 64) | int(node["id_lo"])
+
+    def is_expanded(self, handle: int) -> bool:
+        return int(self._nodes[handle]["branching_factor"]) != UNEXPANDED
+
+    def child_handles(self, handle: int) -> np.ndarray:
+        """Return the handles of a row's children, indexed by action."""
+        node = self._nodes[handle]
+        offset = int(node["child_offset"])
+        return self._children[offset:offset+int(node["child_count"])]
+
+    def lookup(self, state_id: int) -> Expansion|None:
+        """Return the expansion of `state_id`, if it has been expanded."""
+        handle = self.handle(state_id)
+        if handle is None or not self.is_expanded(handle):
+            return None
+        node = self._nodes[handle]
+        children = self._nodes[self.child_handles(handle)]
+        return Expansion(
+            branching_factor=int(node["branching_factor"]),
+            heuristic_value=float(node["heuristic_value"]),
+            child_ids=[(hi << 64) | lo for hi, lo in zip(children["id_hi"].tolist(), children["id_lo"].tolist())])
+
+    def store(self, state_id: int, expansion: Expansion) -> None:
+        """Fill in the expansion of a state, unless it has been expanded already."""
+        handle = self._intern(state_id)
+        if self.is_expanded(handle):
+            return
+        child_handles = [self._intern(child_id) for child_id in expansion.child_ids]
+        offset = self._children_used
+        if offset + len(child_handles) > len(self._children):
+            self._children = np.resize(self._children, max(2 * len(self._children), offset + len(child_handles)))
+        self._children[offset:offset+len(child_handles)] = child_handles
+        self._children_used += len(child_handles)
+        self._nodes[handle] = (state_id >> 64, state_id & WORD_MASK, expansion.branching_factor,
+                               expansion.heuristic_value, offset, len(child_handles))
+        self.expanded += 1
+
+    def recompute_heuristics(self, graph: "SyntheticGraph") -> None:
+        """Overwrite the heuristic values of all expanded rows with those of `graph`, which
+        must only differ from the arena's graph in its heuristic parameters."""
+        handles = np.flatnonzero(self.nodes["branching_factor"] != UNEXPANDED)
+        state_ids = [self.state_id(handle) for handle in handles.tolist()]
+        self._nodes["heuristic_value"][handles] = graph.recompute_heuristic_values(
+            self, state_ids, self._nodes["branching_factor"][handles])
+
+    def true_values(self) -> np.ndarray:
+        """Decode the true values of all rows from their ids."""
+        shift = HI_WORD_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH
+        return (self.nodes["id_hi"] >> np.uint64(shift)).astype(np.int8) - 1
+
+    def players(self) -> np.ndarray:
+        """Decode the players (as Player values) of all rows from their ids."""
+        shift = HI_WORD_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH - ID_PLAYER_BIT_LENGTH
+        return ((self.nodes["id_hi"] >> np.uint64(shift)) & np.uint64(1)).astype(np.int8)
+
+    def depths(self, max_depth: int) -> np.ndarray:
+        """Decode the depths of all rows from their ids, given the graph's `max_depth`."""
+        shift = HI_WORD_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH - ID_PLAYER_BIT_LENGTH - max_depth.bit_length()
+        mask = np.uint64(2**max_depth.bit_length() - 1)
+        return ((self.nodes["id_hi"] >> np.uint64(shift)) & mask).astype(np.int64)
@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+import copy
+import numpy as np
+
+from .custom_types import Expansion
+if TYPE_CHECKING:
+    from .SyntheticGraph import SyntheticGraph
+
+
+WORD_MASK = 2**64 - 1
+CHUNK_SIZE = 256 # states expanded per task when building with several processes
+
+
+def _split_ids(state_ids: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    return (np.array([state_id >> 64 for state_id in state_ids], dtype=np.uint64),
+            np.array([state_id & WORD_MASK for state_id in state_ids], dtype=np.uint64))
+
+
+def _keys(id_hi: np.ndarray, id_lo: np.ndarray) -> np.ndarray:
+    """Return ids as records which compare like the ids themselves."""
+    keys = np.empty(len(id_hi), dtype=[("id_hi", np.uint64), ("id_lo", np.uint64)])
+    keys["id_hi"], keys["id_lo"] = id_hi, id_lo
+    return keys
+
+
+def _expand(graph: "SyntheticGraph", state_ids: list[int]) -> list[Expansion]:
+    expansions: list[Expansion] = []
+    for state_id in state_ids:
+        expansions.append(graph.set_root(state_id).expansion())
+    return expansions
+
+
+_worker_graph: "SyntheticGraph|None" = None
+def _init_worker(graph: "SyntheticGraph"):
+    global _worker_graph
+    _worker_graph = graph
+
+def _expand_worker(state_ids: list[int]) -> list[Expansion]:
+    assert _worker_graph is not None
+    return _expand(_worker_graph, state_ids)
+
+
+class OpeningBook():
+    """Frozen expansions of every state within the first plies of a graph, stored in
+    compact arrays sorted by id. Used as the first expansion cache of a graph, it turns the
+    expansion of any state in that region into an array lookup, however often the region is
+    left and re-entered. A graph whose root is in its first expansion cache's book walks
+    these arrays directly while its cursor stays within the book, see `SyntheticGraph.make`.
+
+    Build it with `build()`, or construct the graph with `precompute_plies`."""
+    def __init__(self, state_ids: list[int], expansions: list[Expansion]):
+        id_hi, id_lo = _split_ids(state_ids)
+        order = np.lexsort((id_lo, id_hi))
+        self.id_hi, self.id_lo = id_hi[order], id_lo[order]
+        ordered = [expansions[i] for i in order.tolist()]
+        self.branching_factor = np.array([expansion.branching_factor for expansion in ordered], dtype=np.int64)
+        self.heuristic_value = np.array([expansion.heuristic_value for expansion in ordered], dtype=np.float64)
+        self.child_offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+        self.child_offsets[1:] = np.cumsum([len(expansion.child_ids) for expansion in ordered])
+        self.child_hi, self.child_lo = _split_ids([child_id for expansion in ordered for child_id in expansion.child_ids])
+        # first action leading to every child, which symmetric duplicates share
+        child_actions: list[int] = []
+        for expansion in ordered:
+            first_actions: dict[int, int] = {}
+            child_actions.extend(first_actions.setdefault(child_id, action) for action, child_id in enumerate(expansion.child_ids))
+        self.child_action = np.array(child_actions, dtype=np.int64)
+        # index of every child in the book, or -1 if the child lies beyond it
+        keys, child_keys = _keys(self.id_hi, self.id_lo), _keys(self.child_hi, self.child_lo)
+        child_index = np.searchsorted(keys, child_keys)
+        found = child_index < len(keys)
+        found[found] = keys[child_index[found]] == child_keys[found]
+        self.child_index = np.where(found, child_index, -1)
+
+    def __len__(self) -> int:
+        return len(self.id_hi)
+
+    @classmethod
+    def build(cls, graph: "SyntheticGraph", plies: int, workers: int=1) -> "OpeningBook":
+        """Expand every state reachable from the graph's current state in fewer than `plies`
+        actions, one ply at a time. With more than one worker, each ply is expanded by a
+        process pool."""
+        if not plies >= 0:
+            raise ValueError("plies must be >= 0.")
+        if not workers > 0:
+            raise ValueError("workers must be > 0.")
+        state_ids: list[int] = []
+        expansions: list[Expansion] = []
+        frontier = [graph.id()] if plies > 0 else []
+        seen = set(frontier)
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph,)) if workers > 1 else None
+        cursor = copy.copy(graph)
+        try:
+            for ply in range(plies):
+                if executor is None:
+                    ply_expansions = _expand(cursor, frontier)
+                else:
+                    chunks = [frontier[i:i+CHUNK_SIZE] for i in range(0, len(frontier), CHUNK_SIZE)]
+                    ply_expansions = [expansion for chunk in executor.map(_expand_worker, chunks) for expansion in chunk]
+                state_ids.extend(frontier)
+                expansions.extend(ply_expansions)
+                if ply == plies - 1:
+                    break
+                frontier = []
+                for expansion in ply_expansions:
+                    for child_id in expansion.child_ids:
+                        if child_id not in seen:
+                            seen.add(child_id)
+                            frontier.append(child_id)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return cls(state_ids, expansions)
+
+    def index(self, state_id: int) -> int|None:
+        """Return the index of `state_id` in the book's arrays, if it is in the book."""
+        id_hi, id_lo = state_id >> 64, state_id & WORD_MASK
+        left = int(np.searchsorted(self.id_hi, id_hi, side="left"))
+        right = int(np.searchsorted(self.id_hi, id_hi, side="right"))
+        i = left + int(np.searchsorted(self.id_lo[left:right], id_lo))
+        if i == right or self.id_lo[i] != id_lo:
+            return None
+        return i
+
+    def state_id(self, index: int) -> int:
+        """Return the id of the state at `index`."""
+        return (int(self.id_hi[index]) << 64) | int(self.id_lo[index])
+
+    def child_ids(self, index: int) -> list[int]:
+        """Return the child ids of the state at `index`, indexed by action."""
+        start, end = int(self.child_offsets[index]), int(self.child_offsets[index+1])
+        return [(hi << 64) | lo for hi, lo in zip(self.child_hi[start:end].tolist(), self.child_lo[start:end].tolist())]
+
+    def expansion(self, index: int) -> Expansion:
+        """Return the expansion of the state at `index`."""
+        return Expansion(
+            branching_factor=int(self.branching_factor[index]),
+            heuristic_value=float(self.heuristic_value[index]),
+            child_ids=self.child_ids(index))
+
+    def lookup(self, state_id: int) -> Expansion|None:
+        """Return the expansion of `state_id`, if it is in the book."""
+        i = self.index(state_id)
+        return None if i is None else self.expansion(i)
+
+    def recompute_heuristics(self, graph: "SyntheticGraph") -> None:
+        """Overwrite the heuristic values of the book with those of `graph`, which must only
+        differ from the book's graph in its heuristic parameters."""
+        state_ids = [(hi << 64) | lo for hi, lo in zip(self.id_hi.tolist(), self.id_lo.tolist())]
+        self.heuristic_value = graph.recompute_heuristic_values(self, state_ids, self.branching_factor)
+
+    def store(self, state_id: int, expansion: Expansion) -> None:
+        """The book is frozen, new expansions are ignored."""
+        pass
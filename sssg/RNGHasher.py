@@ -1,5 +1,6 @@
 import math
 import mmh3
+import numpy as np
 
 from .constants import HASH_OUTPUT_TMAX
 from .custom_types import RandomnessDistribution as Dist
@@ -43,6 +44,8 @@ def inverse_normal(p: float) -> float:
 class RNGHasher():
     """Deterministic random number generator. Supports multiple random distributions
     to output sequences of pseudo-random numbers unique to a state id."""
+    __slots__ = ("distribution", "nodeid", "seed", "_times_hashed")
+
     def __init__(self, distribution: Dist, nodeid: int=0, seed: int=0):
         self.distribution = distribution
         self.nodeid = nodeid
@@ -95,3 +98,89 @@ class RNGHasher():
     def reset(self) -> None:
         """Reset the RNG."""
         self._times_hashed = 0
+    
+    def copy(self) -> "RNGHasher":
+        """Return an independent RNG that continues the same sequence from this point."""
+        rng = RNGHasher(distribution=self.distribution, nodeid=self.nodeid, seed=self.seed)
+        rng._times_hashed = self._times_hashed
+        return rng
+
+
+class BatchRNGHasher():
+    """Draws from several RNGHashers at once, returning one value per RNG in an array. Every 
+    draw advances the participating RNGs exactly like the equivalent call to their own methods
+    would, and returns the same values, so batch and scalar calls can be mixed freely.
+    `low` and `high` may be arrays with one bound per RNG. Only the RNGs for which `where` is
+    true take part in a draw, the other entries of the result are undefined."""
+    def __init__(self, rngs: list[RNGHasher]):
+        self.rngs = rngs
+        self.distribution = rngs[0].distribution if rngs else Dist.UNIFORM
+
+    def _participants(self, where: np.ndarray|None) -> list[int]:
+        """Return the indices of the RNGs taking part in a draw."""
+        if where is None:
+            return list(range(len(self.rngs)))
+        return np.flatnonzero(where).tolist()
+
+    def _uniform_floats(self, participants: list[int]) -> np.ndarray:
+        """Return uniformly distributed floats in [0, 1], NaN for RNGs not taking part."""
+        uniform = np.full(len(self.rngs), np.nan)
+        for i in participants:
+            uniform[i] = self.rngs[i].hash() / HASH_OUTPUT_TMAX
+        return uniform
+
+    def next_float(self, low: float|np.ndarray=0, high: float|np.ndarray=1, 
+                   distribution: Dist|None=None, where: np.ndarray|None=None) -> np.ndarray:
+        """Return pseudo-random floats in [low, high]."""
+        participants = self._participants(where)
+        low_array = np.broadcast_to(np.asarray(low, dtype=np.float64), (len(self.rngs),))
+        high_array = np.broadcast_to(np.asarray(high, dtype=np.float64), (len(self.rngs),))
+        if np.any(low_array[participants] > high_array[participants]):
+            raise ValueError("low must be <= high.")
+        dist_range = high_array - low_array
+        if distribution is None:
+            distribution = self.distribution
+        match distribution:
+            case Dist.UNIFORM:
+                return self._uniform_floats(participants) * dist_range + low_array
+            case Dist.GAUSSIAN:
+                uniform = self._uniform_floats(participants)
+                normal = np.full(len(self.rngs), np.nan)
+                for i in participants:
+                    normal[i] = inverse_normal(float(uniform[i]))
+                result = (normal + GAUSSIAN_MAX_DIST_FROM_MEAN) / (2*GAUSSIAN_MAX_DIST_FROM_MEAN)
+                result = result * dist_range + low_array
+                return np.minimum(high_array, np.maximum(low_array, result))
+
+    def next_int(self, low: int|np.ndarray=0, high: int|np.ndarray=HASH_OUTPUT_TMAX, 
+                 distribution: Dist|None=None, where: np.ndarray|None=None) -> np.ndarray:
+        """Return pseudo-random integers in [low, high]. The result holds Python ints
+        (dtype=object) if they do not all fit into 64 bits."""
+        participants = self._participants(where)
+        low_array = np.broadcast_to(np.asarray(low), (len(self.rngs),))
+        high_array = np.broadcast_to(np.asarray(high), (len(self.rngs),))
+        if distribution is None:
+            distribution = self.distribution
+        results: list[int] = [0] * len(self.rngs)
+        for i in participants:
+            low_i, high_i = low_array[i].item(), high_array[i].item()
+            if not (isinstance(low_i, int) and isinstance(high_i, int)):
+                raise ValueError("low and high must be integers.")
+            if low_i > high_i:
+                raise ValueError("low must be <= high.")
+            if high_i - low_i > HASH_OUTPUT_TMAX:
+                raise ValueError(f"Range {low_i}-{high_i} is out of bounds.")
+        match distribution:
+            case Dist.UNIFORM:
+                for i in participants:
+                    low_i, high_i = low_array[i].item(), high_array[i].item()
+                    results[i] = self.rngs[i].hash() % (high_i - low_i + 1) + low_i
+            case Dist.GAUSSIAN:
+                floats = self.next_float(low_array.astype(np.float64), high_array.astype(np.float64), 
+                                         distribution=Dist.GAUSSIAN, where=where)
+                for i in participants:
+                    results[i] = round(float(floats[i]))
+        try:
+            return np.array(results, dtype=np.int64)
+        except OverflowError:
+            return np.array(results, dtype=object)
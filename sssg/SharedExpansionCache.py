@@ -0,0 +1,159 @@
+from multiprocessing import shared_memory
+from multiprocessing.synchronize import Lock
+from typing import Any
+import multiprocessing
+import numpy as np
+
+from .custom_types import Expansion
+from .utils import attach_shared_memory
+
+
+SLOT_EMPTY = 0
+SLOT_READY = 1
+WORD_MASK = 2**64 - 1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # 2**64 / golden ratio, spreads clustered ids over the table
+
+SLOT_DTYPE = np.dtype([
+    ("state", np.uint8),
+    ("id_hi", np.uint64),
+    ("id_lo", np.uint64),
+    ("branching_factor", np.int64),
+    ("heuristic_value", np.float64),
+    ("child_offset", np.int64),
+    ("child_count", np.int64),
+])
+CHILD_DTYPE = np.dtype([
+    ("id_hi", np.uint64),
+    ("id_lo", np.uint64),
+])
+HEADER_DTYPE = np.dtype([
+    ("arena_used", np.int64),
+    ("size", np.int64),
+])
+
+
+class SharedExpansionCache():
+    """Fixed-capacity, open-addressed expansion table living in shared memory, so worker
+    processes can reuse each other's expansions. Each slot maps a state id (split into two
+    64 bit words) to its branching factor, heuristic value and a range of child ids in a
+    shared arena.
+
+    Lookups never lock: a slot is only marked as ready after all of its fields have been
+    written, and is never modified afterwards. Python has no atomic compare-and-swap on
+    shared buffers, so inserts claim a slot and an arena range under a short lock instead.
+    When the table or the arena is full, further expansions are simply not cached.
+
+    Pass the cache to worker processes as an argument of the process (e.g. through a pool's
+    initializer), where it reattaches to the same shared memory."""
+    def __init__(self, capacity: int=2**20, arena_capacity: int=2**23):
+        if not capacity > 0:
+            raise ValueError("capacity must be > 0.")
+        if not arena_capacity >= 0:
+            raise ValueError("arena_capacity must be >= 0.")
+        self.capacity = capacity
+        self.arena_capacity = arena_capacity
+        size = HEADER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize + arena_capacity * CHILD_DTYPE.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._lock: Lock = multiprocessing.Lock()
+        self._owner = True
+        self._map_arrays()
+        self._header[0] = (0, 0)
+        self._slots["state"][:] = SLOT_EMPTY
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            "name": self._shm.name,
+            "capacity": self.capacity,
+            "arena_capacity": self.arena_capacity,
+            "lock": self._lock,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.capacity = state["capacity"]
+        self.arena_capacity = state["arena_capacity"]
+        self._lock = state["lock"]
+        self._shm = attach_shared_memory(state["name"])
+        self._owner = False
+        self._map_arrays()
+
+    def __len__(self) -> int:
+        return int(self._header[0]["size"])
+
+    def __enter__(self) -> "SharedExpansionCache":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def _map_arrays(self) -> None:
+        """Create views of the header, slot table and child arena over the shared buffer."""
+        buffer = self._shm.buf
+        offset = 0
+        self._header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buffer, offset=offset)
+        offset += HEADER_DTYPE.itemsize
+        self._slots = np.ndarray((self.capacity,), dtype=SLOT_DTYPE, buffer=buffer, offset=offset)
+        offset += self.capacity * SLOT_DTYPE.itemsize
+        self._arena = np.ndarray((self.arena_capacity,), dtype=CHILD_DTYPE, buffer=buffer, offset=offset)
+
+    def _probe_start(self, id_hi: int, id_lo: int) -> int:
+        """Return the slot at which probing for a state id begins."""
+        mixed = ((id_hi * HASH_MULTIPLIER) ^ id_lo) * HASH_MULTIPLIER & WORD_MASK
+        return (mixed >> 32) % self.capacity
+
+    def _find(self, state_id: int) -> tuple[int, bool]:
+        """Return the slot holding `state_id` and True, or the first empty slot on its probe
+        sequence and False. Returns -1 if the table is full."""
+        id_hi, id_lo = state_id >> 64, state_id & WORD_MASK
+        slot = self._probe_start(id_hi, id_lo)
+        for _ in range(self.capacity):
+            entry = self._slots[slot]
+            if entry["state"] == SLOT_EMPTY:
+                return slot, False
+            if entry["id_lo"] == id_lo and entry["id_hi"] == id_hi:
+                return slot, True
+            slot = (slot + 1) % self.capacity
+        return -1, False
+
+    def lookup(self, state_id: int) -> Expansion|None:
+        """Return the cached expansion of `state_id`, if there is one."""
+        slot, found = self._find(state_id)
+        if not found:
+            return None
+        entry = self._slots[slot]
+        offset, count = int(entry["child_offset"]), int(entry["child_count"])
+        children = self._arena[offset:offset+count]
+        return Expansion(
+            branching_factor=int(entry["branching_factor"]),
+            heuristic_value=float(entry["heuristic_value"]),
+            child_ids=[(int(hi) << 64) | int(lo) for hi, lo in zip(children["id_hi"], children["id_lo"])])
+
+    def store(self, state_id: int, expansion: Expansion) -> None:
+        """Insert an expansion, unless the state is already cached or there is no room left."""
+        child_count = len(expansion.child_ids)
+        with self._lock:
+            slot, found = self._find(state_id)
+            if found or slot < 0:
+                return
+            offset = int(self._header[0]["arena_used"])
+            if offset + child_count > self.arena_capacity:
+                return
+            self._header[0]["arena_used"] = offset + child_count
+            children = self._arena[offset:offset+child_count]
+            children["id_hi"] = [child_id >> 64 for child_id in expansion.child_ids]
+            children["id_lo"] = [child_id & WORD_MASK for child_id in expansion.child_ids]
+            entry = self._slots[slot:slot+1]
+            entry["id_hi"] = state_id >> 64
+            entry["id_lo"] = state_id & WORD_MASK
+            entry["branching_factor"] = expansion.branching_factor
+            entry["heuristic_value"] = expansion.heuristic_value
+            entry["child_offset"] = offset
+            entry["child_count"] = child_count
+            entry["state"] = SLOT_READY # published last, readers ignore the slot until now
+            self._header[0]["size"] += 1
+
+    def close(self) -> None:
+        """Detach from the shared memory. The process which created the cache also frees it."""
+        del self._header, self._slots, self._arena
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -1,14 +1,23 @@
 from typing import Self
+import copy
 import math
+import numpy as np
 
-from .RNGHasher import RNGHasher
+from .RNGHasher import RNGHasher, BatchRNGHasher
 from .custom_types import *
 from .constants import *
 from .utils import *
-from .custom_exceptions import IdOverflow
+from .custom_exceptions import IdOverflow, BudgetExceeded
 
 
 class StateNode():
+    """A state of the graph. States are owned by the cursor which created them (see
+    `SyntheticGraph.fork`), and only their owner evaluates, expands or resets them."""
+    __slots__ = ("id", "globals", "true_value", "player", "depth", "tspace_record", "parent", "action", "owner",
+                 "_random_values_generated", "_branching_factor", "_heuristic_value", "_state_params",
+                 "_children", "_child_refs", "_children_generated", "_unique_children_count",
+                 "_sibling_true_value_information", "_RNG")
+
     def __init__(self, 
                  stateid: int,
                  globals: GlobalParameters, 
@@ -16,7 +25,9 @@ class StateNode():
                  player: Player,
                  depth: int,
                  tspace_record: int,
-                 parent: "StateNode|None"=None):
+                 parent: "StateNode|None"=None,
+                 action: int|None=None,
+                 owner: object=None):
         self.id: int = stateid
         self.globals = globals
         self.true_value = true_value
@@ -24,14 +35,24 @@ class StateNode():
         self.depth = depth
         self.tspace_record = tspace_record
         self.parent = parent
+        self.action = action # index into the parent's children that first produced this state
+        self.owner = owner # token of the cursor which may change this state, children inherit it
         self._random_values_generated: bool = False
         self._branching_factor: int|None = None
         self._heuristic_value: float|None = None
         self._state_params: StateParams|None = None
         
-        self.children: list[StateNode] = []
-        self._RNG: RNGHasher = RNGHasher(
-            distribution=self.globals.vars.distribution, nodeid=self.id, seed=self.globals.vars.seed)
+        # symmetric children are only stored once, actions refer to them by index
+        self._children: list[StateNode] = []
+        self._child_refs: list[int]|None = None # None if every action has its own child
+        # children can be generated a few at a time, these hold the progress in between
+        self._children_generated: bool = False
+        self._unique_children_count: int|None = None
+        self._sibling_true_value_information: ChildTrueValueInformation|None = None
+        if globals.timeline is None:
+            self._RNG: RNGHasher = RNGHasher(distribution=globals.vars.distribution, nodeid=stateid, seed=globals.vars.seed)
+        else: # times its hashes, see Timeline.rng
+            self._RNG = globals.timeline.rng(distribution=globals.vars.distribution, nodeid=stateid, seed=globals.vars.seed)
     
     def __str__(self) -> str:
         return f"true_value: {self.true_value}, player: {self.player.name}, depth: {self.depth}, tspace_record: {self.tspace_record}"
@@ -46,19 +67,15 @@ class StateNode():
     
     def _encode_id(self, true_value: int, player: Player, depth: int, tspace_record: int) -> int:
         """"Encodes provided state attributes to a unique state id."""
+        global_vars = self.globals.vars
         if not -1 <= true_value <= 1:
             raise ValueError(f"Invalid value {true_value}. Value should be in [-1, 1].")
-        if not 0 <= depth <= self.globals.vars.max_depth:
+        if not 0 <= depth <= global_vars.max_depth:
             raise IdOverflow(f"depth {depth}.")
-        if not 0 <= tspace_record <= self.globals.vars.max_transposition_space_size:
+        if not 0 <= tspace_record <= global_vars.max_transposition_space_size:
             raise IdOverflow(f"state_space_record {tspace_record}.")
-        true_value_bit_shift = ID_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH
-        player_bit_shift = true_value_bit_shift - ID_PLAYER_BIT_LENGTH
-        depth_bit_shift = player_bit_shift - self.globals.vars.max_depth.bit_length()
-        player_bits = player.value << player_bit_shift
-        true_value_bits = encode_true_value_to_bits(true_value) << true_value_bit_shift
-        depth_bits = depth << depth_bit_shift
-        return true_value_bits | player_bits | depth_bits | tspace_record
+        return (encode_true_value_to_bits(true_value) << ID_TRUE_VALUE_BIT_SHIFT | player.value << ID_PLAYER_BIT_SHIFT
+                | depth << self.globals.id_depth_bit_shift | tspace_record)
     
     def _construct_state_params(self) -> StateParams:
         """Construct StateParams, this contains necessary information used by 
@@ -80,37 +97,31 @@ class StateNode():
         )
         return state_params
     
-    def _calculate_child_true_value(self, child_true_value_information: ChildTrueValueInformation) -> int:
+    def _calculate_child_true_value(self, view: StateView, child_true_value_information: ChildTrueValueInformation,
+                                    branching_factor: int) -> int:
         """Wrapper function to calculate a true value for a child state, by calling the
-        child_true_value_function."""
-        true_value = self.globals.funcs.child_true_value_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params(), 
-            self.branching_factor(), child_true_value_information)
+        child_true_value_function with `view`, bound to this state."""
+        true_value = self.globals.call_child_true_value_function(view, branching_factor, child_true_value_information)
         return true_value
     
     def _calculate_child_player(self) -> Player:
         """Calculate the player attribute for child states."""
         return Player.MAX if self.player == Player.MIN else Player.MIN
     
-    def _calculate_child_depth(self) -> int:
+    def _calculate_child_depth(self, view: StateView) -> int:
         """Calculate depth of a child node and ensure it stays within the allowed range."""
-        child_depth = self.globals.funcs.child_depth_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params())
+        child_depth = self.globals.call_child_depth_function(view)
         if child_depth < 0:
             raise IdOverflow("Depth can not be negative.")
         if child_depth > self.globals.vars.max_depth:
             raise IdOverflow("Depth can not exceed max_depth.")
         return child_depth
     
-    def _calculate_child_tspace_record(self, child_depth: int) -> int:
-        """Calculate a transposition space record for a state at a given depth. The main bulk
-        of this function is correctly scaling the tspace record from one depth to the next,
-        based on the relative sizes of the transposition spaces and the locality parameter."""
-        self_tspace_size = self.globals.funcs.transposition_space_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params().globals, self.depth)
-        child_tspace_size = self.globals.funcs.transposition_space_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params().globals, child_depth)
-        # the below code applies the locality scaling
+    def _calculate_child_tspace_record(self, self_tspace_size: int, child_tspace_size: int) -> int:
+        """Calculate a transposition space record for a child state, given the sizes of this
+        state's transposition space and the child's. The main bulk of this function is correctly
+        scaling the tspace record from one depth to the next, based on the relative sizes of the
+        transposition spaces and the locality parameter."""
         tspace_scaling_factor = child_tspace_size / self_tspace_size
         child_tspace_record_center = math.floor(self.tspace_record * tspace_scaling_factor)
         child_tspace_variance_margin = (child_tspace_size - 1) * (1-self.globals.vars.locality_grouping) / 2 
@@ -120,18 +131,78 @@ class StateNode():
         child_tspace_record %= (child_tspace_size + 1) # +1 because the maximum is inclusive
         return child_tspace_record
     
-    def _generate_child(self, child_true_value_information: ChildTrueValueInformation) -> "StateNode":
-        """Generate a child id using values for depth and random bits."""
-        child_true_value = self._calculate_child_true_value(child_true_value_information)
-        child_player = self._calculate_child_player()
-        child_depth = self._calculate_child_depth()
-        child_tspace_record = self._calculate_child_tspace_record(child_depth)
-        child_id = self._encode_id(child_true_value, child_player, child_depth, child_tspace_record)
-        new_child = StateNode(
-            stateid=child_id, globals=self.globals, true_value=child_true_value, 
-            player=child_player, depth=child_depth, tspace_record=child_tspace_record,
-            parent=self)
-        return new_child
+    def _child_from_id(self, child_id: int, action: int) -> "StateNode":
+        """Reconstruct a child state from its id."""
+        return StateNode(
+            stateid=child_id, globals=self.globals, 
+            true_value=extract_true_value_from_id(child_id),
+            player=extract_player_from_id(child_id),
+            depth=extract_depth_from_id(child_id, self.globals.vars.max_depth.bit_length()),
+            tspace_record=extract_tspace_record_from_id(
+                child_id, self.globals.vars.max_transposition_space_size.bit_length()),
+            parent=self, action=action, owner=self.owner)
+
+    def _fresh_copy(self, owner: object) -> "StateNode":
+        """Return an unevaluated copy of this state at the same place in the tree, owned by
+        `owner`. Everything else is regenerated on demand, identically."""
+        return StateNode(
+            stateid=self.id, globals=self.globals, true_value=self.true_value, player=self.player,
+            depth=self.depth, tspace_record=self.tspace_record, parent=self.parent, action=self.action, owner=owner)
+    
+    def _load_expansion(self, expansion: Expansion) -> Self:
+        """Take the results of all randomness-dependant functions from a cached expansion."""
+        self._branching_factor = expansion.branching_factor
+        self._heuristic_value = expansion.heuristic_value
+        budget = self.globals.budget
+        child_indices: dict[int, int] = {}
+        child_refs: list[int] = []
+        for action, child_id in enumerate(expansion.child_ids):
+            if child_id not in child_indices:
+                child_indices[child_id] = len(self._children)
+                self._children.append(self._child_from_id(child_id, action))
+            child_refs.append(child_indices[child_id])
+        if len(self._children) < len(child_refs):
+            self._child_refs = child_refs
+        self._children_generated = True
+        if budget is not None:
+            self._charge_nodes(budget, len(self._children))
+        if self.globals.hooks.active and child_refs:
+            self._fire_expand()
+        return self
+    
+    def expansion(self) -> Expansion:
+        """Return the results of all randomness-dependant functions, generating children if necessary."""
+        self._execute_all_randomness_dependant_functions() # terminals at max_depth are not evaluated by generating children
+        self._generate_children()
+        assert(self._branching_factor is not None and self._heuristic_value is not None)
+        return Expansion(
+            branching_factor=self._branching_factor,
+            heuristic_value=self._heuristic_value,
+            child_ids=[child.id for child in self.children])
+
+    def _store_expansion(self) -> Self:
+        """Pass the results of all randomness-dependant functions on to the expansion caches."""
+        expansion = self.expansion()
+        timeline = self.globals.timeline
+        for cache in self.globals.expansion_caches:
+            if timeline is None:
+                cache.store(self.id, expansion)
+            else:
+                timeline.call(f"{type(cache).__name__}.store", cache.store, self.id, expansion)
+        return self
+    
+    def _load_cached_expansion(self) -> bool:
+        """Load the state's expansion from the first cache that holds it. Return True on success."""
+        timeline = self.globals.timeline
+        for cache in self.globals.expansion_caches:
+            if timeline is None:
+                expansion = cache.lookup(self.id)
+            else:
+                expansion = timeline.call(f"{type(cache).__name__}.lookup", cache.lookup, self.id)
+            if expansion is not None:
+                self._load_expansion(expansion)
+                return True
+        return False
     
     def get_state_params(self) -> StateParams:
         """Construct StateParams, if necessary, and return them."""
@@ -159,54 +230,298 @@ class StateNode():
         assert(self._heuristic_value is not None)
         return self._heuristic_value
 
-    def actions(self) -> list[int]:
-        """Return indices of children."""
-        self._execute_all_randomness_dependant_functions()
-        return list(range(len(self.children)))
+    @property
+    def children(self) -> list["StateNode"]:
+        """Child states indexed by action. Symmetric children appear once for every action
+        leading to them. While children are only partially generated, holds the ones so far."""
+        if self._child_refs is None:
+            return self._children
+        return [self._children[i] for i in self._child_refs]
+
+    def child(self, action: int) -> "StateNode":
+        """Return the child state reached via `action`, generating children up to it."""
+        self._generate_children(limit=action + 1)
+        if self._child_refs is None:
+            return self._children[action]
+        return self._children[self._child_refs[action]]
+
+    def actions(self, limit: int|None=None) -> list[int]:
+        """Return indices of children. With `limit`, only the children of the first `limit`
+        actions are generated; later calls continue where the previous one stopped."""
+        self._generate_children(limit)
+        if self._child_refs is not None:
+            count = len(self._child_refs)
+        else:
+            count = len(self._children)
+        return list(range(count if limit is None else min(limit, count)))
+    
+    def unique_actions(self) -> list[tuple[int, int]]:
+        """Return one action for every distinct child state (by id), together with the number
+        of actions leading to that state."""
+        self._generate_children()
+        unique: dict[int, list[int]] = {}
+        for action in self.actions():
+            child_id = self.child(action).id
+            if child_id in unique:
+                unique[child_id][1] += 1
+            else:
+                unique[child_id] = [action, 1]
+        return [(action, multiplicity) for action, multiplicity in unique.values()]
+    
+    def child_heuristics(self) -> list[float]:
+        """Return the heuristic values of all children, indexed by action. The children's own
+        children are not generated."""
+        self._generate_children()
+        execute_randomness_dependant_functions_batch(self._children)
+        return [child.heuristic_value() for child in self.children]
     
     def reset(self) -> Self:
         """Reset state to before any randomness-depentant actions were taken."""
-        self.children = []
+        if self.globals.budget is not None:
+            self.globals.budget.live_nodes -= len(self._children)
+        self._children = []
+        self._child_refs = None
+        self._children_generated = False
+        self._unique_children_count = None
+        self._sibling_true_value_information = None
         self._branching_factor = None
         self._heuristic_value = None
         self._random_values_generated = False
         self._RNG.reset()
         return self
 
-    def _generate_children(self) -> Self:
-        """Generate child states."""
+    def _generate_children(self, limit: int|None=None) -> Self:
+        """Generate child states, or only the ones needed for the first `limit` actions.
+        Generation can be resumed: the RNG is not reset in between, and the sibling information
+        the child true values depend on is kept, so the children are the same as if they had
+        all been generated at once. Expansion caches only hold complete expansions, so with
+        caches attached all children are generated at once and stored."""
         if self.is_terminal():
             return self
-        if self.children:
+        if self._children_generated:
             return self
-        new_children: list["StateNode"] = []
-        sibling_true_value_information = ChildTrueValueInformation()
-        if self._RNG.next_float() < self.globals.vars.symmetry_frequency:
-            unique_children_count = max(1, math.floor(self.branching_factor() * self.globals.vars.symmetry_factor))
-        else:
-            unique_children_count = self.branching_factor()
-        for _ in range(unique_children_count):
-            new_child = self._generate_child(sibling_true_value_information)
+        if self.globals.expansion_caches:
+            limit = None
+        if self.globals.timeline is not None:
+            return self.globals.timeline.traced("expand", StateNode._generate_more_children, self, limit)
+        return self._generate_more_children(limit)
+
+    def _generate_more_children(self, limit: int|None) -> Self:
+        """Continue generating the children of a non-terminal state, see `_generate_children`."""
+        budget = self.globals.budget
+        if self._unique_children_count is None:
+            if budget is not None:
+                self._charge_expansion(budget)
+            if self._RNG.next_float() < self.globals.vars.symmetry_frequency:
+                self._unique_children_count = max(1, math.floor(self.branching_factor() * self.globals.vars.symmetry_factor))
+            else:
+                self._unique_children_count = self.branching_factor()
+            self._sibling_true_value_information = ChildTrueValueInformation()
+        unique_children_count = self._unique_children_count
+        sibling_true_value_information = self._sibling_true_value_information
+        assert(sibling_true_value_information is not None)
+        # symmetric actions refer to the unique children in order, so the first `limit`
+        # actions only need the first `limit` unique children
+        target = unique_children_count if limit is None else min(limit, unique_children_count)
+        generated = len(self._children)
+        # the same for every child, and the tspace size of this state is only computed by the
+        # first child, at the point of its draws where it always has been
+        branching_factor, child_player = self.branching_factor(), self._calculate_child_player()
+        globals, rng = self.globals, self._RNG
+        transposition_space_function = globals.funcs.transposition_space_function
+        self_tspace_size: int|None = None
+        view = globals.state_view(self)
+        for i in range(generated, target):
+            if view.node is not self: # rebound by a behavior function calling into another state
+                view.bind(self)
+            child_true_value = self._calculate_child_true_value(view, sibling_true_value_information, branching_factor)
+            child_depth = self._calculate_child_depth(view)
+            if self_tspace_size is None:
+                self_tspace_size = transposition_space_function(rng.next_int, rng.next_float, globals.vars, self.depth)
+            child_tspace_size = transposition_space_function(rng.next_int, rng.next_float, globals.vars, child_depth)
+            child_tspace_record = self._calculate_child_tspace_record(self_tspace_size, child_tspace_size)
+            new_child = StateNode(
+                stateid=self._encode_id(child_true_value, child_player, child_depth, child_tspace_record),
+                globals=globals, true_value=child_true_value, player=child_player, depth=child_depth,
+                tspace_record=child_tspace_record, parent=self, action=i, owner=self.owner)
             sibling_true_value_information.total_children_generated += 1
             assign_child_true_value_information(
                 sibling_true_value_information, self.player, new_child.true_value)
-            new_children.append(new_child)
-        for i in range(self.branching_factor() - unique_children_count):
-            symmetrical_child = new_children[i % unique_children_count]
-            new_children.append(symmetrical_child)
-        self.children = new_children
+            self._children.append(new_child)
+        if budget is not None:
+            self._charge_nodes(budget, len(self._children) - generated)
+        if len(self._children) < unique_children_count:
+            return self
+        self._children_generated = True
+        self._sibling_true_value_information = None
+        if unique_children_count < self.branching_factor():
+            symmetrical_child_refs = [i % unique_children_count for i in range(self.branching_factor() - unique_children_count)]
+            self._child_refs = list(range(unique_children_count)) + symmetrical_child_refs
+        if self.globals.expansion_caches:
+            self._store_expansion()
+        if self.globals.hooks.active:
+            self._fire_expand()
         return self
+
+    def _fire_expand(self) -> None:
+        """Call the callbacks registered for the expand event with this state."""
+        callbacks = self.globals.hooks.expand
+        if callbacks is None:
+            return
+        view = self.globals.hook_view(self)
+        try:
+            for callback in callbacks:
+                callback(view)
+        finally:
+            self.globals.release_hook_view()
     
+    def _charge_expansion(self, budget: Budget) -> None:
+        """Count an expansion of this state against the budget."""
+        if budget.max_expansions is not None and budget.expansions >= budget.max_expansions:
+            raise BudgetExceeded(f"Expansion budget of {budget.max_expansions} exhausted", copy.copy(budget))
+        budget.expansions += 1
+
+    def _charge_nodes(self, budget: Budget, count: int) -> None:
+        """Count new children of this state as live, evicting if that exceeds the budget."""
+        budget.live_nodes += count
+        if budget.node_limit is not None and budget.live_nodes > budget.node_limit:
+            self._evict(budget, budget.node_limit)
+
+    def _evict(self, budget: Budget, node_limit: int) -> None:
+        """Release the children of this state's ancestors, starting at the root, until the
+        live nodes are back down to a share of the limit. Each ancestor keeps only the path
+        down to this state, since its other children can always be regenerated, and it is
+        reset anyway when the path returns to it. Raises BudgetExceeded if even releasing
+        all of them is not enough."""
+        ancestors: list[StateNode] = []
+        node = self.parent
+        while node is not None:
+            ancestors.append(node)
+            node = node.parent
+        ancestors.reverse()
+        live = counted = budget.recount() # over every fork sharing the budget
+        target = math.floor(node_limit * EVICTION_TARGET)
+        for ancestor in ancestors:
+            if live <= target:
+                break
+            if ancestor._children and ancestor.owner is self.owner: # states shared with forks are left alone
+                live -= len(ancestor._children) - 1 # at least, their children may hold more
+                ancestor.reset()
+        if live < counted:
+            live = budget.recount()
+            budget.evicted_nodes += counted - live
+        if live > node_limit:
+            raise BudgetExceeded(f"Live node budget of {node_limit} exhausted", copy.copy(budget))
+
+    def _collect_live_nodes(self, seen: set[int], owner: object) -> int:
+        """Add the ids of this state, its ancestors and every state they hold to `seen`, and
+        return how many of the newly added ones are owned by `owner`. Ids are those of the
+        objects, since fresh copies of the same state are counted separately."""
+        owned = 0
+        stack: list[StateNode] = []
+        node: StateNode|None = self
+        while node is not None:
+            stack.append(node)
+            node = node.parent
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            owned += node.owner is owner
+            stack.extend(node._children)
+        return owned
+
     def _execute_all_randomness_dependant_functions(self) -> Self:
         """To ensure determinism, all calls to the RNG within the state must be taken in the 
         same order each time. When any random calculation is needed, this function is called
-        first to ensure that all random calculations are performed in a specific sequence."""
+        first to ensure that all random calculations are performed in a specific sequence.
+        Children are generated later, when needed, by continuing the same sequence."""
         if self._random_values_generated:
             return self
+        if self.globals.timeline is not None:
+            return self.globals.timeline.traced("evaluate", StateNode._evaluate, self)
+        return self._evaluate()
+
+    def _evaluate(self) -> Self:
+        """Execute the randomness-dependant functions, see `_execute_all_randomness_dependant_functions`."""
         self._random_values_generated = True
-        self._branching_factor = self.globals.funcs.branching_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params())
-        self._heuristic_value = self.globals.funcs.heuristic_value_function(
-            self._RNG.next_int, self._RNG.next_float, self.get_state_params())
-        self._generate_children()
+        if self._load_cached_expansion():
+            return self
+        self._branching_factor = self.globals.call_branching_function(self.globals.state_view(self))
+        self._heuristic_value = self.globals.call_heuristic_value_function(self.globals.state_view(self))
+        if self.globals.expansion_caches and self.is_terminal():
+            self._store_expansion()
         return self
+
+
+def execute_randomness_dependant_functions_batch(nodes: list[StateNode]) -> None:
+    """Execute the randomness-dependant functions of many states (of the same graph) at once.
+    Behavior functions with a batch implementation are called a single time for all of the
+    states, the others once per state. Either way, each state ends up exactly as if its own
+    functions had been called."""
+    pending: list[StateNode] = []
+    for node in nodes:
+        if node._random_values_generated:
+            continue
+        node._random_values_generated = True
+        if not node._load_cached_expansion():
+            pending.append(node)
+    if not pending:
+        return
+    timeline = pending[0].globals.timeline
+    if timeline is not None:
+        timeline.traced("evaluate_batch", _evaluate_batch, pending)
+    else:
+        _evaluate_batch(pending)
+
+
+def _evaluate_batch(pending: list[StateNode]) -> None:
+    """Execute the branching and heuristic value functions of states not found in any cache."""
+    globals = pending[0].globals
+    batch_params = _construct_batch_state_params(pending)
+    batch_rng = BatchRNGHasher([node._RNG for node in pending])
+    branching_function_batch = getattr(globals.funcs.branching_function, "batch", None)
+    if branching_function_batch is not None:
+        branching_factors = branching_function_batch(batch_rng.next_int, batch_rng.next_float, batch_params)
+        _check_batch_result(branching_factors, pending, "branching_function")
+        for node, branching_factor in zip(pending, branching_factors):
+            node._branching_factor = int(branching_factor)
+    else:
+        for node in pending:
+            node._branching_factor = globals.call_branching_function(globals.state_view(node))
+    heuristic_value_function_batch = getattr(globals.funcs.heuristic_value_function, "batch", None)
+    if heuristic_value_function_batch is not None:
+        heuristic_values = heuristic_value_function_batch(batch_rng.next_int, batch_rng.next_float, batch_params)
+        _check_batch_result(heuristic_values, pending, "heuristic_value_function")
+        for node, heuristic_value in zip(pending, heuristic_values):
+            node._heuristic_value = float(heuristic_value)
+    else:
+        for node in pending:
+            node._heuristic_value = globals.call_heuristic_value_function(globals.state_view(node))
+    if globals.expansion_caches:
+        for node in pending:
+            if node.is_terminal():
+                node._store_expansion()
+
+
+def _check_batch_result(result: np.ndarray, nodes: list[StateNode], function_name: str) -> None:
+    if len(result) != len(nodes):
+        raise ValueError(f"The batch version of {function_name} returned {len(result)} results for {len(nodes)} states.")
+
+
+def _construct_batch_state_params(nodes: list[StateNode]) -> BatchStateParams:
+    """Construct BatchStateParams, holding the StateParams of several states as arrays."""
+    params = [node.get_state_params().self for node in nodes]
+    batch_params_self = BatchStateParamsSelf(
+        id = [p.id for p in params],
+        true_value = np.array([p.true_value for p in params], dtype=np.int64),
+        player = np.array([p.player.value for p in params], dtype=np.int64),
+        depth = np.array([p.depth for p in params], dtype=np.int64),
+        transposition_space_record = int_array([p.transposition_space_record for p in params]),
+        transposition_space_size = int_array([p.transposition_space_size for p in params]),
+    )
+    return BatchStateParams(
+        globals = nodes[0].globals.vars,
+        self = batch_params_self,
+    )
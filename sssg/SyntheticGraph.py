@@ -1,11 +1,23 @@
-from typing import Self
+from typing import Self, Any, TYPE_CHECKING
+from collections import Counter
+from collections.abc import Callable, Sequence
+import copy
+import inspect
+import random
+import numpy as np
 
-from .StateNode import StateNode
+from .StateNode import StateNode, execute_randomness_dependant_functions_batch
 from .RNGHasher import RNGHasher
-from .constants import ID_BIT_LENGTH
+from .OpeningBook import OpeningBook
+from .NodeArena import NodeArena
+from .Timeline import Timeline
+from .estimation import estimate_shape, ShapeEstimate
+from .constants import ID_BIT_LENGTH, MAX_RETROGRADE_LEVEL_SIZE, APPROXIMATE_NODE_BYTES, ATTRIBUTE_DEPENDENCIES, STRUCTURE_PARAMETERS
 from .custom_types import *
 from .custom_exceptions import *
 from .default_behavior_functions import *
+if TYPE_CHECKING:
+    from .solvers.retrograde import RetrogradeSolution
 
 
 class SyntheticGraph():
@@ -37,8 +49,17 @@ class SyntheticGraph():
                  child_true_value_function: ChildTrueValueFunction=default_child_true_value_function, 
                  child_depth_function: ChildDepthFunction=default_child_depth_function,
                  transposition_space_function: TranspositionSpaceFunction=default_transposition_space_function,
-                 heuristic_value_function: HeuristicValueFunction=default_heuristic_value_function):
+                 heuristic_value_function: HeuristicValueFunction=default_heuristic_value_function,
+                 
+                 expansion_caches: list[ExpansionCache]|None=None,
+                 precompute_plies: int=0,
+                 precompute_workers: int=1,
+                 max_live_nodes: int|None=None,
+                 max_bytes: int|None=None,
+                 max_expansions: int|None=None,
+                 timeline: "str|Timeline|None"=None):
         
+        self._arguments: dict[str, Any] = {name: value for name, value in locals().items() if name != "self"}
         if not 0 <= seed <= 0xFFFFFFFF:
             raise ValueError("seed must be in [0, 0xFFFFFFFF].") # restriction imposed by mmh3
         if not max_depth > 0:
@@ -75,6 +96,16 @@ class SyntheticGraph():
             raise ValueError("heuristic_depth_scaling must be in [0, 1].")
         if not 0 <= heuristic_locality_scaling <= 1:
             raise ValueError("heuristic_locality_scaling must be in [0, 1].")
+        if not precompute_plies >= 0:
+            raise ValueError("precompute_plies must be >= 0.")
+        if not precompute_workers > 0:
+            raise ValueError("precompute_workers must be > 0.")
+        if max_live_nodes is not None and not max_live_nodes > 0:
+            raise ValueError("max_live_nodes must be > 0.")
+        if max_bytes is not None and not max_bytes >= APPROXIMATE_NODE_BYTES:
+            raise ValueError(f"max_bytes must be >= {APPROXIMATE_NODE_BYTES}.")
+        if max_expansions is not None and not max_expansions >= 0:
+            raise ValueError("max_expansions must be >= 0.")
         
         self._RNG = RNGHasher(distribution=distribution, seed=seed)
         max_transposition_space = 2**(ID_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH - ID_PLAYER_BIT_LENGTH - max_depth.bit_length()) - 1
@@ -120,10 +151,21 @@ class SyntheticGraph():
             transposition_space_function = transposition_space_function_wrapper,
             heuristic_value_function = heuristic_value_function
         )
+        if isinstance(timeline, str):
+            timeline = Timeline.shared(timeline)
+        elif timeline is None:
+            timeline = Timeline.from_environment()
+        if timeline is not None:
+            for name in ("branching_function", "child_true_value_function", "child_depth_function",
+                         "transposition_space_function", "heuristic_value_function"):
+                setattr(global_funcs, name, timeline.wrap(name, getattr(global_funcs, name)))
         self.globals = GlobalParameters(
             global_vars,
             global_funcs,
+            list(expansion_caches) if expansion_caches is not None else [],
+            timeline=timeline,
         )
+        self._owner = object() # token marking the states this cursor may change, see fork()
         root_node = StateNode(
             stateid=0, globals=self.globals, true_value=root_true_value, 
             player=Player.MAX, depth=0, tspace_record=0, parent=None)
@@ -133,82 +175,584 @@ class SyntheticGraph():
             root_node.depth,
             root_node.tspace_record
         ))
+        if precompute_plies > 0:
+            self.globals.expansion_caches.insert(0, OpeningBook.build(self, precompute_plies, precompute_workers))
+            self._enter_book()
+        if max_live_nodes is not None or max_bytes is not None or max_expansions is not None:
+            # attached last, so that building the opening book does not count against it
+            self.globals.budget = Budget(max_live_nodes, max_bytes, max_expansions)
+            self.globals.budget.add_cursor(self)
+            self.globals.budget.recount()
     
     def __str__(self) -> str:
-        return str(self._current)
+        return str(self._current if self._current is not None else _node_from_id(self.id(), self.globals))
     
     def __repr__(self) -> str:
-        return self._current.__repr__()
+        return str(self)
+    
+    def __reduce__(self) -> tuple[Any, ...]:
+        """Graphs are pickled as their constructor arguments and current position, so any
+        custom behavior functions must be picklable (e.g. defined at module level)."""
+        arguments = dict(self._arguments, expansion_caches=self.globals.expansion_caches, precompute_plies=0)
+        return (_restore_graph, (arguments, self._root.id, self.path(), self._RNG))
     
     def is_root(self) -> bool:
         """Return true if the state is the root."""
-        return self._current.is_root()
+        if self._current is None:
+            return len(self._book_path) == 1
+        return self._current.is_root() and not self._book_path
     
     def is_terminal(self) -> bool:
         """Return true if the state is a terminal."""
-        return self._current.is_terminal()
+        if self._walking_book():
+            return self.depth() >= self.globals.vars.max_depth or bool(self._book.branching_factor[self._book_path[-1]] < 1)
+        return self._owned_current().is_terminal()
     
     def true_value(self) -> int:
         """Return the current state's true value. Value is in [-1, 1]"""
+        if self._current is None:
+            return extract_true_value_from_id(self.id())
         return self._current.true_value
     
     def heuristic_value(self) -> float:
         """Return the estimated value of the current state using the heuristic evaluation function."""
-        return self._current.heuristic_value()
+        if self._walking_book():
+            return float(self._book.heuristic_value[self._book_path[-1]])
+        return self._owned_current().heuristic_value()
     
     def player(self) -> Player:
         """Return the player associated with the current state."""
+        if self._current is None:
+            return extract_player_from_id(self.id())
         return self._current.player
     
     def depth(self) -> int:
         """Return the depth of the current node."""
+        if self._current is None:
+            return extract_depth_from_id(self.id(), self.globals.vars.max_depth.bit_length())
         return self._current.depth
 
     def id(self) -> int:
         """Return the id of the current state."""
+        if self._current is None:
+            return self._book.state_id(self._book_path[-1])
         return self._current.id
 
-    def actions(self) -> list[int]:
-        """Return the current state's possible actions."""
-        return self._current.actions()
+    def actions(self, skip_repetitions: bool=False, limit: int|None=None) -> list[int]:
+        """Return the current state's possible actions. With `skip_repetitions`, actions
+        leading to a state already on the current path are left out. With `limit`, only the
+        first `limit` actions are considered and only their children are generated; a later
+        call with a higher limit continues generating where this one stopped, producing the
+        same children as a full expansion. Graphs with expansion caches always generate all
+        children, so that the caches receive every expansion."""
+        if limit is not None and not limit >= 0:
+            raise ValueError("limit must be >= 0.")
+        if self._walking_book():
+            child_ids = self._book.child_ids(self._book_path[-1])[:limit]
+            return [action for action, child_id in enumerate(child_ids)
+                    if not (skip_repetitions and child_id in self._path_counts)]
+        node = self._owned_current()
+        actions = node.actions(limit)
+        if not skip_repetitions:
+            return actions
+        return [action for action in actions if node.child(action).id not in self._path_counts]
+
+    def on(self, event: str, callback: Callable[..., Any]) -> Callable[..., Any]:
+        """Register `callback` for an event, and return it. Callbacks get a StateView bound
+        to the state concerned, which stays bound to it even if the callback moves the graph.
+        Views are reused by later events, so callbacks should not keep them:
+        - "make": `callback(view, action)` after every move, including those of `goto()`,
+        - "undo": `callback(view)` after every move back, with the state returned to,
+        - "leaf": `callback(view)` after a move into a terminal state,
+        - "expand": `callback(view)` once the children of a state are all generated, or
+          loaded from an expansion cache. Since `undo()` releases the children of the state
+          returned to, the same state can be expanded again later.
+        Callbacks are shared with forks, and are called in the order they were registered."""
+        self.globals.hooks.add(event, callback)
+        return callback
+
+    def off(self, event: str, callback: Callable[..., Any]) -> None:
+        """Unregister a callback registered with `on()`."""
+        self.globals.hooks.remove(event, callback)
+
+    def budget(self) -> Budget|None:
+        """Return the graph's budget with its current counts, if it was constructed with one
+        (see `max_live_nodes`, `max_bytes` and `max_expansions`). Forks share the budget, and
+        the live nodes are recounted over all of them."""
+        budget = self.globals.budget
+        if budget is not None:
+            budget.recount()
+        return budget
+
+    def on_path(self, state_id: int) -> bool:
+        """Return true if the state is on the path from the root to the current state,
+        the current state included. Takes constant time."""
+        return state_id in self._path_counts
+
+    def repetition_count(self) -> int:
+        """Return how often the current state already occurred earlier on the current path."""
+        return self._path_counts[self.id()] - 1
+
+    def child_heuristics(self) -> list[float]:
+        """Return the heuristic values of the current state's children, indexed by action. 
+        All children are evaluated in one pass, without moving the cursor and without 
+        generating any grandchildren."""
+        if self._walking_book():
+            book, index = self._book, self._book_path[-1]
+            child_ids = book.child_ids(index)
+            child_indices = book.child_index[book.child_offsets[index]:book.child_offsets[index+1]].tolist()
+            # children beyond the book are evaluated on their own, without joining the path
+            beyond = {child_id: _node_from_id(child_id, self.globals, self._owner)
+                      for child_id, child_index in zip(child_ids, child_indices) if child_index < 0}
+            execute_randomness_dependant_functions_batch(list(beyond.values()))
+            return [float(book.heuristic_value[child_index]) if child_index >= 0 else beyond[child_id].heuristic_value()
+                    for child_id, child_index in zip(child_ids, child_indices)]
+        return self._owned_current().child_heuristics()
+
+    def ordered_actions(self, descending: bool|None=None) -> list[int]:
+        """Return the current state's actions ordered by the heuristic values of the resulting
+        states. By default, the best actions for the player to move come first."""
+        if descending is None:
+            descending = self.player() == Player.MAX
+        heuristics = self.child_heuristics()
+        return sorted(range(len(heuristics)), key=heuristics.__getitem__, reverse=descending)
+
+    def unique_actions(self) -> list[tuple[int, int]]:
+        """Return one action for every distinct child of the current state, together with the 
+        number of actions leading to that child. Symmetric duplicates are thereby collapsed."""
+        if self._walking_book():
+            unique: dict[int, list[int]] = {}
+            for action, child_id in enumerate(self._book.child_ids(self._book_path[-1])):
+                if child_id in unique:
+                    unique[child_id][1] += 1
+                else:
+                    unique[child_id] = [action, 1]
+            return [(action, multiplicity) for action, multiplicity in unique.values()]
+        return self._owned_current().unique_actions()
+
+    def expansion(self) -> Expansion:
+        """Return the current state's branching factor, heuristic value and child ids."""
+        if self._walking_book():
+            return self._book.expansion(self._book_path[-1])
+        return self._owned_current().expansion()
+
+    def child_ids(self) -> list[int]:
+        """Return the ids of the current state's children, indexed by action."""
+        if self._walking_book():
+            return self._book.child_ids(self._book_path[-1])
+        node = self._owned_current()
+        node.actions()
+        return [child.id for child in node.children]
 
     def make(self, action: int) -> Self:
-        """Transition to the next state via `action` (represented as an index into the states children)."""
+        """Transition to the next state via `action` (represented as an index into the states children).
+        Only the children up to `action` are generated, unless the graph has expansion caches.
+        Within the opening book no state is generated, see `_walking_book`."""
+        node = self._current
+        if node is None or node.owner is not self._owner:
+            if self._walking_book():
+                return self._make_in_book(action)
+            node = self._owned_current()
+        if node.is_terminal():
+            raise TerminalHasNoChildren
+        branching_factor = node.branching_factor()
+        if not 0 <= action < branching_factor:
+            raise ValueError(f"No action {action} among available actions {list(range(branching_factor))}.")
+        self._current = node.child(action)
+        self._writable_path_counts()[self._current.id] += 1
+        if self.globals.hooks.active:
+            self._fire_make(action)
+        return self
+
+    def _make_in_book(self, action: int) -> Self:
+        """Move along the opening book's arrays. Only a move leaving the book creates a
+        state, which becomes the first one below the walked part of the path."""
+        book, index = self._book, self._book_path[-1]
         if self.is_terminal():
             raise TerminalHasNoChildren
-        actions = self._current.actions()
-        if not action in actions:
-            raise ValueError(f"No action {action} among available actions {actions}.")
-        self._current = self._current.children[action]
+        branching_factor = int(book.branching_factor[index])
+        if not 0 <= action < branching_factor:
+            raise ValueError(f"No action {action} among available actions {list(range(branching_factor))}.")
+        position = int(book.child_offsets[index]) + action
+        child_index = int(book.child_index[position])
+        self._book_actions.append(int(book.child_action[position])) # like StateNode.action
+        if child_index >= 0:
+            self._book_path.append(child_index)
+            child_id = book.state_id(child_index)
+        else:
+            child_id = (int(book.child_hi[position]) << 64) | int(book.child_lo[position])
+            self._current = _node_from_id(child_id, self.globals, self._owner)
+            self._current.action = self._book_actions[-1]
+            if self.globals.budget is not None:
+                self.globals.budget.live_nodes += 1
+        self._writable_path_counts()[child_id] += 1
         return self
+
+    def _fire_make(self, action: int) -> None:
+        """Call the callbacks registered for the make event, and for the leaf event if the
+        new state is terminal."""
+        node, hooks = self._current, self.globals.hooks
+        if hooks.make is None and hooks.leaf is None:
+            return
+        view = self.globals.hook_view(node)
+        try:
+            for callback in hooks.make or ():
+                callback(view, action)
+            if hooks.leaf is not None and node.is_terminal():
+                for callback in hooks.leaf:
+                    callback(view)
+        finally:
+            self.globals.release_hook_view()
+
+    def _fire_undo(self) -> None:
+        """Call the callbacks registered for the undo event."""
+        callbacks = self.globals.hooks.undo
+        if callbacks is None:
+            return
+        view = self.globals.hook_view(self._current)
+        try:
+            for callback in callbacks:
+                callback(view)
+        finally:
+            self.globals.release_hook_view()
     
     def make_random(self) -> Self:
         """Make a random action."""
         if self.is_terminal():
             raise TerminalHasNoChildren
-        actions = self.actions()
-        i = self._RNG.next_int(high=len(actions)-1)
-        self.make(actions[i])
+        if self._walking_book():
+            branching_factor = int(self._book.branching_factor[self._book_path[-1]])
+        else:
+            branching_factor = self._owned_current().branching_factor()
+        i = self._RNG.next_int(high=branching_factor-1)
+        self.make(i)
         return self
 
     def undo(self) -> Self:
         """Move back to previous state."""
-        if self._current.parent is None:
+        in_book = self._current is None or self._current.parent is None # otherwise never the root
+        if in_book and self.is_root():
             raise RootHasNoParent
-        self._current = self._current.parent
-        self._current.reset() # release memory as we climb back up the tree
+        path_counts = self._writable_path_counts()
+        state_id = self.id() if in_book else self._current.id
+        path_counts[state_id] -= 1
+        if not path_counts[state_id]:
+            del path_counts[state_id]
+        if in_book:
+            return self._undo_in_book()
+        budget = self.globals.budget
+        if budget is not None:
+            # the state left behind and its children are released along with the parent's children,
+            # the state itself is only among those if the parent was not evicted meanwhile
+            budget.live_nodes -= len(self._current._children) + (0 if self._current.parent._children else 1)
+        parent = self._current.parent
+        if parent.owner is self._owner:
+            parent.reset() # release memory as we climb back up the tree
+        else:
+            parent = parent._fresh_copy(self._owner) # shared with a fork, so replaced by a reset copy of our own
+        self._current = parent
+        if self.globals.hooks.active:
+            self._fire_undo()
+        elif parent.parent is None:
+            self._enter_book() # back at the root, which may be in the book again
         return self
     
+    def _undo_in_book(self) -> Self:
+        """Move back along the opening book's arrays, releasing the state which left the
+        book if the move back returns into it."""
+        if self._current is None:
+            self._book_path.pop()
+        else:
+            if self.globals.budget is not None:
+                self.globals.budget.live_nodes -= 1 + len(self._current._children)
+            self._current = None
+        self._book_actions.pop()
+        if self.globals.hooks.active:
+            self._owned_current()
+            self._fire_undo()
+        return self
+
+    def _enter_book(self) -> None:
+        """Walk the opening book's arrays from the root, if the graph's first expansion cache
+        is an opening book holding the root."""
+        caches = self.globals.expansion_caches
+        if self._book_path or not caches or not isinstance(caches[0], OpeningBook):
+            return
+        index = caches[0].index(self._root.id)
+        if index is not None:
+            self._book = caches[0]
+            self._book_path = [index]
+            self._current = None
+
+    def _walking_book(self) -> bool:
+        """Return true if the current state is within the opening book, and only tracked as
+        an index into its arrays. The states from the root down to it, and their expansions,
+        are then read from the book without creating any StateNodes. Hooks need states to
+        be bound to, so once they are registered the walked path is turned into states."""
+        if self._current is not None:
+            return False
+        if self.globals.hooks.active:
+            self._owned_current()
+            return False
+        return True
+
+    def _leave_book(self) -> StateNode:
+        """Replace the walked part of the path with states, and return the current one."""
+        node = self._root
+        if node.owner is not self._owner:
+            node = node._fresh_copy(self._owner)
+        actions = self._book_actions
+        self._book_path, self._book_actions = [], []
+        for action in actions:
+            node = node.child(action)
+        self._current = node
+        return node
+
+    def fork(self) -> "SyntheticGraph":
+        """Return a new cursor positioned at the current state, sharing everything generated
+        so far with this graph. Forking takes constant time and memory: both cursors get new
+        ownership tokens, which turns the states generated so far read-only. A cursor about
+        to evaluate, expand or reset a state it does not own first replaces it with a fresh
+        copy of its own, which regenerates the same values. Cursors therefore never change
+        each other's states, and forks can be moved independently, also on different threads
+        (provided any expansion caches they share are thread-safe)."""
+        forked = object.__new__(SyntheticGraph)
+        self._path_counts_shared = True
+        forked.__dict__.update(self.__dict__)
+        forked._RNG = self._RNG.copy()
+        forked._book_path, forked._book_actions = list(self._book_path), list(self._book_actions)
+        if self.globals.budget is not None:
+            self.globals.budget.add_cursor(forked)
+        self._owner = object()
+        forked._owner = object()
+        return forked
+
+    def __copy__(self) -> "SyntheticGraph":
+        return self.fork()
+
+    def _collect_live_nodes(self, seen: set[int]) -> int:
+        """Add the ids of the states this cursor keeps alive to `seen`, see `Budget.recount`,
+        and return how many of the newly added ones it owns. While the path walks the opening
+        book, the root stands in for the states walked."""
+        owned = 0
+        if self._book_path and id(self._root) not in seen:
+            seen.add(id(self._root))
+            owned += self._root.owner is self._owner
+        if self._current is not None:
+            owned += self._current._collect_live_nodes(seen, self._owner)
+        return owned
+
+    def _owned_current(self) -> StateNode:
+        """Return the current state, first replacing it with a fresh copy of this cursor's
+        own if it is shared with a fork. Within the opening book, the walked part of the
+        path is replaced with states first."""
+        node = self._current
+        if node is None:
+            return self._leave_book()
+        if node.owner is not self._owner:
+            node = self._current = node._fresh_copy(self._owner)
+        return node
+
+    def _writable_path_counts(self) -> Counter[int]:
+        """Return the occurrences of ids on the current path for updating, first copying
+        them if they are still shared with a fork."""
+        if self._path_counts_shared:
+            self._path_counts = Counter(self._path_counts)
+            self._path_counts_shared = False
+        return self._path_counts
+
+    def path(self) -> list[int]:
+        """Return the sequence of actions leading from the root to the current state."""
+        path: list[int] = []
+        node = self._current
+        while node is not None and node.parent is not None:
+            assert(node.action is not None)
+            path.append(node.action)
+            node = node.parent
+        path.reverse()
+        return self._book_actions + path
+
+    def goto(self, path: list[int]) -> Self:
+        """Move to the state reached by following `path` from the root. The actions are not
+        validated, so `path` should come from `path()` on a graph with the same parameters."""
+        while not self.is_root():
+            self.undo()
+        if self.globals.hooks.active or self._current is None:
+            for action in path:
+                self.make(action)
+            return self
+        node = self._owned_current()
+        path_counts = self._writable_path_counts()
+        for action in path:
+            node = node.child(action)
+            path_counts[node.id] += 1
+        self._current = node
+        return self
+
+    def encode_id(self, true_value: int, player: Player, depth: int, tspace_record: int) -> int:
+        """Return the id of the state with the given attributes. It is up to the caller to
+        make sure that such a state is actually reachable."""
+        return self._root._encode_id(true_value, player, depth, tspace_record) # type: ignore
+
+    def transposition_space_size(self, depth: int) -> int:
+        """Return the size of the transposition space at `depth`. States of that depth have
+        transposition space records in [0, size]."""
+        rng = RNGHasher(distribution=self.globals.vars.distribution, seed=self.globals.vars.seed)
+        return self.globals.funcs.transposition_space_function(rng.next_int, rng.next_float, self.globals.vars, depth)
+
+    def sample_states(self, depth: int, n: int, true_value: int|None=None, seed: int|None=None,
+                      player: Player|None=None) -> np.ndarray:
+        """Return the ids of `n` random states at `depth`, without traversing the graph. Ids
+        are drawn uniformly from the states the depth can hold: transposition space records
+        are uniform, and so are true values and players, unless `true_value` or `player` is
+        given. Only when every move advances the depth by exactly one (the default child
+        depth function with child_depth_minumum = child_depth_maximum = 1) does the depth
+        determine the player, by its parity relative to the root, and then only that player
+        is sampled. Samples are not weighted by how often a search would reach the states,
+        and are not necessarily reachable from the root, but behave like any other state
+        once passed to `set_root`. Samples are reproducible, by default from the graph's seed."""
+        if not 0 <= depth <= self.globals.vars.max_depth:
+            raise ValueError(f"depth must be in [0, {self.globals.vars.max_depth}].")
+        if not n >= 0:
+            raise ValueError("n must be >= 0.")
+        if not (true_value is None or true_value in [-1, 0, 1]):
+            raise ValueError("true_value must be -1, 0, or 1.")
+        rng = random.Random(f"{self.globals.vars.seed if seed is None else seed}.{depth}")
+        global_vars = self.globals.vars
+        if (inspect.unwrap(self.globals.funcs.child_depth_function) is default_child_depth_function # may be wrapped by a Timeline
+                and global_vars.child_depth_minumum == global_vars.child_depth_maximum == 1):
+            same_player = (depth - self._root.depth) % 2 == 0
+            depth_player = self._root.player if same_player else (Player.MAX if self._root.player == Player.MIN else Player.MIN)
+            if player is not None and player != depth_player:
+                raise ValueError(f"Every move advances the depth by one, so depth {depth} only holds {depth_player.name} states.")
+            player = depth_player
+        # records occupy the lowest bits of an id, so they can simply be added to a base id
+        base_ids = {(value, p): self.encode_id(value, p, depth, 0) for value in [-1, 0, 1] for p in Player}
+        records_end = self.transposition_space_size(depth) + 1
+        ids: list[int] = []
+        for _ in range(n):
+            value = rng.choice((-1, 0, 1)) if true_value is None else true_value
+            state_player = rng.choice((Player.MIN, Player.MAX)) if player is None else player
+            ids.append(base_ids[(value, state_player)] + rng.randrange(records_end))
+        return np.array(ids, dtype=object)
+
+    def solve_retrograde(self, max_level_size: int=MAX_RETROGRADE_LEVEL_SIZE) -> "RetrogradeSolution":
+        """Enumerate every state reachable from the current state and back up minimax values
+        from the terminals, checking them against the true values. Only feasible for small
+        transposition spaces, see `sssg.solvers.retrograde.solve`."""
+        from .solvers.retrograde import solve # the solvers depend on this module
+        return solve(self, max_level_size)
+
+    def estimate_shape(self, max_depth: int|None=None, probes: int=1000, seed: int=0) -> ShapeEstimate:
+        """Estimate the number of states, terminal fraction, true value mix and branching of
+        each depth below the current state without traversing the graph, if the default
+        behavior functions are used. Otherwise the estimate is made with `probes` random
+        walks, see `sssg.estimation.estimate_shape`."""
+        return estimate_shape(self, max_depth, probes, seed)
+
+    def uncached(self) -> "SyntheticGraph":
+        """Return an independent graph at the same position, which generates every state
+        itself instead of consulting the expansion caches."""
+        arguments = dict(self._arguments, expansion_caches=None, precompute_plies=0)
+        return _restore_graph(arguments, self._root.id, self.path(), self._RNG.copy())
+
+    def evaluate(self, state_ids: Sequence[int], batch_size: int=4096) -> tuple[np.ndarray, np.ndarray]:
+        """Return the branching factors and heuristic values of many states, computed in
+        batches of `batch_size` states without generating any children. The expansion caches
+        are not consulted, so the values always follow the graph's current parameters."""
+        if not batch_size > 0:
+            raise ValueError("batch_size must be > 0.")
+        globals = self.uncached().globals
+        branching_factors = np.empty(len(state_ids), dtype=np.int64)
+        heuristic_values = np.empty(len(state_ids), dtype=np.float64)
+        for start in range(0, len(state_ids), batch_size):
+            nodes = [_node_from_id(int(state_id), globals) for state_id in state_ids[start:start+batch_size]]
+            execute_randomness_dependant_functions_batch(nodes)
+            branching_factors[start:start+len(nodes)] = [node.branching_factor() for node in nodes]
+            heuristic_values[start:start+len(nodes)] = [node.heuristic_value() for node in nodes]
+        return branching_factors, heuristic_values
+
+    def recompute_heuristic_values(self, cache: ExpansionCache, state_ids: Sequence[int],
+                                   branching_factors: np.ndarray, checks: int=16) -> np.ndarray:
+        """Return the heuristic values of states stored in an expansion cache, recomputed
+        with this graph's parameters. Raises a ValueError if the cache's structure does not
+        match this graph: the branching factors of all states are compared, and the children
+        of `checks` states spread over the cache are regenerated and compared."""
+        new_branching_factors, heuristic_values = self.evaluate(state_ids)
+        if not np.array_equal(new_branching_factors, branching_factors):
+            raise ValueError("The cache's branching factors differ from this graph's.")
+        if len(state_ids) > 0 and checks > 0:
+            cursor = self.uncached()
+            for i in np.linspace(0, len(state_ids) - 1, min(checks, len(state_ids)), dtype=np.int64).tolist():
+                cursor.set_root(int(state_ids[i]))
+                expansion = cache.lookup(int(state_ids[i]))
+                if expansion is not None and cursor.child_ids() != expansion.child_ids:
+                    raise ValueError("The cache's children differ from this graph's. Does the heuristic value "
+                                     "function make a number of draws depending on the heuristic parameters?")
+        return heuristic_values
+
+    def shares_structure_with(self, other: "SyntheticGraph") -> bool:
+        """Return true if the graphs agree on every parameter their states and edges depend
+        on (see STRUCTURE_PARAMETERS), so that they consist of the same states and edges,
+        provided the heuristic value functions always make the same number of draws."""
+        return all(self._arguments[name] == other._arguments[name] for name in STRUCTURE_PARAMETERS)
+
+    def with_heuristic_parameters(self, **changes: Any) -> "SyntheticGraph":
+        """Return a graph at the same position which only differs in the given heuristic
+        parameters. Its opening book and node arenas are copies of this graph's, with the
+        heuristic values recomputed in one vectorized pass, so the generated structure is
+        reused instead of regenerated. Other expansion caches are left out, since they hold
+        this graph's heuristic values.
+
+        The heuristic value function must always make the same number of draws, whatever the
+        parameters (the default one does), since children are drawn after it."""
+        unknown = set(changes) - (ATTRIBUTE_DEPENDENCIES["heuristic_value"] - STRUCTURE_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Only heuristic parameters can be changed, not {sorted(unknown)}.")
+        arguments = dict(self._arguments, expansion_caches=None, precompute_plies=0, **changes)
+        graph = _restore_graph(arguments, self._root.id, self.path(), self._RNG.copy())
+        for cache in self.globals.expansion_caches:
+            if isinstance(cache, (OpeningBook, NodeArena)):
+                cache = copy.deepcopy(cache)
+                cache.recompute_heuristics(graph)
+                graph.globals.expansion_caches.append(cache)
+        return graph
+
     def set_root(self, state_id: int) -> Self:
         """Set the given state_id as the new root. This will destroy anything already
         generated."""
-        true_value = extract_true_value_from_id(state_id)
-        player = extract_player_from_id(state_id)
-        depth = extract_depth_from_id(state_id, self.globals.vars.max_depth.bit_length())
-        tspace_record = extract_tspace_record_from_id(state_id, 
-                            self.globals.vars.max_transposition_space_size.bit_length())
-        self._root = StateNode(
-            stateid=state_id, globals=self.globals, true_value=true_value, 
-            player=player, depth=depth, tspace_record=tspace_record, parent=None)
-        self._current: StateNode = self._root
+        if self.globals.budget is not None:
+            # the states this cursor owns are released, those shared with forks may still be in use
+            self.globals.budget.live_nodes += 1 - self._collect_live_nodes(set())
+        self._root = _node_from_id(state_id, self.globals, self._owner)
+        self._current: StateNode|None = self._root # None while walking the opening book
+        self._path_counts: Counter[int] = Counter([state_id]) # occurrences of ids on the current path
+        self._path_counts_shared = False
+        # while walking the opening book, the book indices of the states from the root down to
+        # the current one or the first state beyond the book, and the actions between them
+        self._book: OpeningBook|None = None
+        self._book_path: list[int] = []
+        self._book_actions: list[int] = []
+        self._enter_book()
         return self
+
+
+def _node_from_id(state_id: int, globals: GlobalParameters, owner: object=None) -> StateNode:
+    """Construct a parentless state from its id."""
+    return StateNode(
+        stateid=state_id, globals=globals,
+        true_value=extract_true_value_from_id(state_id),
+        player=extract_player_from_id(state_id),
+        depth=extract_depth_from_id(state_id, globals.vars.max_depth.bit_length()),
+        tspace_record=extract_tspace_record_from_id(state_id, globals.vars.max_transposition_space_size.bit_length()),
+        parent=None, owner=owner)
+
+
+def _restore_graph(arguments: dict[str, Any], root_id: int, path: list[int], rng: RNGHasher) -> SyntheticGraph:
+    """Reconstruct a pickled SyntheticGraph."""
+    graph = SyntheticGraph(**arguments)
+    if graph.id() != root_id:
+        graph.set_root(root_id)
+    graph.goto(path)
+    graph._RNG = rng
+    return graph
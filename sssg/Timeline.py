@@ -0,0 +1,205 @@
+from collections.abc import Callable, Iterable
+from typing import Any
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+from .RNGHasher import RNGHasher
+from .custom_types import RandomnessDistribution as Dist
+
+
+ENVIRONMENT_VARIABLE = "SSSG_TIMELINE" # path of a timeline recorded by every graph of the process
+SAMPLE_ENVIRONMENT_VARIABLE = "SSSG_TIMELINE_SAMPLE_EVERY"
+MAX_EVENTS = 10**6 # spans kept for the Chrome trace, later ones only count towards the collapsed stacks
+
+
+class _Span():
+    __slots__ = ("name", "start", "children")
+
+    def __init__(self, name: str, start: int):
+        self.name = name
+        self.start = start
+        self.children = 0 # time spent in nested spans
+
+
+class Timeline():
+    """Records where the time of a run goes, as nested spans: the evaluation (branching
+    factor and heuristic value) and expansion (children) of states, every behavior function
+    called meanwhile, every RNG hash and every expansion cache lookup and store. Only every
+    `sample_every`th evaluation or expansion is recorded, with everything nested in it, which
+    bounds the overhead. Graphs without a timeline pay nothing for this.
+
+    `write()`, also called at exit if anything is left unwritten, writes the spans to `path` in Chrome's trace event format
+    (open it in chrome://tracing or Perfetto) and their self times summed per stack to
+    `path` + ".folded", in the collapsed stack format of flamegraph tools. "{pid}" in the
+    path is replaced by the process id, so that worker processes write files of their own.
+
+    Pass a path or a Timeline as the graph's `timeline`, or set the SSSG_TIMELINE (and
+    optionally SSSG_TIMELINE_SAMPLE_EVERY) environment variable to record every graph."""
+    _shared: dict[tuple[str, int], "Timeline"] = {}
+
+    def __init__(self, path: str, sample_every: int=1):
+        if not sample_every > 0:
+            raise ValueError("sample_every must be > 0.")
+        self.path_template = path
+        self.sample_every = sample_every
+        self.events: list[tuple[str, int, int, int]] = [] # name, start, duration (ns) and thread
+        self.stacks: dict[tuple[str, ...], int] = {} # self time (ns) per stack of span names
+        self.dropped = 0 # spans left out of the Chrome trace after MAX_EVENTS
+        self._local = threading.local()
+        self._candidates = 0
+        self._lock = threading.Lock()
+        self._unwritten = False
+        atexit.register(self._write_at_exit)
+
+    @classmethod
+    def shared(cls, path: str, sample_every: int=1) -> "Timeline":
+        """Return the process's timeline for `path`, creating it if needed, so that all
+        graphs recording to the same path share one timeline."""
+        timeline = cls._shared.get((path, sample_every))
+        if timeline is None:
+            timeline = cls._shared[(path, sample_every)] = cls(path, sample_every)
+        return timeline
+
+    @classmethod
+    def from_environment(cls) -> "Timeline|None":
+        path = os.environ.get(ENVIRONMENT_VARIABLE)
+        if not path:
+            return None
+        return cls.shared(path, int(os.environ.get(SAMPLE_ENVIRONMENT_VARIABLE, "1")))
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        """Timelines are sent to other processes as their path, where they record on their own."""
+        return (Timeline.shared, (self.path_template, self.sample_every))
+
+    @property
+    def path(self) -> str:
+        return self.path_template.replace("{pid}", str(os.getpid()))
+
+    def _stack(self) -> list[_Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+            self._local.skipping = 0
+        return stack
+
+    @property
+    def recording(self) -> bool:
+        """True while a sampled span is open on this thread."""
+        return bool(getattr(self._local, "stack", None))
+
+    def _begin(self, name: str) -> None:
+        self._stack().append(_Span(name, time.perf_counter_ns()))
+
+    def _end(self) -> None:
+        end = time.perf_counter_ns()
+        stack = self._local.stack
+        span = stack.pop()
+        duration = end - span.start
+        if stack:
+            stack[-1].children += duration
+        key = tuple(s.name for s in stack) + (span.name,)
+        with self._lock:
+            self._unwritten = True
+            self.stacks[key] = self.stacks.get(key, 0) + duration - span.children
+            if len(self.events) < MAX_EVENTS:
+                self.events.append((span.name, span.start, duration, threading.get_ident()))
+            else:
+                self.dropped += 1
+
+    def traced(self, name: str, function: Callable[..., Any], *args: Any) -> Any:
+        """Call `function(*args)` as a span, in which the hashes of the RNGs from `rng()` are
+        timed as nested spans. Outside of other spans, only every `sample_every`th call is recorded."""
+        stack = self._stack()
+        if not stack:
+            if self._local.skipping:
+                return function(*args)
+            with self._lock:
+                self._candidates += 1
+                sampled = self._candidates % self.sample_every == 0
+            if not sampled:
+                self._local.skipping += 1
+                try:
+                    return function(*args)
+                finally:
+                    self._local.skipping -= 1
+        self._begin(name)
+        try:
+            return function(*args)
+        finally:
+            self._end()
+
+    def rng(self, distribution: Dist, nodeid: int, seed: int) -> RNGHasher:
+        """Return an RNG for a state of a graph recording to this timeline, whose hashes are
+        timed while a sampled span is open on the calling thread."""
+        return _TimedRNGHasher(self, distribution=distribution, nodeid=nodeid, seed=seed)
+
+    def call(self, name: str, function: Callable[..., Any], *args: Any) -> Any:
+        """Call `function(*args)`, as a span if a sampled span is open."""
+        if not self.recording:
+            return function(*args)
+        self._begin(name)
+        try:
+            return function(*args)
+        finally:
+            self._end()
+
+    def wrap(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        """Return `function` recording its calls as spans named `name`, along with its
+        StateView and batch versions, if it has any."""
+        @functools.wraps(function)
+        def wrapper(*args: Any) -> Any:
+            return self.call(name, function, *args)
+        view_function = getattr(function, "state_view", None)
+        if view_function is function:
+            wrapper.state_view = wrapper # type: ignore[attr-defined]
+        elif view_function is not None:
+            wrapper.state_view = self.wrap(name, view_function) # type: ignore[attr-defined]
+        batch_function = getattr(function, "batch", None)
+        if batch_function is not None:
+            wrapper.batch = self.wrap(name + ".batch", batch_function) # type: ignore[attr-defined]
+        return wrapper
+
+    def _write_at_exit(self) -> None:
+        if self._unwritten:
+            self.write()
+
+    def write(self) -> None:
+        """Write the Chrome trace and the collapsed stacks recorded so far."""
+        if not self.events and not self.stacks:
+            return
+        path = self.path
+        with self._lock:
+            origin = min((start for _, start, _, _ in self.events), default=0)
+            events = [{"name": name, "cat": "sssg", "ph": "X", "ts": (start - origin) / 1000, "dur": duration / 1000,
+                       "pid": os.getpid(), "tid": thread} for name, start, duration, thread in self.events]
+            stacks = sorted(self.stacks.items())
+            self._unwritten = False
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ns",
+                       "otherData": {"sample_every": self.sample_every, "dropped": self.dropped}}, file)
+        with open(path + ".folded", "w") as file:
+            for stack, self_time in stacks:
+                file.write(f"{';'.join(stack)} {max(0, self_time // 1000)}\n") # microseconds
+
+
+class _TimedRNGHasher(RNGHasher):
+    """RNGHasher recording its hashes as spans of its timeline. The states of graphs with a
+    timeline are created with these, so graphs without one keep plain RNGHashers."""
+    __slots__ = ("timeline",)
+
+    def __init__(self, timeline: Timeline, distribution: Dist, nodeid: int=0, seed: int=0):
+        super().__init__(distribution=distribution, nodeid=nodeid, seed=seed)
+        self.timeline = timeline
+
+    def hash(self) -> int:
+        if not self.timeline.recording:
+            return RNGHasher.hash(self)
+        self.timeline._begin("rng_hash")
+        try:
+            return RNGHasher.hash(self)
+        finally:
+            self.timeline._end()
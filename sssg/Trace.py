@@ -0,0 +1,130 @@
+from typing import BinaryIO
+import struct
+import weakref
+import numpy as np
+
+from .OpeningBook import OpeningBook
+from .custom_types import Expansion
+from .custom_exceptions import TraceDivergence
+
+
+MAGIC = b"SSSGTRC1"
+WORD_MASK = 2**64 - 1
+RECORD = struct.Struct(">QQqdI") # id (two words), branching factor, heuristic value, number of children
+CHILD_DTYPE = np.dtype([("id_hi", ">u8"), ("id_lo", ">u8")])
+
+
+def _pack(state_id: int, expansion: Expansion) -> bytes:
+    children = np.empty(len(expansion.child_ids), dtype=CHILD_DTYPE)
+    children["id_hi"] = [child_id >> 64 for child_id in expansion.child_ids]
+    children["id_lo"] = [child_id & WORD_MASK for child_id in expansion.child_ids]
+    header = RECORD.pack(state_id >> 64, state_id & WORD_MASK, expansion.branching_factor,
+                         expansion.heuristic_value, len(expansion.child_ids))
+    return header + children.tobytes()
+
+
+def read_trace(path: str) -> tuple[list[int], list[Expansion]]:
+    """Return the state ids and expansions of a trace, in the order they were recorded."""
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a trace file.")
+    state_ids: list[int] = []
+    expansions: list[Expansion] = []
+    offset = len(MAGIC)
+    while offset < len(data):
+        id_hi, id_lo, branching_factor, heuristic_value, child_count = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        children = np.frombuffer(data, dtype=CHILD_DTYPE, count=child_count, offset=offset)
+        offset += child_count * CHILD_DTYPE.itemsize
+        state_ids.append((id_hi << 64) | id_lo)
+        expansions.append(Expansion(
+            branching_factor=branching_factor,
+            heuristic_value=heuristic_value,
+            child_ids=[(hi << 64) | lo for hi, lo in zip(children["id_hi"].tolist(), children["id_lo"].tolist())]))
+    return state_ids, expansions
+
+
+class TraceRecorder():
+    """Expansion cache which never serves anything, but writes every state's expansion to a
+    binary trace file the first time the state is generated. Later expansions of the same
+    state are checked against the first one, and mismatches (which mean the graph's behavior
+    functions are not deterministic) are collected in `divergences`. Only a 64 bit hash of
+    each recorded expansion is kept in memory for this, the expansions themselves are only
+    in the file.
+
+    Records are 16 byte big-endian ids followed by the branching factor, heuristic value and
+    child ids. Child true values, players and depths are encoded in their ids. The file is
+    closed by `close()`, on leaving a `with` block, or once the recorder is garbage collected."""
+    def __init__(self, path: str):
+        self.path = path
+        self.divergences: list[int] = []
+        self._recorded: dict[int, int] = {} # hashes of the recorded expansions' records
+        self._file: BinaryIO = open(path, "wb")
+        self._close = weakref.finalize(self, self._file.close)
+        self._file.write(MAGIC)
+
+    def __len__(self) -> int:
+        return len(self._recorded)
+
+    def __enter__(self) -> "TraceRecorder":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def lookup(self, state_id: int) -> Expansion|None:
+        return None
+
+    def store(self, state_id: int, expansion: Expansion) -> None:
+        record = _pack(state_id, expansion)
+        recorded = self._recorded.get(state_id)
+        if recorded is None:
+            self._recorded[state_id] = hash(record)
+            self._file.write(record)
+        elif recorded != hash(record):
+            self.divergences.append(state_id)
+
+    def close(self) -> None:
+        self._close()
+
+
+class TraceReplayer():
+    """Expansion cache serving the expansions of a recorded trace, so that a search repeating
+    a recorded one never runs the behavior functions for the states it expands.
+
+    A state which has to be expanded but is missing from the trace means that the search
+    has diverged from the recorded one. It is generated as usual and collected in `misses`,
+    or raises TraceDivergence if `strict`. With `verify`, nothing is served: every state is
+    generated and compared against the trace, and mismatching states are collected in
+    `divergences` (or raise if `strict`)."""
+    def __init__(self, path: str, strict: bool=False, verify: bool=False):
+        self.strict = strict
+        self.verify = verify
+        self.hits = 0
+        self.misses: list[int] = []
+        self.divergences: list[int] = []
+        self._book = OpeningBook(*read_trace(path))
+
+    def __len__(self) -> int:
+        return len(self._book)
+
+    def lookup(self, state_id: int) -> Expansion|None:
+        if self.verify:
+            return None
+        expansion = self._book.lookup(state_id)
+        if expansion is not None:
+            self.hits += 1
+        return expansion
+
+    def store(self, state_id: int, expansion: Expansion) -> None:
+        """Called for every state which was generated rather than served from the trace."""
+        recorded = self._book.lookup(state_id) if self.verify else None
+        if recorded is None:
+            if self.strict:
+                raise TraceDivergence(f"State {state_id} is not in the trace.")
+            self.misses.append(state_id)
+        elif recorded != expansion:
+            if self.strict:
+                raise TraceDivergence(f"State {state_id} expanded to {expansion}, but {recorded} was recorded.")
+            self.divergences.append(state_id)
@@ -0,0 +1,45 @@
+from typing import Any, TypeVar
+from collections.abc import Callable
+
+from .custom_types import StateViewFunction
+
+
+BatchFunction = TypeVar("BatchFunction", bound=Callable[..., Any])
+
+
+def state_view_function(function: StateViewFunction) -> StateViewFunction:
+    """Declare that a behavior function takes a StateView in place of `randint`, `randf` and
+    `params`, e.g. `branching_function(view)` or `child_true_value_function(view,
+    branching_factor, child_true_value_information)`. Each thread reuses one view for every
+    state, which does not compute the transposition space size unless it is read, so calling
+    such functions allocates nothing. Draw randomness from `view.rng.next_int` and
+    `view.rng.next_float`.
+
+    A function taking the usual arguments can carry a view version as its `state_view`
+    attribute, which is then used instead; this decorator simply points the attribute at
+    the function itself."""
+    function.state_view = function # type: ignore[attr-defined]
+    return function
+
+
+def batch_version(scalar_function: Callable[..., Any]) -> Callable[[BatchFunction], BatchFunction]:
+    """Register the decorated function as the batch version of `scalar_function`, which is
+    then used whenever the graph evaluates many states at once (e.g. `child_heuristics()`).
+    Only branching and heuristic value functions are evaluated in batches.
+
+    A batch function takes `randint`, `randf` and `params` like the scalar version, but
+    `params` is a BatchStateParams holding one array entry per state, and every draw
+    returns an array holding one value per state. Draws accept array bounds, and a boolean
+    `where` array restricting the draw to some of the states. The function must return an
+    array with one result per state, and must draw for each state exactly what the scalar
+    version would draw for it, so that both produce the same graph:
+
+        @batch_version(branching_function)
+        def branching_function_batch(randint, randf, params):
+            late = params.self.depth >= params.globals.terminal_minimum_depth
+            terminal = late & (randf(where=late) < params.globals.terminal_chance)
+            return np.where(terminal, 0, 3)"""
+    def register(batch_function: BatchFunction) -> BatchFunction:
+        scalar_function.batch = batch_function # type: ignore[attr-defined]
+        return batch_function
+    return register
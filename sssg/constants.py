@@ -3,3 +3,31 @@ HASH_OUTPUT_TMAX = 2**HASH_OUTPUT_BIT_LENGTH - 1
 ID_BIT_LENGTH = HASH_OUTPUT_BIT_LENGTH - 1 # because Python only has signed ints
 ID_TRUE_VALUE_BIT_LENGTH = 2
 ID_PLAYER_BIT_LENGTH = 1
+ID_TRUE_VALUE_BIT_SHIFT = ID_BIT_LENGTH - ID_TRUE_VALUE_BIT_LENGTH
+ID_PLAYER_BIT_SHIFT = ID_TRUE_VALUE_BIT_SHIFT - ID_PLAYER_BIT_LENGTH # the depth follows, then the tspace record
+FLOAT_EXACT_INT_LIMIT = 2**53 # largest magnitude up to which every integer is an exact float
+MAX_RETROGRADE_LEVEL_SIZE = 2**24 # possible states of a single depth the retrograde solver is willing to allocate
+APPROXIMATE_NODE_BYTES = 600 # memory held by a live StateNode, between a bare child (~400) and an evaluated one (~670)
+EVICTION_TARGET = 0.75 # share of the live node budget that eviction brings the live nodes back down to
+# constructor parameters which the root and each randomness-dependant attribute of a state depend on,
+# the ones appearing in none of them (caches, budgets, the timeline) do not affect the graph
+HEURISTIC_PARAMETERS = frozenset({
+    "heuristic_accuracy_base", "heuristic_depth_scaling", "heuristic_locality_scaling", "heuristic_value_function"})
+_BRANCHING_PARAMETERS = frozenset({
+    "seed", "distribution", "max_depth", "branching_factor_base", "branching_factor_variance", "terminal_chance",
+    "terminal_minimum_depth", "branching_function", "transposition_space_function"})
+ATTRIBUTE_DEPENDENCIES = {
+    # the root's id encodes its true value, and the bit lengths of depths and records follow from max_depth
+    "root": frozenset({"root_true_value", "max_depth"}),
+    "branching_factor": _BRANCHING_PARAMETERS,
+    # drawn after the branching factor, from the same RNG
+    "heuristic_value": _BRANCHING_PARAMETERS | HEURISTIC_PARAMETERS,
+    # drawn after the heuristic value, so children also depend on the number of draws the
+    # heuristic value function makes (but not on their values). The default always makes two.
+    "children": _BRANCHING_PARAMETERS | frozenset({
+        "child_depth_minumum", "child_depth_maximum", "locality_grouping", "true_value_forced_ratio",
+        "true_value_tie_chance", "true_value_similarity_chance", "symmetry_factor", "symmetry_frequency",
+        "child_true_value_function", "child_depth_function"}),
+}
+# parameters the states and edges of a graph depend on, changing any other parameter leaves them the same
+STRUCTURE_PARAMETERS = ATTRIBUTE_DEPENDENCIES["root"] | ATTRIBUTE_DEPENDENCIES["branching_factor"] | ATTRIBUTE_DEPENDENCIES["children"]
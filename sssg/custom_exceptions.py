@@ -1,3 +1,8 @@
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .custom_types import Budget
+
+
 class IdOverflow(Exception):
     pass
 class PropertyNotSet(Exception):
@@ -9,4 +14,12 @@ class RootHasNoParent(Exception):
 class RangeOutOfBounds(Exception):
     pass
 class TerminalHasNoChildren(Exception):
-    pass
\ No newline at end of file
+    pass
+class TraceDivergence(Exception):
+    pass
+class BudgetExceeded(Exception):
+    """Raised when a graph's budget is exhausted. `stats` holds a copy of the budget with
+    its counts at that moment."""
+    def __init__(self, message: str, stats: "Budget"):
+        super().__init__(f"{message} ({stats.live_nodes} live nodes, ~{stats.approximate_bytes} bytes, {stats.expansions} expansions)")
+        self.stats = stats
\ No newline at end of file
@@ -1,7 +1,17 @@
-from typing import Protocol
+from typing import Protocol, Any, TYPE_CHECKING
 from enum import Enum
 from collections.abc import Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import threading
+import weakref
+import numpy as np
+
+from .constants import APPROXIMATE_NODE_BYTES, ID_PLAYER_BIT_SHIFT
+if TYPE_CHECKING:
+    from .RNGHasher import RNGHasher
+    from .StateNode import StateNode
+    from .SyntheticGraph import SyntheticGraph
+    from .Timeline import Timeline
 
 class RandomnessDistribution(Enum):
     UNIFORM = 0
@@ -50,17 +60,74 @@ class StateParamsSelf:
 class StateParams:
     globals: GlobalVariables
     self: StateParamsSelf
+@dataclass
+class BatchStateParamsSelf:
+    """StateParamsSelf of several states, one array entry per state. Ids, records and sizes
+    may not fit into 64 bits, in which case their arrays hold Python ints (dtype=object)."""
+    id: list[int]
+    true_value: np.ndarray
+    player: np.ndarray # values of Player
+    depth: np.ndarray
+    transposition_space_record: np.ndarray
+    transposition_space_size: np.ndarray
+@dataclass
+class BatchStateParams:
+    globals: GlobalVariables
+    self: BatchStateParamsSelf
+
+class StateView():
+    """The state a behavior function is called for, as seen by functions taking the view
+    convention (see `behavior.state_view_function`). A graph keeps one view per thread which
+    is rebound to each state in place, so it is only valid during the call it was passed to.
+    `rng` is the state's RNG, and the transposition space size is only computed if read, once
+    per binding."""
+    __slots__ = ("globals", "rng", "id", "true_value", "player", "depth", "transposition_space_record",
+                 "_transposition_space_function", "_transposition_space_size", "node")
+
+    def __init__(self, globals: GlobalVariables, transposition_space_function: "TranspositionSpaceFunction"):
+        self.globals = globals
+        self._transposition_space_function = transposition_space_function
+        self.node: "StateNode|None" = None
+
+    def bind(self, node: "StateNode") -> "StateView":
+        """Point the view at `node`."""
+        self.node = node
+        self.rng: "RNGHasher" = node._RNG
+        self.id: int = node.id
+        self.true_value: int = node.true_value
+        self.player: Player = node.player
+        self.depth: int = node.depth
+        self.transposition_space_record: int = node.tspace_record
+        self._transposition_space_size: int|None = None
+        return self
+
+    @property
+    def transposition_space_size(self) -> int:
+        if self._transposition_space_size is None:
+            self._transposition_space_size = self._transposition_space_function(
+                self.rng.next_int, self.rng.next_float, self.globals, self.depth)
+        return self._transposition_space_size
 
 # use Protocol to support type hints for keyword argument
 class RandomFloatFunction(Protocol):
     def __call__(self, low: float=..., high: float=..., distribution: RandomnessDistribution|None=...) -> float: ...
 class RandomIntFunction(Protocol):
     def __call__(self, low: int=..., high: int=..., distribution: RandomnessDistribution|None=...) -> int: ...
+# batch versions draw once for every state where `where` is true
+class BatchRandomFloatFunction(Protocol):
+    def __call__(self, low: float|np.ndarray=..., high: float|np.ndarray=..., 
+                 distribution: RandomnessDistribution|None=..., where: np.ndarray|None=...) -> np.ndarray: ...
+class BatchRandomIntFunction(Protocol):
+    def __call__(self, low: int|np.ndarray=..., high: int|np.ndarray=..., 
+                 distribution: RandomnessDistribution|None=..., where: np.ndarray|None=...) -> np.ndarray: ...
 BranchingFunction = Callable[[RandomIntFunction, RandomFloatFunction, StateParams], int]
 ChildTrueValueFunction = Callable[[RandomIntFunction, RandomFloatFunction, StateParams, int, ChildTrueValueInformation], int]
 ChildDepthFunction = Callable[[RandomIntFunction, RandomFloatFunction, StateParams], int]
 TranspositionSpaceFunction = Callable[[RandomIntFunction, RandomFloatFunction, GlobalVariables, int], int]
 HeuristicValueFunction = Callable[[RandomIntFunction, RandomFloatFunction, StateParams], float]
+StateViewFunction = Callable[..., Any] # takes a StateView in place of randint, randf and params
+BatchBranchingFunction = Callable[[BatchRandomIntFunction, BatchRandomFloatFunction, BatchStateParams], np.ndarray]
+BatchHeuristicValueFunction = Callable[[BatchRandomIntFunction, BatchRandomFloatFunction, BatchStateParams], np.ndarray]
 
 @dataclass
 class GlobalFunctions:
@@ -70,7 +137,163 @@ class GlobalFunctions:
     transposition_space_function: TranspositionSpaceFunction
     heuristic_value_function: HeuristicValueFunction
 
+@dataclass
+class Expansion:
+    """Everything a state produces when it is expanded. True values, players, depths and
+    transposition space records of the children are encoded in their ids."""
+    branching_factor: int
+    heuristic_value: float
+    child_ids: list[int]
+
+class ExpansionCache(Protocol):
+    """Storage for expansions which lets states skip their behavior functions when they
+    have already been expanded elsewhere. All graphs sharing a cache must be constructed
+    with the same parameters."""
+    def lookup(self, state_id: int) -> Expansion|None: ...
+    def store(self, state_id: int, expansion: Expansion) -> None: ...
+
+@dataclass
+class Budget:
+    """Limits on the states a graph keeps alive and on the expansions it makes (None means
+    unlimited), together with the running counts they are checked against. The budget is
+    shared by a graph and its forks. The live node count is kept up to date incrementally
+    and recounted exactly over all of them whenever it exceeds the limit; bytes are estimated
+    from it. Copies leave the graphs out, so they are snapshots of the counts."""
+    max_live_nodes: int|None = None
+    max_bytes: int|None = None
+    max_expansions: int|None = None
+    live_nodes: int = 1
+    expansions: int = 0 # states whose children were generated by the behavior functions, cache hits excluded
+    evicted_nodes: int = 0
+    node_limit: int|None = field(init=False)
+    _cursors: "weakref.WeakSet[SyntheticGraph]" = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        limits = [self.max_live_nodes, None if self.max_bytes is None else self.max_bytes // APPROXIMATE_NODE_BYTES]
+        known = [limit for limit in limits if limit is not None]
+        self.node_limit = min(known) if known else None
+        self._cursors = weakref.WeakSet()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = dict(self.__dict__)
+        del state["_cursors"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._cursors = weakref.WeakSet()
+
+    def add_cursor(self, cursor: "SyntheticGraph") -> None:
+        """Count the states kept alive by `cursor` against the budget from now on."""
+        self._cursors.add(cursor)
+
+    def recount(self) -> int:
+        """Count the live nodes of every graph sharing the budget exactly, and return the
+        count. States shared between forks are counted once."""
+        seen: set[int] = set()
+        for cursor in list(self._cursors):
+            cursor._collect_live_nodes(seen)
+        self.live_nodes = len(seen)
+        return self.live_nodes
+
+    @property
+    def approximate_bytes(self) -> int:
+        return self.live_nodes * APPROXIMATE_NODE_BYTES
+
+HOOK_EVENTS = ("expand", "make", "undo", "leaf")
+
+class Hooks():
+    """Callbacks registered with `SyntheticGraph.on`, as one tuple per event. An event
+    without callbacks holds None. `active` is true if any event has callbacks, so that
+    checking for hooks costs a single attribute test while none are registered."""
+    __slots__ = HOOK_EVENTS + ("active",)
+
+    def __init__(self):
+        for event in HOOK_EVENTS:
+            setattr(self, event, None)
+        self.active = False
+
+    def add(self, event: str, callback: Callable[..., Any]) -> None:
+        if event not in HOOK_EVENTS:
+            raise ValueError(f"Unknown event {event}, expected one of {HOOK_EVENTS}.")
+        setattr(self, event, (getattr(self, event) or ()) + (callback,))
+        self.active = True
+
+    def remove(self, event: str, callback: Callable[..., Any]) -> None:
+        if event not in HOOK_EVENTS:
+            raise ValueError(f"Unknown event {event}, expected one of {HOOK_EVENTS}.")
+        callbacks = list(getattr(self, event) or ())
+        if callback not in callbacks:
+            raise ValueError(f"The callback is not registered for {event}.")
+        callbacks.remove(callback)
+        setattr(self, event, tuple(callbacks) or None)
+        self.active = any(getattr(self, event) is not None for event in HOOK_EVENTS)
+
 @dataclass
 class GlobalParameters:
     vars: GlobalVariables
     funcs: GlobalFunctions
+    expansion_caches: list[ExpansionCache] = field(default_factory=list)
+    budget: Budget|None = None
+    hooks: Hooks = field(default_factory=Hooks)
+    timeline: "Timeline|None" = None
+    # the behavior functions as called with a StateView bound to the state, resolved once so
+    # that calls do not check which convention each function takes, see `_view_convention`
+    call_branching_function: "StateViewFunction" = field(init=False, repr=False, compare=False)
+    call_child_true_value_function: "StateViewFunction" = field(init=False, repr=False, compare=False)
+    call_child_depth_function: "StateViewFunction" = field(init=False, repr=False, compare=False)
+    call_heuristic_value_function: "StateViewFunction" = field(init=False, repr=False, compare=False)
+    id_depth_bit_shift: int = field(init=False, repr=False, compare=False) # position of the depth in ids
+    _state_views: threading.local = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._state_views = threading.local()
+        self.call_branching_function = _view_convention(self.funcs.branching_function)
+        self.call_child_true_value_function = _view_convention(self.funcs.child_true_value_function)
+        self.call_child_depth_function = _view_convention(self.funcs.child_depth_function)
+        self.call_heuristic_value_function = _view_convention(self.funcs.heuristic_value_function)
+        self.id_depth_bit_shift = ID_PLAYER_BIT_SHIFT - self.vars.max_depth.bit_length()
+
+    def state_view(self, node: "StateNode") -> StateView:
+        """Return the calling thread's StateView for behavior functions, bound to `node`. Forks
+        share the globals and may be moved on different threads, so each thread rebinds its own view."""
+        try:
+            view = self._state_views.view
+        except AttributeError:
+            view = self._state_views.view = StateView(self.vars, self.funcs.transposition_space_function)
+        if view.node is not node:
+            view.bind(node)
+        return view
+
+    def hook_view(self, node: "StateNode") -> StateView:
+        """Return the calling thread's StateView for the callbacks of an event, bound to
+        `node`, and release it with `release_hook_view()` once they are called. Callbacks may
+        call back into the graph, which rebinds the behavior functions' views and fires nested
+        events, so each thread keeps a stack of hook views: an event takes the next one, and
+        a view is never rebound while the callbacks it was passed to run."""
+        local = self._state_views
+        try:
+            views, depth = local.hook_views, local.hook_depth
+        except AttributeError:
+            views, depth = local.hook_views, local.hook_depth = [], 0
+        if depth == len(views):
+            views.append(StateView(self.vars, self.funcs.transposition_space_function))
+        local.hook_depth = depth + 1
+        return views[depth].bind(node)
+
+    def release_hook_view(self) -> None:
+        """Release the calling thread's innermost hook view, see `hook_view()`."""
+        self._state_views.hook_depth -= 1
+
+
+def _view_convention(function: Callable[..., Any]) -> "StateViewFunction":
+    """Return a behavior function as called with a StateView bound to the state: its StateView
+    version if it has one, and otherwise the function itself given the view's RNG and the
+    state's StateParams."""
+    view_function = getattr(function, "state_view", None)
+    if view_function is not None:
+        return view_function
+    def call_with_state_params(view: StateView, *args: Any) -> Any:
+        assert(view.node is not None)
+        return function(view.rng.next_int, view.rng.next_float, view.node.get_state_params(), *args)
+    return call_with_state_params
@@ -1,21 +1,50 @@
+from typing import Any
 import math
+import numpy as np
 
 from .custom_types import *
 from .constants import *
 from .utils import *
+from .behavior import batch_version
 
 
+# Each default function is implemented once, taking the draws and the state's attributes as
+# plain arguments, and called from both conventions without allocating anything.
+
 def default_branching_function(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
     """Constant branching factor with variance. Does not allow a branching factor < 0 until a depth 
     of terminal_minimum_depth has been reached."""
-    variance = randf(low=-params.globals.branching_factor_variance, high=params.globals.branching_factor_variance)
-    branching_factor = max(0, params.globals.branching_factor_base + round(variance))
+    return _branching_factor(randf, params.globals, params.self.depth)
+
+
+def default_branching_function_view(view: StateView) -> int:
+    """StateView version of default_branching_function."""
+    return _branching_factor(view.rng.next_float, view.globals, view.depth)
+
+
+def _branching_factor(randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
+    variance = randf(low=-globals.branching_factor_variance, high=globals.branching_factor_variance)
+    branching_factor = max(0, globals.branching_factor_base + round(variance))
     # make sure we do not prematurely create a terminal
-    if params.self.depth < params.globals.terminal_minimum_depth:
+    if depth < globals.terminal_minimum_depth:
         branching_factor = max(1, branching_factor)
-    elif randf() < params.globals.terminal_chance:
+    elif randf() < globals.terminal_chance:
         branching_factor = 0
     return branching_factor
+default_branching_function.state_view = default_branching_function_view # type: ignore[attr-defined]
+
+
+@batch_version(default_branching_function)
+def default_branching_function_batch(
+        randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of default_branching_function."""
+    variance = randf(low=-params.globals.branching_factor_variance, high=params.globals.branching_factor_variance)
+    branching_factor = np.maximum(0, params.globals.branching_factor_base + np.round(variance))
+    shallow = params.self.depth < params.globals.terminal_minimum_depth
+    branching_factor = np.where(shallow, np.maximum(1, branching_factor), branching_factor)
+    terminal = ~shallow & (randf(where=~shallow) < params.globals.terminal_chance)
+    branching_factor = np.where(terminal, 0, branching_factor)
+    return branching_factor.astype(np.int64)
 
 
 def default_child_true_value_function(
@@ -29,39 +58,64 @@ def default_child_true_value_function(
          our value. The rest of the children can either be ties, or be losses for us.
       3. If we are a losing state, then all of our children must share our value.
     A more detailed explanation can be found in the documentation."""
-    self_win = 1 if params.self.player == Player.MAX else -1
+    return _child_true_value(randf, params.globals, params.self.player, params.self.true_value,
+                             self_branching_factor, child_true_value_information)
+
+
+def default_child_true_value_function_view(
+        view: StateView, self_branching_factor: int, child_true_value_information: ChildTrueValueInformation) -> int:
+    """StateView version of default_child_true_value_function."""
+    return _child_true_value(view.rng.next_float, view.globals, view.player, view.true_value,
+                             self_branching_factor, child_true_value_information)
+
+
+def _child_true_value(
+        randf: RandomFloatFunction, globals: GlobalVariables, player: Player, true_value: int,
+        self_branching_factor: int, child_true_value_information: ChildTrueValueInformation) -> int:
+    self_win = 1 if player == Player.MAX else -1
     self_loss = -self_win
     # no winning moves 
-    if params.self.true_value == self_loss:
+    if true_value == self_loss:
         return self_loss
     # if we are a tie, at least true_value_forced_ratio children must be a tie. The rest are losses
-    elif params.self.true_value == 0:
+    elif true_value == 0:
         child_tie_ratio =  child_true_value_information.total_child_ties / self_branching_factor
-        if child_tie_ratio < params.globals.true_value_forced_ratio:
+        if child_tie_ratio < globals.true_value_forced_ratio:
             return 0
-        if randf() < params.globals.true_value_tie_chance:
+        if randf() < globals.true_value_tie_chance:
             return 0
         return self_loss
     # else, we are a win
     else:
         # in that case, at least true_value_forced_ratio children must be wins.
         child_win_ratio =  child_true_value_information.total_child_wins / self_branching_factor
-        if child_win_ratio < params.globals.true_value_forced_ratio:
+        if child_win_ratio < globals.true_value_forced_ratio:
             return self_win
         # then we check if we are a tie
-        if randf() < params.globals.true_value_tie_chance:
+        if randf() < globals.true_value_tie_chance:
             return 0
         # if not a tie, we check if we should be the same as our parent or not
-        if randf() < params.globals.true_value_similarity_chance:
+        if randf() < globals.true_value_similarity_chance:
             return self_win
         return self_loss
+default_child_true_value_function.state_view = default_child_true_value_function_view # type: ignore[attr-defined]
 
 
 def default_child_depth_function(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
     """Randomly generate a depth between minimum and maximum depth."""
-    min_depth = max(params.globals.child_depth_minumum + params.self.depth, 0)
-    max_depth = min(params.globals.child_depth_maximum + params.self.depth, params.globals.max_depth)
+    return _child_depth(randint, params.globals, params.self.depth)
+
+
+def default_child_depth_function_view(view: StateView) -> int:
+    """StateView version of default_child_depth_function."""
+    return _child_depth(view.rng.next_int, view.globals, view.depth)
+
+
+def _child_depth(randint: RandomIntFunction, globals: GlobalVariables, depth: int) -> int:
+    min_depth = max(globals.child_depth_minumum + depth, 0)
+    max_depth = min(globals.child_depth_maximum + depth, globals.max_depth)
     return randint(low=min_depth, high=max_depth)
+default_child_depth_function.state_view = default_child_depth_function_view # type: ignore[attr-defined]
 
 
 def default_transposition_space_function(randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
@@ -77,31 +131,78 @@ def default_heuristic_value_function(randint: RandomIntFunction, randf: RandomFl
        states give less accurate evaluations, while deeper states are more accurate.
     3. heuristic_locality_scaling: Scales the accuracy relative to the states position in the record space.
        This helps simulate the heuristic evaluation function's ability to evaluate certain states over others. """
-    # calculate the state's relative depth and record to the whole.
-    relative_depth = params.self.depth / params.globals.max_depth
-    relative_record = params.self.transposition_space_record / params.self.transposition_space_size
-    # use that, and the global scaling factors to estimate 'accuracy' variables in ranges [-1, 1] where
-    # -1 represents the most possible INACCURACY and 1 represents the most possible ACCURACY.
-    depth_accuracy = params.globals.heuristic_depth_scaling * (2 * relative_depth - 1 )
-    locality_accuracy = params.globals.heuristic_locality_scaling * math.sin(relative_record * 2 * math.pi)
+    return _heuristic_value(randf, params.globals, params.self.true_value, params.self.depth,
+                            params.self.transposition_space_record, params.self.transposition_space_size)
+
+
+def _heuristic_bounds(
+        globals: GlobalVariables, true_value: int|np.ndarray, relative_depth: float|np.ndarray, locality_sine: float|np.ndarray
+        ) -> tuple[Any, Any, Any, Any]:
+    """Return the chance of a random guess, the bound of tied states' values and the two
+    bounds of other states' values for the default heuristic. Takes floats for one state or
+    arrays for many, where `locality_sine` is the sine of the relative record times 2 pi."""
+    # use the relative depth and record, and the global scaling factors to estimate 'accuracy' variables in
+    # ranges [-1, 1] where -1 represents the most possible INACCURACY and 1 represents the most possible ACCURACY.
+    depth_accuracy = globals.heuristic_depth_scaling * (2 * relative_depth - 1 )
+    locality_accuracy = globals.heuristic_locality_scaling * locality_sine
     # based on accuracy parameters, there is some probability that the heuristic will be completely wrong 
     # and choose a value at random.
-    if randf() < 0.1 * (1 - params.globals.heuristic_accuracy_base) * (3 - depth_accuracy - locality_accuracy):
-        return randf(-1, 1)
+    random_guess_chance = 0.1 * (1 - globals.heuristic_accuracy_base) * (3 - depth_accuracy - locality_accuracy)
     # otherwise, we calculate an estimated heuristic value that is based off the true value of the state.
     # The accuracy of this estimate is also based off of the previously defined accuracy variables.
     # The final value is a random variable within some calculated upper and lower bounds.
-    if params.self.true_value == 0:
-        # if we are a tie, then the accuracy is centered around 0
-        bound = (1 - params.globals.heuristic_accuracy_base) * (2 - depth_accuracy - locality_accuracy) / 4
-        return randf(-bound, bound)
+    # If we are a tie, then the accuracy is centered around 0
+    tie_bound = (1 - globals.heuristic_accuracy_base) * (2 - depth_accuracy - locality_accuracy) / 4
     # otherwise the center of the bounds is set closer to the true value. After finding the center, we calculate
     # the distances of the upper and lower bounds from the center. The amount of variance, as well as how
     # positively or negatively the bound is biased depends on the previously calculated accuracy variables.
-    accuracy_mean = params.globals.heuristic_accuracy_base
+    accuracy_mean = globals.heuristic_accuracy_base
     distance_from_mean_to_true_value = 1 - accuracy_mean
     positive_accuracy_range = distance_from_mean_to_true_value * (2 + depth_accuracy + locality_accuracy) / 4
     negative_accuracy_range = distance_from_mean_to_true_value - positive_accuracy_range
-    positive_bound = params.self.true_value * (accuracy_mean + positive_accuracy_range)
-    negative_bound = params.self.true_value * (accuracy_mean - negative_accuracy_range)
+    positive_bound = true_value * (accuracy_mean + positive_accuracy_range)
+    negative_bound = true_value * (accuracy_mean - negative_accuracy_range)
+    return random_guess_chance, tie_bound, positive_bound, negative_bound
+
+
+def default_heuristic_value_function_view(view: StateView) -> float:
+    """StateView version of default_heuristic_value_function."""
+    return _heuristic_value(view.rng.next_float, view.globals, view.true_value, view.depth,
+                            view.transposition_space_record, view.transposition_space_size)
+
+
+def _heuristic_value(
+        randf: RandomFloatFunction, globals: GlobalVariables, true_value: int, depth: int,
+        transposition_space_record: int, transposition_space_size: int) -> float:
+    # calculate the state's relative depth and record to the whole.
+    relative_depth = depth / globals.max_depth
+    relative_record = transposition_space_record / transposition_space_size
+    random_guess_chance, tie_bound, positive_bound, negative_bound = _heuristic_bounds(
+        globals, true_value, relative_depth, math.sin(relative_record * 2 * math.pi))
+    if randf() < random_guess_chance:
+        return randf(-1, 1)
+    if true_value == 0:
+        return randf(-tie_bound, tie_bound)
     return randf(min(positive_bound, negative_bound), max(positive_bound, negative_bound))
+default_heuristic_value_function.state_view = default_heuristic_value_function_view # type: ignore[attr-defined]
+
+
+@batch_version(default_heuristic_value_function)
+def default_heuristic_value_function_batch(
+        randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+    """Batch version of default_heuristic_value_function. The arithmetic is shared with the
+    scalar version so that both produce exactly the same values."""
+    relative_depth = params.self.depth / params.globals.max_depth
+    relative_record = np.array([record / size for record, size in zip(
+        params.self.transposition_space_record, params.self.transposition_space_size)], dtype=np.float64)
+    # np.sin is not guaranteed to round exactly like math.sin
+    locality_sine = np.array([math.sin(x) for x in relative_record * 2 * math.pi], dtype=np.float64)
+    random_guess_chance, tie_bound, positive_bound, negative_bound = _heuristic_bounds(
+        params.globals, params.self.true_value, relative_depth, locality_sine)
+    random_guess = randf() < random_guess_chance
+    tie = params.self.true_value == 0
+    low = np.where(tie, -tie_bound, np.minimum(positive_bound, negative_bound))
+    high = np.where(tie, tie_bound, np.maximum(positive_bound, negative_bound))
+    random_values = randf(-1, 1, where=random_guess)
+    estimated_values = randf(low, high, where=~random_guess)
+    return np.where(random_guess, random_values, estimated_values)
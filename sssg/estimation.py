@@ -0,0 +1,226 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+import copy
+import inspect
+import math
+import random
+import numpy as np
+
+from .custom_types import Player, RandomnessDistribution
+from .default_behavior_functions import default_branching_function, default_child_true_value_function, default_child_depth_function
+if TYPE_CHECKING:
+    from .SyntheticGraph import SyntheticGraph
+
+
+VALUES = (-1, 0, 1)
+CONFIDENCE_Z = 1.96 # 95% confidence intervals
+
+
+@dataclass
+class DepthShape:
+    depth: int
+    nodes: float # expected number of states at this depth, counted as in a tree (transpositions are not merged)
+    nodes_interval: tuple[float, float] # 95% confidence interval of `nodes`, exact for analytical estimates
+    terminal_fraction: float
+    value_fractions: dict[int, float] # share of the states with each true value
+    branching_factor: float # mean number of actions of the non-terminal states
+    unique_branching_factor: float # mean number of distinct children of the non-terminal states
+
+
+@dataclass
+class ShapeEstimate:
+    method: str # "analytical" or "probing"
+    depths: list[DepthShape]
+    probes: int = 0
+    expansions: int = 0 # states expanded to compute the estimate
+    nodes: float = field(init=False)
+
+    def __post_init__(self):
+        self.nodes = sum(depth.nodes for depth in self.depths)
+
+
+def is_analytical(graph: "SyntheticGraph") -> bool:
+    """Return true if the graph's shape can be computed analytically: the default branching,
+    child true value and child depth functions, uniform randomness, and children which are
+    always deeper than their parents."""
+    funcs = graph.globals.funcs
+    return (inspect.unwrap(funcs.branching_function) is default_branching_function # functions may be wrapped by a Timeline
+            and inspect.unwrap(funcs.child_true_value_function) is default_child_true_value_function
+            and inspect.unwrap(funcs.child_depth_function) is default_child_depth_function
+            and graph.globals.vars.distribution == RandomnessDistribution.UNIFORM
+            and graph.globals.vars.child_depth_minumum >= 1)
+
+
+def _branching_distribution(graph: "SyntheticGraph", shallow: bool) -> dict[int, float]:
+    """Distribution of default_branching_function's output, at depths before (`shallow`) or
+    after terminal_minimum_depth."""
+    base = graph.globals.vars.branching_factor_base
+    variance = graph.globals.vars.branching_factor_variance
+    distribution: dict[int, float] = {}
+    for offset in range(-variance, variance + 1):
+        # share of [-variance, variance] which rounds to `offset`
+        p = 1.0 if variance == 0 else (min(offset + 0.5, variance) - max(offset - 0.5, -variance)) / (2 * variance)
+        branching_factor = max(1, base + offset) if shallow else max(0, base + offset)
+        distribution[branching_factor] = distribution.get(branching_factor, 0.0) + p
+    if not shallow:
+        terminal_chance = graph.globals.vars.terminal_chance
+        distribution = {b: p * (1 - terminal_chance) for b, p in distribution.items()}
+        distribution[0] = distribution.get(0, 0.0) + terminal_chance
+    return distribution
+
+
+def _child_values(graph: "SyntheticGraph", branching_distribution: dict[int, float],
+                  true_value: int, player: Player) -> tuple[dict[int, float], float]:
+    """Expected number of actions leading to children of each true value, following
+    default_child_true_value_function and the symmetry parameters, and the expected number
+    of distinct children."""
+    vars = graph.globals.vars
+    win = 1 if player == Player.MAX else -1
+    counts = {value: 0.0 for value in VALUES}
+    unique_children = 0.0
+    for branching_factor, p in branching_distribution.items():
+        if branching_factor == 0:
+            continue
+        symmetric = max(1, math.floor(branching_factor * vars.symmetry_factor))
+        for unique, p_unique in [(branching_factor, 1 - vars.symmetry_frequency), (symmetric, vars.symmetry_frequency)]:
+            unique_children += p * p_unique * unique
+            forced = min(unique, math.ceil(vars.true_value_forced_ratio * branching_factor))
+            for j in range(unique):
+                # actions leading to unique child j: itself, and the symmetric references to it
+                multiplicity = p * p_unique * (1 + len(range(j, branching_factor - unique, unique)))
+                if true_value == -win:
+                    counts[-win] += multiplicity
+                elif true_value == 0:
+                    tie = 1.0 if j < forced else vars.true_value_tie_chance
+                    counts[0] += multiplicity * tie
+                    counts[-win] += multiplicity * (1 - tie)
+                elif j < forced:
+                    counts[win] += multiplicity
+                else:
+                    counts[0] += multiplicity * vars.true_value_tie_chance
+                    counts[win] += multiplicity * (1 - vars.true_value_tie_chance) * vars.true_value_similarity_chance
+                    counts[-win] += multiplicity * (1 - vars.true_value_tie_chance) * (1 - vars.true_value_similarity_chance)
+    return counts, unique_children
+
+
+def _estimate_analytically(graph: "SyntheticGraph", max_depth: int) -> ShapeEstimate:
+    """Propagate expected state counts per (depth, true value, player) from the current state
+    down to `max_depth`. Since children are deeper than their parents, each depth is final
+    once all shallower depths have been propagated."""
+    vars = graph.globals.vars
+    distributions = {shallow: _branching_distribution(graph, shallow) for shallow in (True, False)}
+    expected: dict[tuple[bool, int, Player], tuple[dict[int, float], float]] = {}
+    counts = np.zeros((max_depth + 1, len(VALUES), len(Player)), dtype=np.float64)
+    counts[graph.depth(), graph.true_value() + 1, graph.player().value] = 1.0
+    depths: list[DepthShape] = []
+    for depth in range(graph.depth(), max_depth + 1):
+        shallow = depth < vars.terminal_minimum_depth
+        distribution = distributions[shallow]
+        nodes = float(counts[depth].sum())
+        if depth >= vars.max_depth:
+            terminal_fraction, branching_factor, unique_branching_factor = 1.0, 0.0, 0.0
+        else:
+            terminal_fraction = distribution.get(0, 0.0)
+            branching_factor = sum(b * p for b, p in distribution.items()) / (1 - terminal_fraction) if terminal_fraction < 1 else 0.0
+            unique_branching_factor = 0.0
+            child_depths = range(max(vars.child_depth_minumum + depth, 0), min(vars.child_depth_maximum + depth, vars.max_depth) + 1)
+            for true_value in VALUES:
+                for player in Player:
+                    parents = counts[depth, true_value + 1, player.value]
+                    if parents == 0:
+                        continue
+                    key = (shallow, true_value, player)
+                    if key not in expected:
+                        expected[key] = _child_values(graph, distribution, true_value, player)
+                    child_counts, unique_children = expected[key]
+                    unique_branching_factor += parents * unique_children
+                    child_player = Player.MAX if player == Player.MIN else Player.MIN
+                    for child_depth in child_depths:
+                        if child_depth > max_depth:
+                            continue
+                        for child_value, count in child_counts.items():
+                            counts[child_depth, child_value + 1, child_player.value] += parents * count / len(child_depths)
+            if nodes > 0 and terminal_fraction < 1:
+                unique_branching_factor /= nodes * (1 - terminal_fraction)
+        value_counts = counts[depth].sum(axis=1)
+        depths.append(DepthShape(
+            depth=depth, nodes=nodes, nodes_interval=(nodes, nodes),
+            terminal_fraction=terminal_fraction,
+            value_fractions={value: float(value_counts[value + 1] / nodes) if nodes > 0 else 0.0 for value in VALUES},
+            branching_factor=branching_factor,
+            unique_branching_factor=unique_branching_factor))
+    return ShapeEstimate("analytical", depths)
+
+
+def _estimate_by_probing(graph: "SyntheticGraph", max_depth: int, probes: int, seed: int) -> ShapeEstimate:
+    """Knuth's estimator: every random walk from the current state is an unbiased estimate
+    of the tree, when each visited state is weighted by the product of the branching factors
+    along the way. Walks are cut off after `max_depth` plies, so cycles do not trap them."""
+    start_id, start_depth = graph.id(), graph.depth()
+    rng = random.Random(seed)
+    cursor = copy.copy(graph)
+    size = max_depth + 1
+    nodes_sum, nodes_square_sum = np.zeros(size), np.zeros(size)
+    terminals, branching, unique_branching = np.zeros(size), np.zeros(size), np.zeros(size)
+    values = np.zeros((size, len(VALUES)))
+    expansions = 0
+    for _ in range(probes):
+        cursor.set_root(start_id)
+        weight = 1.0
+        walk_nodes = np.zeros(size)
+        for _ in range(max_depth - start_depth + 1):
+            depth = cursor.depth()
+            if depth > max_depth:
+                break
+            walk_nodes[depth] += weight
+            values[depth, cursor.true_value() + 1] += weight
+            if cursor.is_terminal():
+                terminals[depth] += weight
+                break
+            actions = cursor.actions()
+            expansions += 1
+            branching[depth] += weight * len(actions)
+            unique_branching[depth] += weight * len(cursor.unique_actions())
+            cursor.make(rng.choice(actions))
+            weight *= len(actions)
+        nodes_sum += walk_nodes
+        nodes_square_sum += walk_nodes**2
+    mean = nodes_sum / probes
+    error = CONFIDENCE_Z * np.sqrt(np.maximum(nodes_square_sum / probes - mean**2, 0) / probes)
+    depths: list[DepthShape] = []
+    for depth in range(start_depth, size):
+        total = nodes_sum[depth]
+        inner = total - terminals[depth]
+        depths.append(DepthShape(
+            depth=depth, nodes=float(mean[depth]),
+            nodes_interval=(float(max(0.0, mean[depth] - error[depth])), float(mean[depth] + error[depth])),
+            terminal_fraction=float(terminals[depth] / total) if total > 0 else 0.0,
+            value_fractions={value: float(values[depth, value + 1] / total) if total > 0 else 0.0 for value in VALUES},
+            branching_factor=float(branching[depth] / inner) if inner > 0 else 0.0,
+            unique_branching_factor=float(unique_branching[depth] / inner) if inner > 0 else 0.0))
+    return ShapeEstimate("probing", depths, probes, expansions)
+
+
+def estimate_shape(graph: "SyntheticGraph", max_depth: int|None=None, probes: int=1000,
+                   seed: int=0, method: str|None=None) -> ShapeEstimate:
+    """Estimate the number of states, terminal fraction, true value mix and branching of each
+    depth below the graph's current state, down to `max_depth` (the graph's maximum depth by
+    default). Computed analytically when `is_analytical(graph)`, and otherwise by `probes`
+    random walks. Pass `method` ("analytical" or "probing") to choose explicitly."""
+    if max_depth is None:
+        max_depth = graph.globals.vars.max_depth
+    if not max_depth >= graph.depth():
+        raise ValueError("max_depth must be >= the current depth.")
+    if method is None:
+        method = "analytical" if is_analytical(graph) else "probing"
+    match method:
+        case "analytical":
+            if not is_analytical(graph):
+                raise ValueError("The graph's shape can not be computed analytically.")
+            return _estimate_analytically(graph, max_depth)
+        case "probing":
+            if not probes > 0:
+                raise ValueError("probes must be > 0.")
+            return _estimate_by_probing(graph, max_depth, probes, seed)
+        case _:
+            raise ValueError(f"Unknown method {method}.")
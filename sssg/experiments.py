@@ -0,0 +1,269 @@
+"""Run a solver over a grid of SyntheticGraph parameters and seeds.
+
+    results = run({"branching_factor_base": [2, 4], "max_depth": [8, 12]},
+                  functools.partial(alphabeta, depth=6), seeds=range(10), workers=8, output="sweep.jsonl")
+
+Every run happens in a fresh worker process, so that its peak memory can be measured, and
+its record is appended to `output` (JSON lines, or CSV if the name ends in .csv) as soon as
+it finishes. Runs already recorded there are skipped, so an interrupted sweep picks up
+where it stopped when started again. Since workers are spawned rather than forked, scripts
+calling `run` need an `if __name__ == "__main__":` guard, and the solver must be picklable
+(a module-level function, or a functools.partial of one)."""
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict, fields, is_dataclass
+from enum import Enum
+from typing import Any
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import pickle
+import resource
+import sys
+import time
+import types
+
+from .SyntheticGraph import SyntheticGraph
+
+
+@dataclass
+class RunRecord:
+    fingerprint: str # identifies the graph parameters, seed excluded
+    solver: str
+    seed: int
+    parameters: dict[str, Any] # graph parameters, with functions and other objects described by name
+    value: float|None = None # `value` of the solver's result, if it has one
+    nodes: int|None = None # `nodes` of the solver's result, if it has one
+    wall_time: float = 0.0
+    nodes_per_second: float|None = None
+    peak_memory: int = 0 # peak resident memory of the worker process, in bytes
+    result: dict[str, Any]|None = None # scalar fields of the solver's result
+    error: str|None = None
+
+    def key(self) -> tuple[str, str, int]:
+        return (self.fingerprint, self.solver, self.seed)
+
+
+def describe(value: Any) -> Any:
+    """Return a JSON compatible description of a graph parameter, which stays the same
+    across processes: functions by their qualified name and a hash of their code, other
+    objects by a hash of their pickled contents."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}"
+    if isinstance(value, (list, tuple)):
+        return [describe(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): describe(item) for key, item in value.items()}
+    if isinstance(value, functools.partial):
+        return {"partial": describe(value.func), "args": describe(value.args), "keywords": describe(value.keywords)}
+    if hasattr(value, "__qualname__") and hasattr(value, "__module__"):
+        code = getattr(value, "__code__", None) # functions and methods, builtins have none
+        if code is None:
+            return f"{value.__module__}.{value.__qualname__}"
+        return f"{value.__module__}.{value.__qualname__}:{_describe_code(code)[:16]}"
+    return f"{type(value).__qualname__}:{hashlib.sha256(pickle.dumps(value)).hexdigest()[:16]}"
+
+
+def _describe_code(code: types.CodeType) -> str:
+    """Return a hash of a function's bytecode, constants and referenced names, so that
+    functions which share a name but were edited in between are told apart."""
+    digest = hashlib.sha256(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for constant in code.co_consts:
+        digest.update(_describe_constant(constant).encode())
+    return digest.hexdigest()
+
+
+def _describe_constant(constant: Any) -> str:
+    # nested functions' code objects are described by their contents rather than their
+    # address, and frozensets in sorted order rather than in the process's hash order
+    if isinstance(constant, types.CodeType):
+        return _describe_code(constant)
+    if isinstance(constant, tuple):
+        return "(" + ",".join(_describe_constant(item) for item in constant) + ")"
+    if isinstance(constant, frozenset):
+        return "{" + ",".join(sorted(_describe_constant(item) for item in constant)) + "}"
+    return repr(constant)
+
+
+def fingerprint(parameters: dict[str, Any]) -> str:
+    """Return a short hash identifying graph parameters, independent of their order."""
+    description = json.dumps(describe(parameters), sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:16]
+
+
+def expand_grid(grid: dict[str, list[Any]]) -> list[dict[str, Any]]:
+    """Return every combination of the values in `grid`, in order."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _result_fields(result: Any) -> dict[str, Any]|None:
+    """Return the JSON scalar fields of a solver's result (a dataclass or a dict)."""
+    if is_dataclass(result) and not isinstance(result, type):
+        items = {field.name: getattr(result, field.name) for field in fields(result)}
+    elif isinstance(result, dict):
+        items = result
+    else:
+        return None
+    return {str(name): value for name, value in items.items()
+            if value is None or isinstance(value, (bool, int, float, str)) and not isinstance(value, Enum)}
+
+
+def _peak_memory() -> int:
+    """Peak resident memory of this process in bytes (ru_maxrss is in kilobytes on Linux)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run(solver: Callable[[SyntheticGraph], Any], solver_name: str, parameters: dict[str, Any], seed: int) -> RunRecord:
+    """Construct the graph and run the solver on it, in a worker process of its own."""
+    record = RunRecord(fingerprint(parameters), solver_name, seed, describe(parameters))
+    start = time.perf_counter()
+    try:
+        result = solver(SyntheticGraph(seed=seed, **parameters))
+    except Exception as error:
+        record.error = f"{type(error).__name__}: {error}"
+        result = None
+    record.wall_time = time.perf_counter() - start
+    record.peak_memory = _peak_memory()
+    record.result = _result_fields(result)
+    if record.result is not None:
+        value, nodes = record.result.get("value"), record.result.get("nodes")
+        record.value = float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+        record.nodes = nodes if isinstance(nodes, int) and not isinstance(nodes, bool) else None
+    if record.nodes is not None and record.wall_time > 0:
+        record.nodes_per_second = record.nodes / record.wall_time
+    return record
+
+
+CSV_FIELDS = [field.name for field in fields(RunRecord)]
+
+def _to_row(record: RunRecord) -> dict[str, Any]:
+    row = asdict(record)
+    row["parameters"] = json.dumps(row["parameters"], sort_keys=True)
+    row["result"] = json.dumps(row["result"], sort_keys=True)
+    return row
+
+def _from_row(row: dict[str, str]) -> RunRecord:
+    def number(text: str, kind: type) -> Any:
+        return kind(text) if text != "" else None
+    return RunRecord(
+        fingerprint=row["fingerprint"], solver=row["solver"], seed=int(row["seed"]),
+        parameters=json.loads(row["parameters"]),
+        value=number(row["value"], float), nodes=number(row["nodes"], int),
+        wall_time=float(row["wall_time"]), nodes_per_second=number(row["nodes_per_second"], float),
+        peak_memory=int(row["peak_memory"]), result=json.loads(row["result"]),
+        error=row["error"] or None)
+
+
+def read_records(path: str) -> list[RunRecord]:
+    """Read the records of an output file, in the order they were written."""
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            return [_from_row(row) for row in csv.DictReader(file)]
+        return [RunRecord(**json.loads(line)) for line in file if line.strip()]
+
+
+class _RecordWriter():
+    """Appends records to an output file, flushing after each one."""
+    def __init__(self, path: str):
+        self.path = path
+        self._csv = path.endswith(".csv")
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="")
+        if self._csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            if new:
+                self._writer.writeheader()
+
+    def write(self, record: RunRecord) -> None:
+        if self._csv:
+            self._writer.writerow(_to_row(record))
+        else:
+            self._file.write(json.dumps(asdict(record), sort_keys=True, allow_nan=True) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def solver_name(solver: Callable[..., Any]) -> str:
+    """Name a solver by its qualified name, including the arguments bound by a partial."""
+    if isinstance(solver, functools.partial):
+        arguments = [repr(argument) for argument in solver.args]
+        arguments += [f"{name}={value!r}" for name, value in solver.keywords.items()]
+        return f"{solver_name(solver.func)}({', '.join(arguments)})"
+    return f"{getattr(solver, '__module__', '')}.{getattr(solver, '__qualname__', type(solver).__qualname__)}"
+
+
+def run(grid: dict[str, list[Any]]|list[dict[str, Any]],
+        solver: Callable[[SyntheticGraph], Any],
+        seeds: Iterable[int]=(0,),
+        workers: int|None=None,
+        output: str|None=None,
+        name: str|None=None) -> list[RunRecord]:
+    """Run `solver` on a graph for every combination of the parameters in `grid` (or every
+    dict of parameters, if given a list) and every seed. Results are appended to `output`
+    as runs finish, skipping runs which are already recorded there without error. `name`
+    identifies the solver in the records, derived from the solver itself by default.
+    Returns the records of the runs made by this call, in the order they finished."""
+    configurations = expand_grid(grid) if isinstance(grid, dict) else list(grid)
+    if any("seed" in parameters for parameters in configurations):
+        raise ValueError("Pass seeds through `seeds` rather than the grid.")
+    workers = workers or os.cpu_count() or 1
+    if not workers > 0:
+        raise ValueError("workers must be > 0.")
+    name = name or solver_name(solver)
+    done = {record.key() for record in read_records(output) if record.error is None} if output else set()
+    runs = [(parameters, seed) for parameters in configurations for seed in seeds
+            if (fingerprint(parameters), name, seed) not in done]
+    records: list[RunRecord] = []
+    writer = _RecordWriter(output) if output else None
+    try:
+        if not runs:
+            return records
+        # one fresh process per run, so ru_maxrss is the peak of that run alone
+        with ProcessPoolExecutor(min(workers, max(1, len(runs))), mp_context=multiprocessing.get_context("spawn"),
+                                 max_tasks_per_child=1) as executor:
+            futures = [executor.submit(_run, solver, name, parameters, seed) for parameters, seed in runs]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                if writer is not None:
+                    writer.write(record)
+    finally:
+        if writer is not None:
+            writer.close()
+    return records
+
+
+def summarize(records: Iterable[RunRecord]) -> Iterator[dict[str, Any]]:
+    """Group records by graph parameters and solver, yielding the mean value, wall time,
+    nodes per second and peak memory of each group over its seeds."""
+    groups: dict[tuple[str, str], list[RunRecord]] = {}
+    for record in records:
+        if record.error is None:
+            groups.setdefault((record.fingerprint, record.solver), []).append(record)
+    def mean(values: list[float|None]) -> float|None:
+        known = [value for value in values if value is not None]
+        return math.fsum(known) / len(known) if known else None
+    for (_, solver), group in groups.items():
+        yield {
+            "parameters": group[0].parameters,
+            "solver": solver,
+            "runs": len(group),
+            "value": mean([record.value for record in group]),
+            "wall_time": mean([record.wall_time for record in group]),
+            "nodes_per_second": mean([record.nodes_per_second for record in group]),
+            "peak_memory": mean([float(record.peak_memory) for record in group]),
+        }
@@ -0,0 +1,58 @@
+"""Hooks aggregating search statistics into arrays, for use with `SyntheticGraph.on`."""
+from typing import Self
+import numpy as np
+
+from .custom_types import StateView
+from .SyntheticGraph import SyntheticGraph
+
+
+class DepthHistogram():
+    """Counts, per depth, the states entered by `make`, the leaves reached and the states
+    expanded, along with a histogram of the branching factors of the expanded states (the
+    last column collects all branching factors >= `max_branching_factor`). Counts go
+    straight into numpy arrays indexed by depth, so no object is kept per event.
+
+        histogram = DepthHistogram(graph)
+        run_search(graph)
+        histogram.detach()
+        histogram.visits, histogram.mean_branching_factors()"""
+    def __init__(self, graph: SyntheticGraph, max_branching_factor: int=64):
+        if not max_branching_factor > 0:
+            raise ValueError("max_branching_factor must be > 0.")
+        depths = graph.globals.vars.max_depth + 1
+        self.max_branching_factor = max_branching_factor
+        self.visits = np.zeros(depths, dtype=np.int64)
+        self.leaves = np.zeros(depths, dtype=np.int64)
+        self.expansions = np.zeros(depths, dtype=np.int64)
+        self.branching_factors = np.zeros((depths, max_branching_factor + 1), dtype=np.int64)
+        self._graph: SyntheticGraph|None = graph
+        graph.on("make", self._make)
+        graph.on("leaf", self._leaf)
+        graph.on("expand", self._expand)
+
+    def detach(self) -> Self:
+        """Stop counting."""
+        if self._graph is not None:
+            self._graph.off("make", self._make)
+            self._graph.off("leaf", self._leaf)
+            self._graph.off("expand", self._expand)
+            self._graph = None
+        return self
+
+    def _make(self, view: StateView, action: int) -> None:
+        self.visits[view.depth] += 1
+
+    def _leaf(self, view: StateView) -> None:
+        self.leaves[view.depth] += 1
+
+    def _expand(self, view: StateView) -> None:
+        assert(view.node is not None)
+        self.expansions[view.depth] += 1
+        self.branching_factors[view.depth, min(view.node.branching_factor(), self.max_branching_factor)] += 1
+
+    def mean_branching_factors(self) -> np.ndarray:
+        """Mean branching factor of the expanded states of each depth (NaN where none were
+        expanded), counting the last column as `max_branching_factor`."""
+        totals = self.branching_factors @ np.arange(self.max_branching_factor + 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return totals / self.expansions
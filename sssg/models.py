@@ -0,0 +1,138 @@
+"""Behavior functions compiled from empirical per-depth statistics, e.g. mined from a real
+game. Histograms are turned into flat arrays once, so that the functions take constant
+time per call no matter how many buckets the histograms have. The functions are picklable
+objects with batch and StateView versions."""
+import numpy as np
+
+from .custom_types import *
+
+
+class AliasSampler():
+    """Samples a discrete distribution in constant time with Walker's alias method: one of
+    `n` equally likely columns is picked, which either keeps its own value or gives way to
+    its alias. A single uniform draw `u` in [0, 1] picks both, through the integer and the
+    fractional part of `u * n`."""
+    def __init__(self, histogram: dict[int, float]):
+        if any(count < 0 for count in histogram.values()):
+            raise ValueError("Histogram counts must be >= 0.")
+        counts = {value: count for value, count in histogram.items() if count > 0}
+        if not counts:
+            raise ValueError("A histogram needs at least one bucket with a positive count.")
+        n = len(counts)
+        total = sum(counts.values())
+        self.values = np.array(list(counts), dtype=np.int64)
+        self.probability = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+        # Vose's construction: pair every column below the mean with one above it
+        scaled = [count * n / total for count in counts.values()]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            i, j = small.pop(), large.pop()
+            self.probability[i] = scaled[i]
+            self.alias[i] = j
+            scaled[j] -= 1 - scaled[i]
+            (small if scaled[j] < 1 else large).append(j)
+        # columns left over are full up to rounding errors
+        self._table = list(zip(self.values.tolist(), self.probability.tolist(), self.values[self.alias].tolist()))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def distribution(self) -> dict[int, float]:
+        """Return the probability of every value, as encoded by the table."""
+        distribution = {int(value): 0.0 for value in self.values}
+        for i in range(len(self)):
+            distribution[int(self.values[i])] += self.probability[i] / len(self)
+            distribution[int(self.values[self.alias[i]])] += (1 - self.probability[i]) / len(self)
+        return distribution
+
+    def sample(self, u: float) -> int:
+        """Map a uniform draw in [0, 1] to a value."""
+        x = u * len(self._table)
+        i = min(int(x), len(self._table) - 1)
+        value, probability, alias = self._table[i]
+        return value if x - i < probability else alias
+
+
+class DepthSamplers():
+    """Alias samplers of per-depth histograms, flattened into arrays with one row per depth
+    so that states of any depths can be sampled together. Depths without a histogram use the
+    closest shallower one (the shallowest one, if there is none)."""
+    def __init__(self, histograms: dict[int, dict[int, float]]):
+        if not histograms:
+            raise ValueError("At least one histogram is needed.")
+        if not min(histograms) >= 0:
+            raise ValueError("Depths must be >= 0.")
+        samplers = {depth: AliasSampler(histogram) for depth, histogram in histograms.items()}
+        depth_count = max(histograms) + 1
+        width = max(len(sampler) for sampler in samplers.values())
+        self.sizes = np.ones(depth_count, dtype=np.int64)
+        self.values = np.zeros((depth_count, width), dtype=np.int64)
+        self.probability = np.ones((depth_count, width), dtype=np.float64)
+        self.alias = np.zeros((depth_count, width), dtype=np.int64)
+        self._samplers: list[AliasSampler] = [] # scalar sampling is faster on the lists of each sampler
+        sampler = samplers[min(samplers)]
+        for depth in range(depth_count):
+            sampler = samplers.get(depth, sampler)
+            self._samplers.append(sampler)
+            n = len(sampler)
+            self.sizes[depth] = n
+            self.values[depth, :n] = sampler.values
+            self.probability[depth, :n] = sampler.probability
+            self.alias[depth, :n] = sampler.alias
+
+    def sample(self, depth: int, u: float) -> int:
+        return self._samplers[min(depth, len(self._samplers) - 1)].sample(u)
+
+    def sample_batch(self, depths: np.ndarray, u: np.ndarray) -> np.ndarray:
+        depths = np.minimum(depths, len(self.sizes) - 1)
+        n = self.sizes[depths]
+        x = u * n
+        i = np.minimum(x.astype(np.int64), n - 1)
+        keep = x - i < self.probability[depths, i]
+        return np.where(keep, self.values[depths, i], self.values[depths, self.alias[depths, i]])
+
+
+class EmpiricalBranchingFunction():
+    """Branching function drawing each state's branching factor from the histogram of its
+    depth, given as {depth: {branching factor: count}}. Every call makes exactly one `randf`
+    draw. Usable as `branching_function` directly:
+
+        branching_function = EmpiricalBranchingFunction({6: {7: 16415, 6: 7}, 7: {7: 53837, 6: 294, 0: 728}})"""
+    def __init__(self, histograms: dict[int, dict[int, float]]):
+        if any(value < 0 for histogram in histograms.values() for value in histogram):
+            raise ValueError("Branching factors must be >= 0.")
+        self.samplers = DepthSamplers(histograms)
+
+    def __call__(self, randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
+        return self.samplers.sample(params.self.depth, randf())
+
+    def state_view(self, view: StateView) -> int:
+        return self.samplers.sample(view.depth, view.rng.next_float())
+
+    def batch(self, randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+        return self.samplers.sample_batch(params.self.depth, randf())
+
+
+class TableTranspositionSpaceFunction():
+    """Transposition space function looking the size of each depth up in a table, given as
+    {depth: size}. A size of None stands for the largest possible transposition space (no
+    transpositions). Depths without an entry use the closest shallower one (the shallowest
+    one, if there is none)."""
+    def __init__(self, sizes: dict[int, int|None]):
+        if not sizes:
+            raise ValueError("At least one size is needed.")
+        if not min(sizes) >= 0:
+            raise ValueError("Depths must be >= 0.")
+        if any(size is not None and not size > 0 for size in sizes.values()):
+            raise ValueError("Transposition space sizes must be > 0.")
+        self.sizes: list[int|None] = []
+        size = sizes[min(sizes)]
+        for depth in range(max(sizes) + 1):
+            size = sizes.get(depth, size)
+            self.sizes.append(size)
+
+    def __call__(self, randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
+        size = self.sizes[min(depth, len(self.sizes) - 1)]
+        return globals.max_transposition_space_size if size is None else size
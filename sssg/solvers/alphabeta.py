@@ -0,0 +1,237 @@
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+import copy
+import math
+import time
+import numpy as np
+
+from ..SyntheticGraph import SyntheticGraph
+from ..custom_types import Player
+from ..utils import attach_shared_memory
+
+
+POLL_INTERVAL = 256 # nodes searched by a worker between checks of the shared window
+# layout of the shared window
+GENERATION, ALPHA, BETA, ABORTED = range(4)
+
+
+class SearchAborted(Exception):
+    pass
+
+
+@dataclass
+class SearchResult:
+    value: float
+    nodes: int
+    seconds: float
+
+
+@dataclass
+class ParallelSearchReport:
+    """Comparison of the parallel and the serial solver on the same position. When searched
+    to the terminals, both values should equal the true value."""
+    true_value: int
+    serial: SearchResult
+    parallel: SearchResult
+    workers: int
+    speedup: float = field(init=False)
+    search_overhead: float = field(init=False) # extra nodes searched, relative to the serial solver
+
+    def __post_init__(self):
+        self.speedup = self.serial.seconds / self.parallel.seconds if self.parallel.seconds > 0 else math.inf
+        self.search_overhead = self.parallel.nodes / self.serial.nodes - 1
+
+
+class SharedWindow():
+    """Search window of the split point currently being searched in parallel, in shared
+    memory. Workers only trust it while its generation matches the one they were given."""
+    def __init__(self, name: str|None=None):
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=4 * np.dtype(np.float64).itemsize)
+            self._owner = True
+        else:
+            self._shm = attach_shared_memory(name)
+            self._owner = False
+        self.name = self._shm.name
+        self.values = np.ndarray((4,), dtype=np.float64, buffer=self._shm.buf)
+
+    def publish(self, generation: int, alpha: float, beta: float) -> None:
+        self.values[ALPHA], self.values[BETA], self.values[ABORTED] = alpha, beta, 0
+        self.values[GENERATION] = generation
+
+    def close(self) -> None:
+        del self.values
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class AlphaBeta():
+    """Minimax with alpha-beta pruning, rebuilding every state from its id with `set_root`
+    on a private cursor. Values are from MAX's point of view. Terminals are scored with their
+    true value, states at the depth limit with their heuristic value."""
+    def __init__(self, graph: SyntheticGraph, order_moves: bool=True, window: SharedWindow|None=None):
+        self.order_moves = order_moves
+        self.nodes = 0
+        self.generation = -1
+        self._graph = copy.copy(graph)
+        self._window = window
+
+    def _children(self) -> list[int]:
+        """Return the ids of the current state's distinct children, best first if ordering moves."""
+        child_ids = self._graph.child_ids()
+        if self.order_moves:
+            actions = self._graph.ordered_actions()
+        else:
+            actions = [action for action, _ in self._graph.unique_actions()]
+        return list(dict.fromkeys(child_ids[action] for action in actions))
+
+    def _poll(self) -> None:
+        """Give up if the split point this worker is searching for has been cut off."""
+        if self._window is None:
+            return
+        if self._window.values[GENERATION] == self.generation and self._window.values[ABORTED]:
+            raise SearchAborted
+
+    def _shared_bounds(self, alpha: float, beta: float) -> tuple[float, float]:
+        """Narrow a window with the latest bounds of the split point."""
+        if self._window is None or self._window.values[GENERATION] != self.generation:
+            return alpha, beta
+        return max(alpha, float(self._window.values[ALPHA])), min(beta, float(self._window.values[BETA]))
+
+    def search(self, state_id: int, depth: float, alpha: float, beta: float, shared: bool=False) -> float:
+        """Return the minimax value of a state, searched `depth` plies deep. With `shared`, the
+        window is narrowed by the split point's bounds before each child is searched."""
+        self.nodes += 1
+        if self.nodes % POLL_INTERVAL == 0:
+            self._poll()
+        graph = self._graph.set_root(state_id)
+        if graph.is_terminal():
+            return graph.true_value()
+        if depth <= 0:
+            return graph.heuristic_value()
+        maximizing = graph.player() == Player.MAX
+        best = -math.inf if maximizing else math.inf
+        for child_id in self._children():
+            if shared:
+                alpha, beta = self._shared_bounds(alpha, beta)
+                if alpha >= beta:
+                    break
+            value = self.search(child_id, depth - 1, alpha, beta)
+            if maximizing:
+                best = max(best, value)
+                alpha = max(alpha, best)
+            else:
+                best = min(best, value)
+                beta = min(beta, best)
+            if alpha >= beta:
+                break
+        return best
+
+
+_worker_searcher: AlphaBeta|None = None
+def _init_worker(graph: SyntheticGraph, window_name: str, order_moves: bool):
+    global _worker_searcher
+    _worker_searcher = AlphaBeta(graph, order_moves, SharedWindow(window_name))
+
+def _search_worker(state_id: int, depth: float, alpha: float, beta: float, generation: int) -> tuple[float|None, int]:
+    """Search a subtree for the master. Returns None as value if the search was cut off."""
+    assert _worker_searcher is not None
+    _worker_searcher.nodes = 0
+    _worker_searcher.generation = generation
+    try:
+        value = _worker_searcher.search(state_id, depth, alpha, beta, shared=True)
+    except SearchAborted:
+        return None, _worker_searcher.nodes
+    return value, _worker_searcher.nodes
+
+
+class YoungBrothersWait(AlphaBeta):
+    """Parallel alpha-beta following the Young Brothers Wait Concept. At each split point
+    the eldest child is searched first (recursively in the same manner), after which its
+    younger siblings are farmed out to a process pool. Bounds improved by finished siblings
+    are published through a shared window, which lets the running siblings narrow their
+    own windows or give up entirely on a cutoff."""
+    def __init__(self, graph: SyntheticGraph, executor: ProcessPoolExecutor, window: SharedWindow, order_moves: bool=True):
+        super().__init__(graph, order_moves)
+        self._executor = executor
+        self._shared_window = window
+
+    def search_parallel(self, state_id: int, depth: float, alpha: float, beta: float, split_plies: int) -> float:
+        """Like `search`, but splitting the topmost `split_plies` plies. Deeper subtrees are
+        searched serially."""
+        if split_plies <= 0 or depth <= 1:
+            return self.search(state_id, depth, alpha, beta)
+        self.nodes += 1
+        graph = self._graph.set_root(state_id)
+        if graph.is_terminal():
+            return graph.true_value()
+        maximizing = graph.player() == Player.MAX
+        eldest, *younger = self._children()
+        best = self.search_parallel(eldest, depth - 1, alpha, beta, split_plies - 1)
+        if maximizing:
+            alpha = max(alpha, best)
+        else:
+            beta = min(beta, best)
+        if alpha >= beta or not younger:
+            return best
+        self.generation += 1
+        self._shared_window.publish(self.generation, alpha, beta)
+        pending: set[Future[tuple[float|None, int]]] = {
+            self._executor.submit(_search_worker, child_id, depth - 1, alpha, beta, self.generation)
+            for child_id in younger}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                value, nodes = future.result()
+                self.nodes += nodes
+                if value is None or alpha >= beta:
+                    continue
+                if maximizing:
+                    best = max(best, value)
+                    alpha = max(alpha, best)
+                    self._shared_window.values[ALPHA] = alpha
+                else:
+                    best = min(best, value)
+                    beta = min(beta, best)
+                    self._shared_window.values[BETA] = beta
+                if alpha >= beta:
+                    self._shared_window.values[ABORTED] = 1
+        return best
+
+
+def alphabeta(graph: SyntheticGraph, depth: int|None=None, order_moves: bool=True) -> SearchResult:
+    """Serial alpha-beta search from the graph's current state, to the terminals unless a
+    depth is given."""
+    start = time.perf_counter()
+    searcher = AlphaBeta(graph, order_moves)
+    value = searcher.search(graph.id(), math.inf if depth is None else depth, -math.inf, math.inf)
+    return SearchResult(value, searcher.nodes, time.perf_counter() - start)
+
+
+def parallel_alphabeta(graph: SyntheticGraph, depth: int|None=None, workers: int=2,
+                       split_plies: int=2, order_moves: bool=True) -> SearchResult:
+    """Parallel alpha-beta search (see YoungBrothersWait) from the graph's current state,
+    to the terminals unless a depth is given."""
+    if not workers > 0:
+        raise ValueError("workers must be > 0.")
+    start = time.perf_counter()
+    window = SharedWindow()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph, window.name, order_moves)) as executor:
+            searcher = YoungBrothersWait(graph, executor, window, order_moves)
+            value = searcher.search_parallel(
+                graph.id(), math.inf if depth is None else depth, -math.inf, math.inf, split_plies)
+    finally:
+        window.close()
+    return SearchResult(value, searcher.nodes, time.perf_counter() - start)
+
+
+def compare(graph: SyntheticGraph, depth: int|None=None, workers: int=2,
+            split_plies: int=2, order_moves: bool=True) -> ParallelSearchReport:
+    """Solve the graph's current state with both the serial and the parallel solver, and
+    report the speedup and search overhead of the parallel one."""
+    serial = alphabeta(graph, depth, order_moves)
+    parallel = parallel_alphabeta(graph, depth, workers, split_plies, order_moves)
+    return ParallelSearchReport(graph.true_value(), serial, parallel, workers)
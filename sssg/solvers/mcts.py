@@ -0,0 +1,253 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+import copy
+import math
+import random
+import time
+
+from ..SyntheticGraph import SyntheticGraph
+from ..custom_types import Player
+
+
+class Parallelization(Enum):
+    NONE = 0
+    ROOT = 1 # independent trees in separate processes, merged at the root
+    TREE = 2 # one shared tree, playouts run in several processes
+
+
+@dataclass
+class MCTSNode:
+    """Search statistics of a single state. Values are from MAX's point of view."""
+    player: Player
+    terminal: bool
+    edges: list[tuple[int, int]] # (action, child id) for every distinct child
+    visits: int = 0
+    value_sum: float = 0.0
+    virtual_loss: int = 0
+
+
+@dataclass
+class MCTSResult:
+    best_action: int
+    action_visits: dict[int, int]
+    action_values: dict[int, float] # mean playout value of each root action, from MAX's point of view
+    playouts: int
+    tree_size: int
+    seconds: float
+    playouts_per_second: float = field(init=False)
+
+    def __post_init__(self):
+        self.playouts_per_second = self.playouts / self.seconds if self.seconds > 0 else math.inf
+
+
+class UCTSearch():
+    """UCT over a SyntheticGraph, using the graph's state ids as keys of the search tree.
+    Since states are fully determined by their ids, the tree never needs to hold on to
+    generated states: leaves are expanded and played out by moving a private cursor to them
+    with `set_root`.
+
+    With more than one worker, the search runs in rounds. Each round selects one leaf per
+    worker (applying virtual loss so the workers spread out), plays all of them out at once
+    in a pool of worker processes, and backs the results up in a fixed order. Every playout
+    draws its moves from a seed of its own, so results only depend on the seed and the
+    number of workers. Custom behavior functions must then be picklable."""
+    def __init__(self,
+                 graph: SyntheticGraph,
+                 seed: int|str=0,
+                 workers: int=1,
+                 exploration: float=math.sqrt(2),
+                 playout_depth: int=50,
+                 virtual_loss: int=1):
+        if not workers > 0:
+            raise ValueError("workers must be > 0.")
+        if not playout_depth >= 0:
+            raise ValueError("playout_depth must be >= 0.")
+        if not virtual_loss >= 0:
+            raise ValueError("virtual_loss must be >= 0.")
+        self.root_id = graph.id()
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.virtual_loss = virtual_loss
+        self.workers = workers
+        self.tree: dict[int, MCTSNode] = {}
+        self.playouts = 0
+        self._graph = copy.copy(graph)
+        self._playout_graph = copy.copy(graph)
+        self._playout_rngs = [random.Random(f"{seed}.{i}") for i in range(workers)]
+        self._expand(self.root_id)
+
+    def _expand(self, state_id: int) -> MCTSNode:
+        """Add a state to the search tree."""
+        graph = self._graph.set_root(state_id)
+        terminal = graph.is_terminal()
+        edges: list[tuple[int, int]] = []
+        if not terminal:
+            child_ids = graph.child_ids()
+            edges = [(action, child_ids[action]) for action, _ in graph.unique_actions()]
+        node = MCTSNode(player=graph.player(), terminal=terminal, edges=edges)
+        self.tree[state_id] = node
+        return node
+
+    def _score(self, parent: MCTSNode, child: MCTSNode) -> float:
+        """UCT score of a child from the point of view of the parent's player."""
+        sign = 1 if parent.player == Player.MAX else -1
+        visits = child.visits + child.virtual_loss
+        if visits == 0:
+            return math.inf
+        value = sign * child.value_sum - child.virtual_loss
+        parent_visits = parent.visits + parent.virtual_loss
+        if parent_visits == 0: # a new state whose children are all transpositions, visited through other parents
+            return value / visits
+        return value / visits + self.exploration * math.sqrt(math.log(parent_visits) / visits)
+
+    def _select(self) -> list[int]:
+        """Walk down the tree and return the path to a new (or terminal) leaf, applying
+        virtual loss along the way."""
+        path = [self.root_id]
+        node = self.tree[self.root_id]
+        while not node.terminal:
+            unvisited = [child_id for _, child_id in node.edges if child_id not in self.tree]
+            if unvisited:
+                self._expand(unvisited[0])
+                path.append(unvisited[0])
+                break
+            best_score, best_child_id = -math.inf, node.edges[0][1]
+            for _, child_id in node.edges:
+                score = self._score(node, self.tree[child_id])
+                if score > best_score:
+                    best_score, best_child_id = score, child_id
+            path.append(best_child_id)
+            node = self.tree[best_child_id]
+            if best_child_id in path[:-1]: # a cycle, stop here and play out from this state
+                break
+        for state_id in path:
+            self.tree[state_id].virtual_loss += self.virtual_loss
+        return path
+
+
+    def _backpropagate(self, path: list[int], value: float) -> None:
+        for state_id in path:
+            node = self.tree[state_id]
+            node.virtual_loss -= self.virtual_loss
+            node.visits += 1
+            node.value_sum += value
+
+    def run(self, playouts: int) -> "UCTSearch":
+        """Perform the given number of playouts."""
+        executor = None
+        if self.workers > 1 and playouts > 1:
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self._graph,))
+        try:
+            while playouts > 0:
+                batch_size = min(self.workers, playouts)
+                paths = [self._select() for _ in range(batch_size)]
+                leaf_ids = [path[-1] for path in paths]
+                seeds = [self._playout_rngs[slot].getrandbits(64) for slot in range(batch_size)]
+                if executor is None or batch_size == 1:
+                    values = [_playout(self._playout_graph, leaf_id, seed, self.playout_depth)
+                              for leaf_id, seed in zip(leaf_ids, seeds)]
+                else:
+                    values = list(executor.map(_playout_worker, leaf_ids, seeds, [self.playout_depth]*batch_size))
+                for path, value in zip(paths, values):
+                    self._backpropagate(path, value)
+                playouts -= batch_size
+                self.playouts += batch_size
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self
+
+    def root_statistics(self) -> tuple[dict[int, int], dict[int, float]]:
+        """Return the visit counts and total values of the root's actions."""
+        root = self.tree[self.root_id]
+        visits: dict[int, int] = {}
+        value_sums: dict[int, float] = {}
+        for action, child_id in root.edges:
+            child = self.tree.get(child_id)
+            visits[action] = child.visits if child is not None else 0
+            value_sums[action] = child.value_sum if child is not None else 0.0
+        return visits, value_sums
+
+
+def _result(visits: dict[int, int], value_sums: dict[int, float], playouts: int, tree_size: int, seconds: float) -> MCTSResult:
+    """Combine root statistics into an MCTSResult. The most visited action is best."""
+    if not visits:
+        raise ValueError("Can not search from a terminal state.")
+    best_action = max(visits, key=lambda action: (visits[action], -action))
+    values = {action: value_sums[action] / visits[action] if visits[action] else 0.0 for action in visits}
+    return MCTSResult(best_action, visits, values, playouts, tree_size, seconds)
+
+
+_worker_graph: SyntheticGraph|None = None
+def _init_worker(graph: SyntheticGraph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _playout(graph: SyntheticGraph, state_id: int, seed: int, playout_depth: int) -> float:
+    """Make random moves from the given state and return the reached state's value."""
+    graph.set_root(state_id)
+    rng = random.Random(seed)
+    for _ in range(playout_depth):
+        if graph.is_terminal():
+            break
+        graph.make(rng.randrange(len(graph.actions())))
+    if graph.is_terminal():
+        return graph.true_value()
+    return graph.heuristic_value()
+
+
+def _playout_worker(state_id: int, seed: int, playout_depth: int) -> float:
+    assert _worker_graph is not None
+    return _playout(_worker_graph, state_id, seed, playout_depth)
+
+
+def _search_worker(playouts: int, seed: str, workers: int, exploration: float,
+                   playout_depth: int) -> tuple[dict[int, int], dict[int, float], int]:
+    assert _worker_graph is not None
+    search = UCTSearch(_worker_graph, seed, workers, exploration, playout_depth).run(playouts)
+    visits, value_sums = search.root_statistics()
+    return visits, value_sums, len(search.tree)
+
+
+def search(graph: SyntheticGraph,
+           playouts: int,
+           parallelization: Parallelization=Parallelization.NONE,
+           workers: int=1,
+           seed: int=0,
+           exploration: float=math.sqrt(2),
+           playout_depth: int=50) -> MCTSResult:
+    """Run UCT from the graph's current state, without moving it. Playouts end at terminals,
+    or after `playout_depth` random moves at which point the heuristic value is used.
+
+    With ROOT parallelization, each of `workers` processes grows its own tree from its own
+    seed and the root statistics are summed. With TREE parallelization, one tree is grown in
+    this process while its playouts run in `workers` processes, using virtual loss to spread
+    them out. Results are reproducible for a given seed and number of workers."""
+    if not playouts > 0:
+        raise ValueError("playouts must be > 0.")
+    if not workers > 0:
+        raise ValueError("workers must be > 0.")
+    if graph.is_terminal():
+        raise ValueError("Can not search from a terminal state.")
+    start = time.perf_counter()
+    match parallelization:
+        case Parallelization.NONE | Parallelization.TREE:
+            tree_workers = workers if parallelization == Parallelization.TREE else 1
+            uct = UCTSearch(graph, seed, tree_workers, exploration, playout_depth).run(playouts)
+            visits, value_sums = uct.root_statistics()
+            return _result(visits, value_sums, playouts, len(uct.tree), time.perf_counter() - start)
+        case Parallelization.ROOT:
+            worker_playouts = [playouts // workers + (i < playouts % workers) for i in range(workers)]
+            worker_seeds = [f"{seed}.root{i}" for i in range(workers)]
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph,)) as executor:
+                results = list(executor.map(_search_worker, worker_playouts, worker_seeds,
+                                            [1]*workers, [exploration]*workers, [playout_depth]*workers))
+            visits: dict[int, int] = {}
+            value_sums: dict[int, float] = {}
+            for worker_visits, worker_value_sums, _ in results:
+                for action in worker_visits:
+                    visits[action] = visits.get(action, 0) + worker_visits[action]
+                    value_sums[action] = value_sums.get(action, 0.0) + worker_value_sums[action]
+            tree_size = sum(tree_size for _, _, tree_size in results)
+            return _result(visits, value_sums, playouts, tree_size, time.perf_counter() - start)
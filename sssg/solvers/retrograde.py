@@ -0,0 +1,176 @@
+from dataclasses import dataclass, field
+import copy
+import numpy as np
+
+from ..SyntheticGraph import SyntheticGraph
+from ..custom_types import Player
+from ..constants import MAX_RETROGRADE_LEVEL_SIZE
+from ..utils import extract_depth_from_id, extract_tspace_record_from_id, extract_true_value_from_id, extract_player_from_id
+
+
+UNSOLVED = 2 # minimax value of slots that were never reached
+
+
+@dataclass
+class RetrogradeLevel:
+    """Every reachable state of a single depth. Value arrays are dense over all possible
+    states of the depth, indexed by `index()`. Reached states and their distinct children are
+    kept in CSR form: the children of `states[i]` are the slots `child_indices[j]` of depth
+    `child_depths[j]`, for j in `child_offsets[i]:child_offsets[i+1]`."""
+    depth: int
+    transposition_space_size: int
+    states: np.ndarray # sorted slots of the reached states
+    terminal: np.ndarray # bool, per reached state
+    child_offsets: np.ndarray
+    child_depths: np.ndarray
+    child_indices: np.ndarray
+    minimax_value: np.ndarray = field(init=False) # int8, per slot
+
+    def __post_init__(self):
+        self.minimax_value = np.full(level_size(self.transposition_space_size), UNSOLVED, dtype=np.int8)
+
+    def index(self, true_value: int, player: Player, tspace_record: int) -> int:
+        """Return the slot of a state of this depth."""
+        return _slot(self.transposition_space_size, true_value, player, tspace_record)
+
+    def true_values(self) -> np.ndarray:
+        """Return the true values of the reached states."""
+        return (self.states // (2 * (self.transposition_space_size + 1)) - 1).astype(np.int8)
+
+    def players(self) -> np.ndarray:
+        """Return the players (as Player values) of the reached states."""
+        return (self.states // (self.transposition_space_size + 1)) % 2
+
+    def tspace_records(self) -> np.ndarray:
+        """Return the transposition space records of the reached states."""
+        return self.states % (self.transposition_space_size + 1)
+
+
+@dataclass
+class RetrogradeSolution:
+    value: int # minimax value of the state the solver started from
+    levels: dict[int, RetrogradeLevel]
+    inconsistent_ids: list[int] # states whose minimax value differs from their true value
+    states: int = field(init=False)
+    terminals: int = field(init=False)
+
+    def __post_init__(self):
+        self.states = sum(len(level.states) for level in self.levels.values())
+        self.terminals = sum(int(level.terminal.sum()) for level in self.levels.values())
+
+    @property
+    def consistent(self) -> bool:
+        return not self.inconsistent_ids
+
+
+def level_size(transposition_space_size: int) -> int:
+    """Number of possible states of a depth: 3 true values, 2 players and every record."""
+    return 3 * 2 * (transposition_space_size + 1)
+
+
+def _slot(transposition_space_size: int, true_value: int, player: Player, tspace_record: int) -> int:
+    return ((true_value + 1) * 2 + player.value) * (transposition_space_size + 1) + tspace_record
+
+
+def _enumerate(graph: SyntheticGraph, max_level_size: int) -> dict[int, RetrogradeLevel]:
+    """Expand every state reachable from the graph's current state, shallowest depth first.
+    Since children are always deeper than their parents, all parents of a depth have been
+    expanded by the time it is reached."""
+    depth_bit_length = graph.globals.vars.max_depth.bit_length()
+    record_bit_length = graph.globals.vars.max_transposition_space_size.bit_length()
+    tspace_sizes: dict[int, int] = {}
+    def reached_array(depth: int) -> np.ndarray:
+        tspace_sizes[depth] = graph.transposition_space_size(depth)
+        size = level_size(tspace_sizes[depth])
+        if size > max_level_size:
+            raise ValueError(f"Depth {depth} has {size} possible states, more than max_level_size={max_level_size}.")
+        return np.zeros(size, dtype=np.bool_)
+
+    cursor = copy.copy(graph)
+    start_id = graph.id()
+    start_depth = graph.depth()
+    pending = {start_depth: reached_array(start_depth)}
+    start_record = extract_tspace_record_from_id(start_id, record_bit_length)
+    pending[start_depth][_slot(tspace_sizes[start_depth], graph.true_value(), graph.player(), start_record)] = True
+
+    levels: dict[int, RetrogradeLevel] = {}
+    while pending:
+        depth = min(pending)
+        states = np.flatnonzero(pending.pop(depth))
+        tspace_size = tspace_sizes[depth]
+        terminal = np.zeros(len(states), dtype=np.bool_)
+        child_offsets = np.zeros(len(states) + 1, dtype=np.int64)
+        child_depths: list[int] = []
+        child_indices: list[int] = []
+        for i, slot in enumerate(states.tolist()):
+            record = slot % (tspace_size + 1)
+            player = Player((slot // (tspace_size + 1)) % 2)
+            true_value = slot // (2 * (tspace_size + 1)) - 1
+            cursor.set_root(cursor.encode_id(true_value, player, depth, record))
+            if cursor.is_terminal():
+                terminal[i] = True
+            else:
+                for child_id in dict.fromkeys(cursor.child_ids()):
+                    child_depth = extract_depth_from_id(child_id, depth_bit_length)
+                    if child_depth <= depth:
+                        raise ValueError("Retrograde solving requires children to be deeper than their parents.")
+                    if child_depth not in pending:
+                        pending[child_depth] = reached_array(child_depth)
+                    child_slot = _slot(
+                        tspace_sizes[child_depth],
+                        extract_true_value_from_id(child_id),
+                        extract_player_from_id(child_id),
+                        extract_tspace_record_from_id(child_id, record_bit_length))
+                    pending[child_depth][child_slot] = True
+                    child_depths.append(child_depth)
+                    child_indices.append(child_slot)
+            child_offsets[i+1] = len(child_indices)
+        levels[depth] = RetrogradeLevel(
+            depth, tspace_size, states, terminal, child_offsets,
+            np.array(child_depths, dtype=np.int64), np.array(child_indices, dtype=np.int64))
+    return levels
+
+
+def _backup(levels: dict[int, RetrogradeLevel]) -> None:
+    """Fill in the minimax values of all levels, deepest first."""
+    for depth in sorted(levels, reverse=True):
+        level = levels[depth]
+        true_values = level.true_values()
+        level.minimax_value[level.states[level.terminal]] = true_values[level.terminal]
+        inner = ~level.terminal
+        if not inner.any():
+            continue
+        child_values = np.empty(len(level.child_indices), dtype=np.int8)
+        for child_depth in np.unique(level.child_depths).tolist():
+            mask = level.child_depths == child_depth
+            child_values[mask] = levels[child_depth].minimax_value[level.child_indices[mask]]
+        # terminals have no children, so the remaining segments are contiguous
+        starts = level.child_offsets[:-1][inner]
+        best_max = np.maximum.reduceat(child_values, starts)
+        best_min = np.minimum.reduceat(child_values, starts)
+        maximizing = level.players()[inner] == Player.MAX.value
+        level.minimax_value[level.states[inner]] = np.where(maximizing, best_max, best_min)
+
+
+def solve(graph: SyntheticGraph, max_level_size: int=MAX_RETROGRADE_LEVEL_SIZE) -> RetrogradeSolution:
+    """Solve the graph from its current state, without moving it, by enumerating every
+    reachable state and backing up minimax values from the terminals. Every state's backed
+    up value is checked against its true value.
+
+    Only feasible when the transposition space of every reached depth is small: a ValueError
+    is raised if a depth has more than `max_level_size` possible states, or if a child is not
+    deeper than its parent."""
+    levels = _enumerate(graph, max_level_size)
+    _backup(levels)
+    record_bit_length = graph.globals.vars.max_transposition_space_size.bit_length()
+    inconsistent_ids: list[int] = []
+    for depth, level in sorted(levels.items()):
+        true_values = level.true_values()
+        mismatches = np.flatnonzero(level.minimax_value[level.states] != true_values)
+        players, records = level.players()[mismatches], level.tspace_records()[mismatches]
+        for true_value, player, record in zip(true_values[mismatches].tolist(), players.tolist(), records.tolist()):
+            inconsistent_ids.append(graph.encode_id(true_value, Player(player), depth, record))
+    start = levels[graph.depth()]
+    start_slot = start.index(graph.true_value(), graph.player(),
+                             extract_tspace_record_from_id(graph.id(), record_bit_length))
+    return RetrogradeSolution(int(start.minimax_value[start_slot]), levels, inconsistent_ids)
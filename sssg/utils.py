@@ -1,3 +1,6 @@
+from multiprocessing import shared_memory
+import numpy as np
+
 from .custom_types import *
 from .constants import *
 
@@ -69,4 +72,19 @@ def assign_child_true_value_information(
                 child_true_value_information.total_child_losses += 1
         case _: # should never happen, but handles type error
             raise ValueError("Invalid child value.")
-    
\ No newline at end of file
+
+def int_array(values: list[int]) -> np.ndarray:
+    """Return the integers as an int64 array if they can all be converted to floats exactly,
+    otherwise as an array of Python ints, so that arithmetic gives the same results as on 
+    the original values."""
+    if all(-FLOAT_EXACT_INT_LIMIT <= value <= FLOAT_EXACT_INT_LIMIT for value in values):
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=object)
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory block, created by this process or an ancestor of
+    it. The creator stays responsible for unlinking the block."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # type: ignore[call-arg]
+    except TypeError: # before Python 3.13, the resource tracker (shared with the creator) tracks it anyway
+        return shared_memory.SharedMemory(name=name)
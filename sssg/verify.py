@@ -0,0 +1,260 @@
+"""Check that every state of a graph behaves identically no matter how it is reached.
+
+    python -m sssg.verify --config my_graph.py [--plies 4] [--max-states 10000] [--workers 8]
+
+The config file is a Python file defining `parameters`, a dict of SyntheticGraph keyword
+arguments (custom behavior functions may be defined in the same file). The region within
+`--plies` actions of the root is traversed breadth first, depth first (in both action
+orders), by random walks and by jumping to each state with `set_root`, in parallel worker
+processes. The expansions each traversal observed are compared per state id, and the first
+divergent state is reported together with the behavior function responsible."""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+import argparse
+import os
+import random
+import runpy
+import sys
+
+from .SyntheticGraph import SyntheticGraph
+from .RNGHasher import RNGHasher
+from .custom_types import Expansion
+from .utils import extract_true_value_from_id, extract_depth_from_id, extract_tspace_record_from_id
+
+
+ORDERS = ["bfs", "dfs", "dfs_reversed", "random"]
+SET_ROOT_CHUNKS_PER_WORKER = 4
+
+
+@dataclass
+class Divergence:
+    state_id: int
+    depth: int
+    orders: tuple[str, str] # the traversal which saw the state first, and the one which disagreed
+    function: str # the behavior function (or parameter, for draws it governs) producing the differing output
+    expected: Expansion
+    found: Expansion
+
+
+@dataclass
+class VerificationReport:
+    states: int # distinct states compared
+    observations: int # expansions observed over all traversals
+    divergence: Divergence|None
+    errors: list[tuple[str, str]] # traversals which failed (inconsistent graphs can break them), with the error
+
+    @property
+    def deterministic(self) -> bool:
+        return self.divergence is None and not self.errors
+
+
+def load_parameters(config: str) -> dict[str, Any]:
+    """Execute a config file and return its `parameters`."""
+    namespace = runpy.run_path(config)
+    if not isinstance(namespace.get("parameters"), dict):
+        raise ValueError(f"{config} does not define a dict named `parameters`.")
+    return namespace["parameters"]
+
+
+def diagnose(graph: SyntheticGraph, state_id: int, expected: Expansion, found: Expansion) -> str:
+    """Name the behavior function responsible for two differing expansions of a state."""
+    if expected.branching_factor != found.branching_factor:
+        return "branching_function"
+    if expected.heuristic_value != found.heuristic_value:
+        return "heuristic_value_function"
+    if len(set(expected.child_ids)) != len(set(found.child_ids)):
+        return "symmetry_frequency"
+    depth_bit_length = graph.globals.vars.max_depth.bit_length()
+    record_bit_length = graph.globals.vars.max_transposition_space_size.bit_length()
+    for expected_id, found_id in zip(expected.child_ids, found.child_ids):
+        if extract_true_value_from_id(expected_id) != extract_true_value_from_id(found_id):
+            return "child_true_value_function"
+        child_depth = extract_depth_from_id(expected_id, depth_bit_length)
+        if child_depth != extract_depth_from_id(found_id, depth_bit_length):
+            return "child_depth_function"
+        records = (extract_tspace_record_from_id(expected_id, record_bit_length),
+                   extract_tspace_record_from_id(found_id, record_bit_length))
+        if records[0] != records[1]:
+            # the records are scaled between the sizes of both depths' transposition spaces, so
+            # sizes which change from call to call, or which a record exceeds, differ between
+            # the traversals as well. Otherwise the record was drawn differently within the same
+            # space, by the locality draw
+            depths = (extract_depth_from_id(state_id, depth_bit_length), child_depth)
+            sizes = [_transposition_space_size(graph, state_id, depth) for depth in depths]
+            if sizes != [_transposition_space_size(graph, state_id, depth) for depth in depths] or max(records) > sizes[1]:
+                return "transposition_space_function"
+            return "locality_grouping"
+    return "unknown"
+
+
+def _transposition_space_size(graph: SyntheticGraph, state_id: int, depth: int) -> int:
+    """Call the graph's transposition space function for a depth afresh, bypassing the
+    graph's memo of the first size computed for each depth."""
+    rng = RNGHasher(graph.globals.vars.distribution, nodeid=state_id, seed=graph.globals.vars.seed)
+    return graph._arguments["transposition_space_function"](rng.next_int, rng.next_float, graph.globals.vars, depth)
+
+
+class _Traversal():
+    """Records the expansion of every state a traversal visits, up to `max_states` states."""
+    def __init__(self, graph: SyntheticGraph, plies: int, max_states: int):
+        self.graph = graph
+        self.plies = plies
+        self.max_states = max_states
+        self.observations: list[tuple[int, Expansion]] = []
+
+    def full(self) -> bool:
+        return len(self.observations) >= self.max_states
+
+    def observe(self) -> None:
+        self.observations.append((self.graph.id(), self.graph.expansion()))
+
+    def bfs(self) -> None:
+        """Visit states breadth first, moving to each one along its path from the root."""
+        paths: list[list[int]] = [[]]
+        seen = {self.graph.id()}
+        for path in paths:
+            if self.full():
+                return
+            self.graph.goto(path)
+            self.observe()
+            if len(path) >= self.plies or self.graph.is_terminal():
+                continue
+            for action, child_id in enumerate(self.graph.child_ids()):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    paths.append(path + [action])
+
+    def dfs(self, reverse: bool=False) -> None:
+        """Visit states depth first with make and undo."""
+        if self.full():
+            return
+        self.observe()
+        if self.graph.is_terminal() or len(self.graph.path()) >= self.plies:
+            return
+        actions = self.graph.actions()
+        for action in reversed(actions) if reverse else actions:
+            self.graph.make(action)
+            self.dfs(reverse)
+            self.graph.undo()
+
+    def random_walk(self, seed: int) -> None:
+        """Walk randomly, evaluating all children before each move."""
+        rng = random.Random(seed)
+        depth = 0
+        while not self.full():
+            self.observe()
+            if depth < self.plies and not self.graph.is_terminal() and (depth == 0 or rng.random() < 0.7):
+                self.graph.child_heuristics()
+                self.graph.make(rng.choice(self.graph.actions()))
+                depth += 1
+            elif depth == 0:
+                return
+            else:
+                self.graph.undo()
+                depth -= 1
+
+    def set_root(self, state_ids: list[int]) -> None:
+        for state_id in state_ids:
+            self.graph.set_root(state_id)
+            self.observe()
+
+
+_worker_parameters: dict[str, Any]|None = None
+def _init_worker(config: str):
+    global _worker_parameters
+    _worker_parameters = load_parameters(config)
+
+def _traverse_worker(order: str, plies: int, max_states: int, seed: int,
+                     state_ids: list[int]) -> tuple[list[tuple[int, Expansion]], str|None]:
+    """Run a traversal and return its observations, together with the error which ended it
+    early, if any."""
+    assert _worker_parameters is not None
+    traversal = _Traversal(SyntheticGraph(**_worker_parameters), plies, max_states)
+    try:
+        match order:
+            case "bfs":
+                traversal.bfs()
+            case "dfs":
+                traversal.dfs()
+            case "dfs_reversed":
+                traversal.dfs(reverse=True)
+            case "random":
+                traversal.random_walk(seed)
+            case "set_root":
+                traversal.set_root(state_ids)
+            case _:
+                raise ValueError(f"Unknown traversal order {order}.")
+    except Exception as error:
+        return traversal.observations, f"{type(error).__name__}: {error}"
+    return traversal.observations, None
+
+
+def verify(config: str, plies: int=4, max_states: int=10000, workers: int|None=None, seed: int=0) -> VerificationReport:
+    """Traverse the region within `plies` actions of the root in every order and compare
+    the expansions observed for each state."""
+    if not plies >= 0:
+        raise ValueError("plies must be >= 0.")
+    if not max_states > 0:
+        raise ValueError("max_states must be > 0.")
+    workers = workers or os.cpu_count() or 1
+    graph = SyntheticGraph(**load_parameters(config))
+    reference: dict[int, tuple[str, Expansion]] = {}
+    observation_count = 0
+    def compare(order: str, observations: list[tuple[int, Expansion]]) -> Divergence|None:
+        nonlocal observation_count
+        observation_count += len(observations)
+        for state_id, expansion in observations:
+            first = reference.setdefault(state_id, (order, expansion))
+            if first[1] != expansion:
+                return Divergence(
+                    state_id=state_id,
+                    depth=extract_depth_from_id(state_id, graph.globals.vars.max_depth.bit_length()),
+                    orders=(first[0], order),
+                    function=diagnose(graph, state_id, first[1], expansion),
+                    expected=first[1], found=expansion)
+        return None
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(config,)) as executor:
+        futures = [executor.submit(_traverse_worker, order, plies, max_states, seed, []) for order in ORDERS]
+        results = [(order, *future.result()) for order, future in zip(ORDERS, futures)]
+        state_ids = list(dict.fromkeys(state_id for _, observations, _ in results for state_id, _ in observations))
+        random.Random(seed).shuffle(state_ids)
+        chunk_count = workers * SET_ROOT_CHUNKS_PER_WORKER
+        chunks = [state_ids[i::chunk_count] for i in range(chunk_count) if state_ids[i::chunk_count]]
+        futures = [executor.submit(_traverse_worker, "set_root", plies, len(chunk), seed, chunk) for chunk in chunks]
+        results += [("set_root", *future.result()) for future in futures]
+    errors = [(order, error) for order, _, error in results if error is not None]
+    for order, observations, _ in results:
+        divergence = compare(order, observations)
+        if divergence is not None:
+            return VerificationReport(len(reference), observation_count, divergence, errors)
+    return VerificationReport(len(reference), observation_count, None, errors)
+
+
+def main(argv: list[str]|None=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m sssg.verify", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", required=True, help="Python file defining `parameters`, a dict of SyntheticGraph arguments.")
+    parser.add_argument("--plies", type=int, default=4, help="Depth of the region to traverse, in actions from the root.")
+    parser.add_argument("--max-states", type=int, default=10000, help="Maximum number of states visited per traversal.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random traversals.")
+    args = parser.parse_args(argv)
+    report = verify(args.config, args.plies, args.max_states, args.workers, args.seed)
+    if report.deterministic:
+        print(f"OK: {report.states} states behaved identically over {report.observations} observations.")
+        return 0
+    divergence = report.divergence
+    if divergence is not None:
+        print(f"DIVERGENCE at state {divergence.state_id} (depth {divergence.depth}), "
+              f"first seen by {divergence.orders[0]}, then by {divergence.orders[1]}.")
+        print(f"Responsible: {divergence.function}")
+        print(f"  expected: {divergence.expected}")
+        print(f"  found:    {divergence.found}")
+    for order, error in report.errors:
+        print(f"Traversal {order} failed with {error}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
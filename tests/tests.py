@@ -3,10 +3,34 @@ import math
 from typing import Any
 from collections import defaultdict
 import random
+import multiprocessing
+import pickle
+import json
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import subprocess
+import gc
+import os
+import sys
+import numpy as np
 
 import sssg.RNGHasher as RNGHasher
 from sssg.RNGHasher import RNGHasher as RNG
 from sssg.SyntheticGraph import SyntheticGraph
+from sssg.SharedExpansionCache import SharedExpansionCache
+from sssg.ExternalBFS import ExternalBFS
+from sssg.OpeningBook import OpeningBook
+from sssg.NodeArena import NodeArena
+from sssg.Trace import TraceRecorder, TraceReplayer, read_trace
+from sssg.Timeline import Timeline
+from sssg.AsyncCursor import AsyncCursor, ExpansionScheduler, ProcessBackend
+from sssg import verify, estimation, models, experiments, hooks
+from sssg.behavior import state_view_function, batch_version
+from sssg.default_behavior_functions import *
+from sssg.solvers import mcts, alphabeta, retrograde
 from sssg.custom_types import *
 from sssg.custom_exceptions import *
 from sssg.constants import *
@@ -691,6 +715,24 @@ class TestSyntheticGraph(unittest.TestCase):
                     "Incorrect number of unique children.")
                 state.make_random()
     
+    def test_unique_actions(self):
+        """unique_actions() should collapse symmetric duplicates into one action each."""
+        state = SyntheticGraph(
+            symmetry_factor=0.25, symmetry_frequency=0.5, 
+            branching_factor_base=12, max_depth=10)
+        while not state.is_terminal():
+            actions = state.actions()
+            child_ids = [child.id for child in state._current.children]
+            unique_actions = state.unique_actions()
+            self.assertEqual(len(unique_actions), len(set(child_ids)))
+            self.assertEqual(sum(multiplicity for _, multiplicity in unique_actions), len(actions))
+            for action, multiplicity in unique_actions:
+                self.assertEqual(child_ids.index(child_ids[action]), action)
+                self.assertEqual(child_ids.count(child_ids[action]), multiplicity)
+            if len(set(child_ids)) < len(actions):
+                self.assertLess(len(state._current._children), len(actions))
+            state.make_random()
+
     def test_very_low_true_value_forced_ratio(self):
         """"With a very low true_value_forced_ratio, and tie/similarity chances set to 0, 
         only one child should share a value with its parent."""
@@ -813,6 +855,425 @@ class TestSyntheticGraph(unittest.TestCase):
             state.set_root(sampled_id)
             dfs_from_new_root(state)
 
+    def test_fork(self):
+        """A fork should start at the same state and move independently of the original."""
+        state = SyntheticGraph(max_depth=20, branching_factor_base=4)
+        for _ in range(5):
+            state.make_random()
+        forked = state.fork()
+        self.assertEqual(forked.id(), state.id())
+        self.assertEqual(forked.path(), state.path())
+        forked.make(forked.actions()[1])
+        forked_child_id = forked.id()
+        self.assertEqual(state.depth(), 5)
+        state.undo()
+        state.undo()
+        state.make(state.actions()[0])
+        forked.undo()
+        forked.make(forked.actions()[1])
+        self.assertEqual(forked.id(), forked_child_id)
+        while not forked.is_root():
+            forked.undo()
+        self.assertEqual(state.depth(), 4)
+        # neither cursor changes states the other one still holds
+        root = state.goto([])._current
+        children = list(root.children) if state.actions() else []
+        forked = state.fork()
+        forked.make(0).undo()
+        self.assertIsNot(forked._current, root)
+        self.assertEqual(root.children, children)
+        self.assertEqual(len(children), 4)
+
+    def test_forks_on_threads(self):
+        """Forks of one graph moved on different threads should see the same graph as a
+        single cursor, even when switching threads as often as possible."""
+        parameters: dict[str, Any] = dict(branching_factor_base=8, branching_factor_variance=2, max_depth=10)
+        def walk(cursor: SyntheticGraph, seed: int) -> list[list[int]]:
+            rng = random.Random(seed)
+            child_ids: list[list[int]] = []
+            for _ in range(300):
+                if cursor.is_terminal() or rng.random() < 0.3:
+                    cursor.goto([])
+                else:
+                    child_ids.append(cursor.child_ids())
+                    cursor.make(rng.randrange(len(cursor.actions())))
+            return child_ids
+        expected = [walk(SyntheticGraph(**parameters), seed) for seed in range(4)]
+        state = SyntheticGraph(**parameters)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(lambda seed: walk(state.fork(), seed), range(4)))
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertEqual(results, expected)
+        self.assertEqual(state.child_ids(), SyntheticGraph(**parameters).child_ids())
+
+    def test_path_and_goto(self):
+        state = SyntheticGraph(max_depth=30, branching_factor_base=3)
+        for _ in range(20):
+            state.make_random()
+        path = state.path()
+        self.assertEqual(len(path), 20)
+        state_id = state.id()
+        other = SyntheticGraph(max_depth=30, branching_factor_base=3)
+        other.goto(path)
+        self.assertEqual(other.id(), state_id)
+        self.assertEqual(other.path(), path)
+        other.goto([])
+        self.assertTrue(other.is_root())
+
+    def test_sample_states(self):
+        state = SyntheticGraph(max_depth=20, transposition_space_function=lambda randint, randf, globals, depth: 10 * depth + 1) # type: ignore
+        samples = state.sample_states(7, 500)
+        self.assertEqual(samples.shape, (500,))
+        self.assertTrue(np.array_equal(samples, state.sample_states(7, 500)))
+        self.assertFalse(np.array_equal(samples, state.sample_states(7, 500, seed=1)))
+        records: set[int] = set()
+        true_values: set[int] = set()
+        for state_id in samples:
+            state.set_root(int(state_id))
+            self.assertEqual(state.depth(), 7)
+            self.assertEqual(state.player(), Player.MIN)
+            records.add(state._current.tspace_record)
+            true_values.add(state.true_value())
+            state.actions()
+        self.assertEqual(records, set(range(72)))
+        self.assertEqual(true_values, {-1, 0, 1})
+        for state_id in state.sample_states(4, 50, true_value=-1):
+            state.set_root(int(state_id))
+            self.assertEqual((state.true_value(), state.player()), (-1, Player.MAX))
+        self.assertRaises(ValueError, lambda: state.sample_states(21, 1))
+        self.assertRaises(ValueError, lambda: state.sample_states(4, 1, player=Player.MIN))
+        # when moves can skip depths or stay at the same depth, either player can be at any depth
+        state = SyntheticGraph(max_depth=20, child_depth_minumum=0, child_depth_maximum=2)
+        players: set[Player] = set()
+        for state_id in state.sample_states(7, 100):
+            state.set_root(int(state_id))
+            self.assertEqual(state.depth(), 7)
+            players.add(state.player())
+            state.actions()
+        self.assertEqual(players, {Player.MIN, Player.MAX})
+        state.set_root(int(state.sample_states(5, 1, player=Player.MAX)[0]))
+        self.assertEqual(state.player(), Player.MAX)
+
+    def test_repetition_tracking(self):
+        """on_path() and repetition_count() should agree with walking up the parent chain."""
+        def ancestor_ids(state: SyntheticGraph) -> list[int]:
+            node, ids = state._current, []
+            while node is not None:
+                ids.append(node.id)
+                node = node.parent
+            return ids
+        state = SyntheticGraph(seed=3, max_depth=6, branching_factor_base=3, child_depth_minumum=-1, child_depth_maximum=1,
+                               transposition_space_function=lambda randint, randf, globals, depth: 3) # type: ignore
+        rng = random.Random(0)
+        forked, forked_ids = None, []
+        repetitions = 0
+        for step in range(300):
+            if not state.is_terminal() and (state.is_root() or rng.random() < 0.6):
+                state.make(rng.choice(state.actions()))
+            else:
+                state.undo()
+            if step == 150:
+                forked = state.fork()
+                forked_ids = ancestor_ids(forked)
+            ids = ancestor_ids(state)
+            self.assertEqual(state.repetition_count(), ids.count(state.id()) - 1)
+            repetitions += state.repetition_count()
+            if not state.is_terminal():
+                child_ids = state.child_ids()
+                for child_id in child_ids:
+                    self.assertEqual(state.on_path(child_id), child_id in ids)
+                skipping = state.actions(skip_repetitions=True)
+                self.assertEqual(skipping, [action for action in state.actions() if child_ids[action] not in ids])
+        self.assertGreater(repetitions, 0)
+        assert forked is not None
+        self.assertEqual(forked.repetition_count(), forked_ids.count(forked.id()) - 1)
+        self.assertTrue(all(forked.on_path(state_id) for state_id in forked_ids))
+        forked.goto([])
+        self.assertEqual(forked.repetition_count(), 0)
+
+    def test_partial_actions(self):
+        """Children generated a few at a time should be identical to a full expansion."""
+        configurations: list[dict[str, Any]] = [
+            {"branching_factor_base": 6, "branching_factor_variance": 3},
+            {"branching_factor_base": 6, "symmetry_frequency": 0.5, "symmetry_factor": 0.5},
+            {"branching_factor_base": 5, "true_value_forced_ratio": 0.6, "expansion_caches": [SharedExpansionCache()]},
+        ]
+        for configuration in configurations:
+            full = SyntheticGraph(seed=11, max_depth=5, **configuration)
+            widening = SyntheticGraph(seed=11, max_depth=5, **configuration)
+            rng = random.Random(0)
+            for _ in range(100):
+                if full.is_terminal():
+                    full.goto([])
+                    widening.goto([])
+                    continue
+                expansion = full.expansion()
+                limit = 0
+                while limit < expansion.branching_factor:
+                    limit += rng.randint(1, 3)
+                    actions = widening.actions(limit=limit)
+                    self.assertEqual(actions, list(range(min(limit, expansion.branching_factor))))
+                    self.assertEqual([widening._current.child(action).id for action in actions],
+                                     expansion.child_ids[:len(actions)])
+                action = rng.choice(full.actions())
+                full.make(action)
+                widening.make(action)
+                self.assertEqual(full.id(), widening.id())
+        # moving into a child generates only the children up to it
+        widening = SyntheticGraph(seed=11, branching_factor_base=6).make(2)
+        self.assertEqual(len(widening._current.parent._children), 3) # type: ignore
+        self.assertEqual(widening.undo().expansion(), SyntheticGraph(seed=11, branching_factor_base=6).expansion())
+        # unless there are expansion caches, which only take complete expansions
+        cache = SharedExpansionCache()
+        cached = SyntheticGraph(seed=11, branching_factor_base=6, expansion_caches=[cache])
+        for _ in range(10):
+            cached.make(0)
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.lookup(cached.undo().id()), cached.expansion())
+
+    def test_budget(self):
+        """Eviction should keep the live nodes within budget without changing the graph, and
+        exhausted budgets should raise BudgetExceeded."""
+        parameters: dict[str, Any] = dict(
+            branching_factor_base=6, max_depth=40, child_depth_minumum=-1, child_depth_maximum=2, terminal_chance=0.01)
+        def walk(state: SyntheticGraph, steps: int) -> list[tuple[int, float, list[int]]]:
+            rng = random.Random(0)
+            visited: list[tuple[int, float, list[int]]] = []
+            for _ in range(steps):
+                if state.is_terminal() or (not state.is_root() and rng.random() < 0.48):
+                    state.undo()
+                else:
+                    state.make(rng.choice(state.actions()))
+                visited.append((state.id(), state.heuristic_value(), [] if state.is_terminal() else state.child_ids()))
+            return visited
+        plain = SyntheticGraph(**parameters)
+        expected = walk(plain, 3000)
+        state = SyntheticGraph(max_live_nodes=300, **parameters)
+        self.assertEqual(walk(state, 3000), expected)
+        budget = state.budget()
+        assert budget is not None
+        self.assertGreater(budget.evicted_nodes, 0)
+        self.assertLessEqual(budget.live_nodes, 300)
+        # forks share the budget, and eviction counts the states of all of them
+        forked = state.fork()
+        self.assertEqual(walk(forked, 3000), walk(plain.fork(), 3000))
+        self.assertLessEqual(budget.live_nodes, 300)
+        self.assertEqual(state.budget(), budget)
+        self.assertEqual(budget.live_nodes, budget.recount())
+        del forked
+        state.set_root(state.id())
+        self.assertEqual(state.budget(), budget)
+        self.assertEqual(budget.live_nodes, 1)
+        # states the cursor owns are released when the root is set, without waiting for a recount
+        state = SyntheticGraph(max_live_nodes=300, **parameters)
+        walk(state, 3000)
+        assert state.globals.budget is not None
+        self.assertGreater(state.globals.budget.live_nodes, 1)
+        state.set_root(state.id())
+        self.assertEqual(state.globals.budget.live_nodes, 1)
+        self.assertIsNone(SyntheticGraph().budget())
+        with self.assertRaises(BudgetExceeded) as context:
+            walk(SyntheticGraph(max_bytes=20 * APPROXIMATE_NODE_BYTES, **parameters), 3000)
+        self.assertEqual(context.exception.stats.node_limit, 20)
+        with self.assertRaises(BudgetExceeded) as context:
+            walk(SyntheticGraph(max_expansions=100, **parameters), 3000)
+        self.assertEqual(context.exception.stats.expansions, 100)
+        with self.assertRaises(ValueError):
+            SyntheticGraph(max_live_nodes=0)
+
+    def test_hooks(self):
+        """Hooks should see every make, undo, leaf and expansion of a search, and aggregate
+        into the same counts a wrapper around the graph would."""
+        def dfs(state: SyntheticGraph, depth: int, counts: dict[str, defaultdict[int, int]]):
+            if depth == 0 or state.is_terminal():
+                return
+            counts["expand"][state.depth()] += 1
+            for action in state.actions():
+                state.make(action)
+                counts["make"][state.depth()] += 1
+                if state.is_terminal():
+                    counts["leaf"][state.depth()] += 1
+                dfs(state, depth-1, counts)
+                state.undo()
+                counts["undo"][state.depth()] += 1
+        parameters: dict[str, Any] = dict(branching_factor_base=3, branching_factor_variance=1, terminal_chance=0.2, max_depth=6)
+        expected: dict[str, defaultdict[int, int]] = {event: defaultdict(int) for event in ("expand", "make", "undo", "leaf")}
+        dfs(SyntheticGraph(**parameters), 5, expected)
+        state = SyntheticGraph(**parameters)
+        counts: dict[str, defaultdict[int, int]] = {event: defaultdict(int) for event in ("make", "undo", "leaf")}
+        actions: list[int] = []
+        state.on("make", lambda view, action: (counts["make"].__setitem__(view.depth, counts["make"][view.depth] + 1), actions.append(action)))
+        undo = state.on("undo", lambda view: counts["undo"].__setitem__(view.depth, counts["undo"][view.depth] + 1))
+        state.on("leaf", lambda view: counts["leaf"].__setitem__(view.depth, counts["leaf"][view.depth] + 1))
+        histogram = hooks.DepthHistogram(state, max_branching_factor=3)
+        dfs(state, 5, {event: defaultdict(int) for event in expected})
+        for event in ("make", "undo", "leaf"):
+            self.assertEqual(counts[event], expected[event])
+        self.assertEqual(histogram.visits.tolist(), [expected["make"][depth] for depth in range(7)])
+        self.assertEqual(histogram.leaves.tolist(), [expected["leaf"][depth] for depth in range(7)])
+        # undo releases the children of the state returned to, which are then generated again
+        self.assertTrue(all(histogram.expansions[depth] >= expected["expand"][depth] for depth in range(5)))
+        self.assertTrue(np.all((histogram.mean_branching_factors()[:5] >= 2) & (histogram.mean_branching_factors()[:5] <= 3)))
+        state.off("undo", undo)
+        histogram.detach()
+        state.goto([0, 0])
+        self.assertEqual(histogram.visits.sum(), sum(expected["make"].values()))
+        self.assertEqual(actions[-2:], [0, 0])
+        with self.assertRaises(ValueError):
+            state.on("visit", print)
+        with self.assertRaises(ValueError):
+            state.off("undo", undo)
+        # callbacks calling back into the graph keep their view, even with StateView behavior functions
+        @state_view_function
+        def heuristic_value_function(view: StateView) -> float:
+            return view.rng.next_float(-1, 1)
+        state = SyntheticGraph(heuristic_value_function=heuristic_value_function, max_depth=6)
+        depths: list[tuple[int, int]] = []
+        def make(view: StateView, action: int) -> None:
+            depth = view.depth
+            state.child_heuristics()
+            depths.append((depth, view.depth))
+        state.on("make", make)
+        while not state.is_terminal():
+            state.make(0)
+        self.assertEqual(depths, [(depth, depth) for depth in range(1, 7)])
+        # also when the callback fires nested events, and views are reused rather than allocated per event
+        state = SyntheticGraph(max_depth=6)
+        self.assertFalse(state.globals.hooks.active)
+        views: list[int] = []
+        def nested(view: StateView, action: int) -> None:
+            depth = view.depth
+            views.append(id(view))
+            if depth == 1:
+                state.make(0).undo()
+            depths.append((depth, view.depth))
+        state.on("make", nested)
+        undo = state.on("undo", lambda view: views.append(id(view)))
+        self.assertTrue(state.globals.hooks.active)
+        depths.clear()
+        state.make(0)
+        state.undo()
+        state.make(1)
+        self.assertEqual(depths, [(2, 2), (1, 1), (2, 2), (1, 1)])
+        self.assertEqual(len(set(views)), 2) # one view per level of nesting
+        state.off("make", nested)
+        state.off("undo", undo)
+        self.assertFalse(state.globals.hooks.active)
+
+    def test_state_view_functions(self):
+        """Behavior functions taking a StateView should produce the same graph as ones taking
+        randint, randf and StateParams, and both conventions can be mixed."""
+        def plain(function: Any) -> Any:
+            return lambda *args: function(*args) # hides the StateView version of a default function
+        @state_view_function
+        def branching_function(view: StateView) -> int:
+            return 1 + view.rng.next_int(0, 3) if view.transposition_space_size > 1 else 0
+        def branching_function_plain(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
+            return 1 + randint(0, 3) if params.self.transposition_space_size > 1 else 0
+        all_plain: dict[str, Any] = dict(
+            branching_function=plain(default_branching_function),
+            child_true_value_function=plain(default_child_true_value_function),
+            child_depth_function=plain(default_child_depth_function),
+            heuristic_value_function=plain(default_heuristic_value_function))
+        parameters: dict[str, Any] = dict(seed=4, max_depth=8, branching_factor_variance=2, terminal_chance=0.2, child_depth_maximum=2)
+        for views, plains in [({}, all_plain),
+                              (dict(branching_function=branching_function, child_depth_function=plain(default_child_depth_function)),
+                               dict(all_plain, branching_function=branching_function_plain))]:
+            expected: dict[int, tuple[float, list[int]]] = {}
+            _collect_subtree(SyntheticGraph(**parameters, **plains), 4, expected)
+            info: dict[int, tuple[float, list[int]]] = {}
+            _collect_subtree(SyntheticGraph(**parameters, **views), 4, info)
+            self.assertEqual(info, expected)
+
+    def test_state_views_per_thread(self):
+        """Cursors moved on different threads share the graph's globals, but not the views
+        their behavior functions are called with."""
+        state = SyntheticGraph(branching_factor_base=4, max_depth=30, child_depth_minumum=0, child_depth_maximum=3)
+        roots = state.child_ids()
+        def walk(slot: int) -> list[float]:
+            cursor, rng = state.fork().set_root(roots[slot % len(roots)]), random.Random(slot)
+            heuristics: list[float] = []
+            for _ in range(50):
+                while not cursor.is_terminal():
+                    heuristics.append(cursor.heuristic_value())
+                    cursor.make(rng.choice(cursor.actions()))
+                cursor.goto([])
+            return heuristics
+        expected = [walk(slot) for slot in range(8)]
+        with ThreadPoolExecutor(8) as executor:
+            self.assertEqual(list(executor.map(walk, range(8))), expected)
+
+    def test_child_heuristics(self):
+        """Evaluating all children at once should give the same values as visiting them."""
+        def heuristic_value_function_uniform(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> float:
+            return randf(-1, 1)
+        def branching_function_late_terminals(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
+            if params.self.depth >= 3 and randf() < 0.4:
+                return 0
+            return randint(2, 7)
+        @batch_version(branching_function_late_terminals)
+        def branching_function_late_terminals_batch(
+                randint: BatchRandomIntFunction, randf: BatchRandomFloatFunction, params: BatchStateParams) -> np.ndarray:
+            late = params.self.depth >= 3
+            terminal = late & (randf(where=late) < 0.4)
+            return np.where(terminal, 0, randint(2, 7, where=~terminal))
+        configurations: list[dict[str, Any]] = [
+            {},
+            {"distribution": RandomnessDistribution.GAUSSIAN, "branching_factor_variance": 3},
+            {"terminal_chance": 0.3, "terminal_minimum_depth": 2, "transposition_space_function": lambda *_: 1000},
+            {"heuristic_value_function": heuristic_value_function_uniform, "symmetry_frequency": 0.5, "symmetry_factor": 0.5},
+            {"branching_function": branching_function_late_terminals},
+        ]
+        for configuration in configurations:
+            state = SyntheticGraph(seed=next(seeds), max_depth=12, branching_factor_base=6, **configuration)
+            while not state.is_terminal():
+                child_heuristics = state.child_heuristics()
+                self.assertFalse(any(child.children for child in state._current.children))
+                state_id = state.id()
+                visited = SyntheticGraph(seed=state.globals.vars.seed, max_depth=12, branching_factor_base=6, **configuration)
+                visited.goto(state.path())
+                expected: list[float] = []
+                for action in visited.actions():
+                    visited.make(action)
+                    expected.append(visited.heuristic_value())
+                    visited.undo()
+                self.assertEqual(child_heuristics, expected)
+                self.assertEqual(state.id(), state_id)
+                state.make_random()
+        branching_function_late_terminals.batch = lambda randint, randf, params: np.zeros(1, dtype=np.int64) # type: ignore
+        self.assertRaises(ValueError, SyntheticGraph(branching_function=branching_function_late_terminals).child_heuristics)
+
+    def test_ordered_actions(self):
+        state = SyntheticGraph(branching_factor_base=10)
+        for _ in range(4):
+            heuristics = state.child_heuristics()
+            ordered = state.ordered_actions()
+            self.assertEqual(sorted(ordered), state.actions())
+            ordered_heuristics = [heuristics[action] for action in ordered]
+            self.assertEqual(ordered_heuristics, sorted(heuristics, reverse=state.player() == Player.MAX))
+            self.assertEqual(state.ordered_actions(descending=False), sorted(ordered, key=heuristics.__getitem__))
+            state.make(ordered[0])
+
+    def test_pickle(self):
+        """Pickled graphs should resume from the same position."""
+        state = SyntheticGraph(seed=7, branching_factor_base=5, max_depth=40)
+        for _ in range(10):
+            state.make_random()
+        state.set_root(state.id())
+        for _ in range(5):
+            state.make_random()
+        restored: SyntheticGraph = pickle.loads(pickle.dumps(state))
+        self.assertEqual(restored.id(), state.id())
+        self.assertEqual(restored.path(), state.path())
+        self.assertEqual(restored._root.id, state._root.id)
+        restored.make_random()
+        state.make_random()
+        self.assertEqual(restored.id(), state.id())
+
     def test_set_terminal_root(self):
         """Take random walk until we reach terminal node, set it as root 
         and make sure that we can't make any moves or undo. 
@@ -850,5 +1311,740 @@ class TestSyntheticGraph(unittest.TestCase):
         self.assertRaises(TerminalHasNoChildren, lambda: state2.make_random())
 
 
+
+def _collect_subtree(state: SyntheticGraph, depth: int, info: dict[int, tuple[float, list[int]]]):
+    """Record heuristic values and child ids of every state up to `depth` plies below."""
+    children: list[int] = []
+    for action in state.actions():
+        state.make(action)
+        children.append(state.id())
+        if depth > 1:
+            _collect_subtree(state, depth-1, info)
+        state.undo()
+    info[state.id()] = (state.heuristic_value(), children)
+
+_worker_cache: SharedExpansionCache|None = None
+def _init_cache_worker(cache: SharedExpansionCache):
+    global _worker_cache
+    _worker_cache = cache
+
+def _expand_with_worker_cache(seed: int) -> dict[int, tuple[float, list[int]]]:
+    assert _worker_cache is not None
+    info: dict[int, tuple[float, list[int]]] = {}
+    _collect_subtree(SyntheticGraph(seed=seed, branching_factor_base=3, expansion_caches=[_worker_cache]), 4, info)
+    return info
+
+
+class TestExpansionCaches(unittest.TestCase):
+
+    def test_shared_cache_reproduces_expansions(self):
+        """States loaded from the cache should behave exactly like generated ones."""
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(branching_factor_base=3, symmetry_frequency=0.5, symmetry_factor=0.5), 4, expected)
+        with SharedExpansionCache(capacity=1024, arena_capacity=4096) as cache:
+            for _ in range(2):
+                info: dict[int, tuple[float, list[int]]] = {}
+                state = SyntheticGraph(branching_factor_base=3, symmetry_frequency=0.5, 
+                                       symmetry_factor=0.5, expansion_caches=[cache])
+                _collect_subtree(state, 4, info)
+                self.assertEqual(info, expected)
+            self.assertEqual(len(cache), len(expected))
+            # cached states never call the behavior functions
+            state = SyntheticGraph(branching_factor_base=3, symmetry_frequency=0.5, symmetry_factor=0.5,
+                                   expansion_caches=[cache], branching_function=lambda *_: 1/0) # type: ignore
+            state.make(state.actions()[0])
+
+    def test_shared_cache_full(self):
+        with SharedExpansionCache(capacity=4, arena_capacity=100) as cache:
+            state = SyntheticGraph(expansion_caches=[cache])
+            for _ in range(10):
+                state.make_random()
+            self.assertEqual(len(cache), 4)
+    
+    def test_shared_cache_across_processes(self):
+        with SharedExpansionCache(capacity=4096, arena_capacity=8192) as cache:
+            with multiprocessing.Pool(2, initializer=_init_cache_worker, initargs=(cache,)) as pool:
+                results = pool.map(_expand_with_worker_cache, [1, 1, 1, 1])
+            expected: dict[int, tuple[float, list[int]]] = {}
+            _collect_subtree(SyntheticGraph(seed=1, branching_factor_base=3), 4, expected)
+            for result in results:
+                self.assertEqual(result, expected)
+            self.assertEqual(len(cache), len(expected))
+
+    def test_opening_book(self):
+        """States inside the precomputed region should behave exactly like generated ones."""
+        parameters: dict[str, Any] = dict(branching_factor_base=3, max_depth=8, symmetry_frequency=0.5, symmetry_factor=0.5)
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters), 5, expected)
+        info: dict[int, tuple[float, list[int]]] = {}
+        state = SyntheticGraph(precompute_plies=3, **parameters)
+        _collect_subtree(state, 5, info)
+        self.assertEqual(info, expected)
+        book = state.globals.expansion_caches[0]
+        assert isinstance(book, OpeningBook)
+        self.assertEqual(len(book), len({state_id for state_id in expected if book.lookup(state_id) is not None}))
+        self.assertIsNone(book.lookup(0))
+        parallel_book = SyntheticGraph(precompute_plies=3, precompute_workers=2, **parameters).globals.expansion_caches[0]
+        assert isinstance(parallel_book, OpeningBook)
+        for field_name in ["id_hi", "id_lo", "branching_factor", "heuristic_value", "child_offsets", "child_hi", "child_lo"]:
+            self.assertTrue(np.array_equal(getattr(book, field_name), getattr(parallel_book, field_name)))
+        # the book is carried along when pickling, rather than rebuilt
+        self.assertEqual(len(pickle.loads(pickle.dumps(state)).globals.expansion_caches), 1)
+
+    def test_opening_book_walk(self):
+        """Moves within the book should only follow its arrays, and behave exactly like moves
+        between generated states, also when leaving and re-entering the book."""
+        parameters: dict[str, Any] = dict(branching_factor_base=3, max_depth=8, terminal_chance=0.1,
+                                          symmetry_frequency=0.5, symmetry_factor=0.5)
+        plain, state = SyntheticGraph(**parameters), SyntheticGraph(precompute_plies=3, **parameters)
+        rng = random.Random(0)
+        for step in range(2000):
+            self.assertEqual((state.id(), state.depth(), state.player(), state.true_value(), state.is_root(), state.path()),
+                             (plain.id(), plain.depth(), plain.player(), plain.true_value(), plain.is_root(), plain.path()))
+            self.assertEqual((state.is_terminal(), state.heuristic_value(), state.repetition_count()),
+                             (plain.is_terminal(), plain.heuristic_value(), plain.repetition_count()))
+            if state.depth() < 3:
+                self.assertIsNone(state._current) # walking the book, without any states
+            if step % 7 == 0 and not state.is_terminal():
+                self.assertEqual(state.child_ids(), plain.child_ids())
+                self.assertEqual(state.child_heuristics(), plain.child_heuristics())
+                self.assertEqual(state.unique_actions(), plain.unique_actions())
+                self.assertEqual(state.actions(skip_repetitions=True), plain.actions(skip_repetitions=True))
+            if step % 97 == 0:
+                path = plain.path()
+                state, plain = state.fork().goto(path), plain.fork().goto(path)
+            elif not state.is_terminal() and (state.is_root() or rng.random() < 0.6):
+                action = rng.randrange(len(state.actions()))
+                state.make(action)
+                plain.make(action)
+            else:
+                state.undo()
+                plain.undo()
+        # hooks need states to be bound to, so registering one turns the walked path into states
+        state.goto([0, 0])
+        depths: list[int] = []
+        state.on("undo", lambda view: depths.append(view.depth))
+        state.undo()
+        self.assertEqual((depths, state.path()), ([1], [0]))
+        self.assertIsNotNone(state._current)
+
+    def test_node_arena(self):
+        """The arena should serve stored expansions unchanged, through handles and arrays alike."""
+        parameters: dict[str, Any] = dict(branching_factor_base=3, max_depth=8, symmetry_frequency=0.5, symmetry_factor=0.5)
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters), 4, expected)
+        arena = NodeArena(capacity=1) # forces every array to grow
+        for _ in range(2):
+            info: dict[int, tuple[float, list[int]]] = {}
+            _collect_subtree(SyntheticGraph(expansion_caches=[arena], **parameters), 4, info)
+            self.assertEqual(info, expected)
+        self.assertEqual(len(arena), len(expected))
+        self.assertIsNone(arena.lookup(0))
+        state = SyntheticGraph(**parameters)
+        handle = arena.handle(state.id())
+        assert handle is not None
+        self.assertEqual([arena.state_id(child) for child in arena.child_handles(handle)], state.child_ids())
+        self.assertEqual(arena.nodes["branching_factor"][handle], len(state.actions()))
+        state_ids = [arena.state_id(handle) for handle in range(arena.size)]
+        self.assertEqual(arena.true_values().tolist(), [extract_true_value_from_id(state_id) for state_id in state_ids])
+        self.assertEqual(arena.players().tolist(), [extract_player_from_id(state_id).value for state_id in state_ids])
+        self.assertEqual(arena.depths(8).tolist(), [extract_depth_from_id(state_id, 8 .bit_length()) for state_id in state_ids])
+
+    def test_heuristic_recompute(self):
+        """A graph derived with new heuristic parameters should behave as if constructed with
+        them, while reusing the structure in its caches and leaving the original untouched."""
+        parameters: dict[str, Any] = dict(seed=2, branching_factor_base=3, max_depth=8)
+        changes: dict[str, Any] = dict(heuristic_accuracy_base=0.95, heuristic_locality_scaling=0.1)
+        original: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters), 4, original)
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters, **changes), 4, expected)
+        arena = NodeArena()
+        state = SyntheticGraph(precompute_plies=2, expansion_caches=[arena], **parameters)
+        _collect_subtree(state, 3, {})
+        state.goto([1])
+        derived = state.with_heuristic_parameters(**changes)
+        self.assertEqual(derived.path(), [1])
+        self.assertTrue(derived.shares_structure_with(state))
+        self.assertFalse(derived.shares_structure_with(SyntheticGraph(**dict(parameters, seed=3))))
+        self.assertFalse(derived.shares_structure_with(SyntheticGraph(**dict(parameters, root_true_value=1))))
+        self.assertTrue(derived.shares_structure_with(SyntheticGraph(**dict(parameters, max_live_nodes=100))))
+        # every parameter either affects the graph through some attribute, or does not affect it at all
+        unaffecting = {"expansion_caches", "precompute_plies", "precompute_workers", "max_live_nodes", "max_bytes",
+                       "max_expansions", "timeline"}
+        self.assertEqual(set(inspect.signature(SyntheticGraph).parameters) - unaffecting,
+                         set().union(*ATTRIBUTE_DEPENDENCIES.values()))
+        self.assertEqual([type(cache) for cache in derived.globals.expansion_caches], [OpeningBook, NodeArena])
+        derived.goto([])
+        for graph, subtree in [(derived, expected), (state.goto([]), original)]:
+            info: dict[int, tuple[float, list[int]]] = {}
+            _collect_subtree(graph, 4, info)
+            self.assertEqual(info, subtree)
+        state_ids = list(expected)
+        branching_factors, heuristic_values = derived.evaluate(state_ids, batch_size=7)
+        self.assertEqual(heuristic_values.tolist(), [expected[state_id][0] for state_id in state_ids])
+        self.assertEqual(branching_factors.tolist(), [len(expected[state_id][1]) for state_id in state_ids])
+        with self.assertRaises(ValueError):
+            state.with_heuristic_parameters(max_depth=9)
+        with self.assertRaises(ValueError):
+            arena.recompute_heuristics(SyntheticGraph(**dict(parameters, branching_factor_base=4)))
+
+
+
+class TestMCTS(unittest.TestCase):
+
+    def _p_game(self) -> SyntheticGraph:
+        return SyntheticGraph(
+            max_depth=8, 
+            branching_factor_base=6, 
+            branching_factor_variance=2,
+            true_value_forced_ratio=0.001, 
+            true_value_tie_chance=0)
+
+    def test_reproducibility(self):
+        state = self._p_game()
+        for parallelization, workers in [(mcts.Parallelization.NONE, 1), 
+                                         (mcts.Parallelization.TREE, 3), 
+                                         (mcts.Parallelization.ROOT, 2)]:
+            result1 = mcts.search(state, 60, parallelization, workers, seed=5)
+            result2 = mcts.search(state, 60, parallelization, workers, seed=5)
+            self.assertEqual(result1.action_visits, result2.action_visits)
+            self.assertEqual(result1.action_values, result2.action_values)
+            self.assertEqual(result1.tree_size, result2.tree_size)
+            self.assertEqual(sum(result1.action_visits.values()), 60)
+            self.assertIn(result1.best_action, state.actions())
+            self.assertTrue(state.is_root())
+
+    def test_finds_forced_win(self):
+        """With enough playouts, the search should pick a winning move in a won position."""
+        state = SyntheticGraph(max_depth=3, branching_factor_base=4, root_true_value=1,
+                               true_value_forced_ratio=0.25, true_value_tie_chance=0, 
+                               true_value_similarity_chance=0)
+        result = mcts.search(state, 400, mcts.Parallelization.TREE, 2)
+        state.make(result.best_action)
+        self.assertEqual(state.true_value(), 1)
+
+    def test_terminal_root(self):
+        state = SyntheticGraph(max_depth=1)
+        state.make_random()
+        self.assertRaises(ValueError, lambda: mcts.search(state, 10))
+
+    def test_unvisited_parent(self):
+        """Without virtual loss, a new state whose children were all visited through other
+        parents has no visits itself, which must not break the UCT score."""
+        search = mcts.UCTSearch(self._p_game(), virtual_loss=0)
+        parent = mcts.MCTSNode(player=Player.MAX, terminal=False, edges=[])
+        child = mcts.MCTSNode(player=Player.MIN, terminal=False, edges=[], visits=2, value_sum=1.0)
+        self.assertEqual(search._score(parent, child), 0.5)
+
+
+
+class TestAlphaBeta(unittest.TestCase):
+
+    def test_solvers_find_true_value(self):
+        for seed in range(3):
+            state = SyntheticGraph(seed=seed, max_depth=6, branching_factor_base=4, branching_factor_variance=2,
+                                   root_true_value=seed - 1, symmetry_frequency=0.3, symmetry_factor=0.5)
+            state.make_random()
+            report = alphabeta.compare(state, workers=2, split_plies=2)
+            self.assertEqual(report.serial.value, state.true_value())
+            self.assertEqual(report.parallel.value, state.true_value())
+            self.assertEqual(alphabeta.alphabeta(state, order_moves=False).value, state.true_value())
+            self.assertGreater(report.parallel.nodes, 0)
+            self.assertEqual(state.depth(), 1)
+
+    def test_depth_limited_search(self):
+        state = SyntheticGraph(max_depth=10, branching_factor_base=3)
+        serial = alphabeta.alphabeta(state, depth=3)
+        parallel = alphabeta.parallel_alphabeta(state, depth=3, workers=2)
+        self.assertEqual(serial.value, parallel.value)
+
+
+def _small_tspace_function(randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
+    return int(-44*(depth - 5.9)**2 + 1575)
+
+def _shrinking_branching_function(randint: RandomIntFunction, randf: RandomFloatFunction, params: StateParams) -> int:
+    if params.self.depth >= params.globals.terminal_minimum_depth and randf() < params.globals.terminal_chance:
+        return 0
+    return 9 - params.self.depth
+
+
+class TestRetrograde(unittest.TestCase):
+
+    def small_graph(self, seed: int) -> SyntheticGraph:
+        return SyntheticGraph(
+            seed=seed, max_depth=9, 
+            transposition_space_function=_small_tspace_function,
+            branching_function=_shrinking_branching_function,
+            true_value_forced_ratio=0.5, symmetry_factor=0.25, symmetry_frequency=0.2,
+            terminal_minimum_depth=5, terminal_chance=0.75)
+
+    def test_true_value_consistency(self):
+        for seed in range(3):
+            state = self.small_graph(seed)
+            solution = state.solve_retrograde()
+            self.assertTrue(solution.consistent, f"Inconsistent states: {solution.inconsistent_ids[:10]}")
+            self.assertEqual(solution.value, state.true_value())
+            self.assertTrue(state.is_root())
+
+    def test_enumerates_every_state(self):
+        state = self.small_graph(0)
+        state.make_random()
+        reached: set[int] = set()
+        def visit(state_id: int):
+            if state_id in reached:
+                return
+            reached.add(state_id)
+            state.set_root(state_id)
+            if not state.is_terminal():
+                for child_id in set(state.child_ids()):
+                    visit(child_id)
+        start_id = state.id()
+        solution = retrograde.solve(state)
+        visit(start_id)
+        self.assertEqual(solution.states, len(reached))
+
+    def test_large_transposition_space(self):
+        self.assertRaises(ValueError, lambda: SyntheticGraph().solve_retrograde())
+        self.assertRaises(ValueError, lambda: self.small_graph(0).solve_retrograde(max_level_size=100))
+
+
+def _constant_tspace_function(randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
+    return 50
+
+
+class TestExternalBFS(unittest.TestCase):
+
+    def graph(self) -> SyntheticGraph:
+        return SyntheticGraph(seed=1, max_depth=12, branching_factor_base=3, child_depth_maximum=2,
+                              transposition_space_function=_constant_tspace_function)
+
+    def test_matches_in_memory_bfs(self):
+        state = self.graph()
+        levels: list[list[int]] = [[state.id()]]
+        terminals: list[int] = []
+        seen = {state.id()}
+        while levels[-1]:
+            next_level: set[int] = set()
+            terminals.append(0)
+            for state_id in levels[-1]:
+                state.set_root(state_id)
+                if state.is_terminal():
+                    terminals[-1] += 1
+                else:
+                    next_level.update(set(state.child_ids()) - seen)
+            seen |= next_level
+            levels.append(sorted(next_level))
+        levels.pop()
+        with tempfile.TemporaryDirectory() as directory:
+            bfs = ExternalBFS(self.graph(), directory, memory_limit=20*200) # forces many runs per level
+            bfs.run(max_plies=3)
+            self.assertFalse(bfs.done())
+            bfs = ExternalBFS(self.graph(), directory, memory_limit=20*200) # resume
+            result = bfs.run()
+            self.assertTrue(bfs.done())
+            self.assertEqual([level.states for level in result], [len(level) for level in levels])
+            self.assertEqual([level.terminals for level in result], terminals)
+            for ply, level in enumerate(levels):
+                self.assertEqual(list(bfs.level(ply)), level)
+
+    def test_levels_partitioned_by_depth(self):
+        graph = SyntheticGraph(seed=1, max_depth=6, branching_factor_base=3,
+                               transposition_space_function=_constant_tspace_function)
+        with tempfile.TemporaryDirectory() as directory:
+            levels = ExternalBFS(graph, directory, memory_limit=20*200).run()
+            # every child is one ply deeper, so no level is filtered against an earlier one
+            self.assertEqual([level.depths for level in levels], [[ply] for ply in range(len(levels))])
+        with tempfile.TemporaryDirectory() as directory:
+            levels = ExternalBFS(self.graph(), directory).run()
+            self.assertTrue(any(len(level.depths) > 1 for level in levels))
+
+    def test_different_graph(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ExternalBFS(self.graph(), directory).run(max_plies=1)
+            self.assertRaises(ValueError, lambda: ExternalBFS(SyntheticGraph(seed=2), directory))
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_record_and_replay(self):
+        parameters: dict[str, Any] = dict(seed=2, max_depth=6, branching_factor_base=3, symmetry_frequency=0.3, symmetry_factor=0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.trace")
+            with TraceRecorder(path) as recorder:
+                recorded = alphabeta.alphabeta(SyntheticGraph(expansion_caches=[recorder], **parameters), order_moves=False)
+            self.assertEqual(recorder.divergences, [])
+            replayer = TraceReplayer(path, strict=True)
+            replayed = alphabeta.alphabeta(SyntheticGraph(expansion_caches=[replayer], **parameters), order_moves=False)
+            self.assertEqual((replayed.value, replayed.nodes), (recorded.value, recorded.nodes))
+            self.assertEqual(len(replayer), len(recorder))
+            self.assertGreaterEqual(replayer.hits, len(replayer))
+            verifier = TraceReplayer(path, verify=True)
+            alphabeta.alphabeta(SyntheticGraph(expansion_caches=[verifier], **parameters), order_moves=False)
+            self.assertEqual((verifier.hits, verifier.misses, verifier.divergences), (0, [], []))
+
+    def test_divergence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "walk.trace")
+            with TraceRecorder(path) as recorder:
+                state = SyntheticGraph(expansion_caches=[recorder])
+                for _ in range(10):
+                    state.make(0)
+                self.assertEqual(len(recorder), 10)
+            replayer = TraceReplayer(path)
+            state = SyntheticGraph(expansion_caches=[replayer])
+            state.make(1)
+            self.assertEqual(replayer.misses, [state.id()] if state.is_terminal() else [])
+            state.actions()
+            self.assertEqual(replayer.misses, [state.id()])
+            state = SyntheticGraph(expansion_caches=[TraceReplayer(path, strict=True)])
+            state.make(1)
+            self.assertRaises(TraceDivergence, state.actions)
+            state = SyntheticGraph(expansion_caches=[TraceReplayer(path, strict=True, verify=True)], 
+                                   heuristic_value_function=lambda *_: 0.5) # type: ignore
+            self.assertRaises(TraceDivergence, state.actions)
+            with TraceRecorder(os.path.join(directory, "random.trace")) as recorder:
+                state = SyntheticGraph(expansion_caches=[recorder], heuristic_value_function=lambda *_: random.random()) # type: ignore
+                for _ in range(2):
+                    state.actions()
+                    state.make(0).undo()
+                self.assertEqual(recorder.divergences, [state.id()])
+
+    def test_recorder_without_with(self):
+        """A recorder which is never closed should still leave a complete trace behind."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "walk.trace")
+            recorder = TraceRecorder(path)
+            state = SyntheticGraph(expansion_caches=[recorder])
+            for _ in range(5):
+                state.make(0)
+            expected = list(recorder._recorded)
+            del recorder, state
+            gc.collect()
+            self.assertEqual(read_trace(path)[0], expected)
+
+
+class TestTimeline(unittest.TestCase):
+
+    def test_spans(self):
+        """Recording a timeline should not change the graph, and should nest behavior
+        functions, RNG hashes and cache lookups in the spans of evaluations and expansions."""
+        parameters: dict[str, Any] = dict(seed=4, max_depth=6, branching_factor_base=3, branching_factor_variance=1)
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters), 4, expected)
+        with tempfile.TemporaryDirectory() as directory:
+            timeline = Timeline(os.path.join(directory, "run-{pid}.json"))
+            info: dict[int, tuple[float, list[int]]] = {}
+            state = SyntheticGraph(timeline=timeline, expansion_caches=[NodeArena()], **parameters)
+            _collect_subtree(state, 4, info)
+            state.child_heuristics()
+            self.assertEqual(info, expected)
+            self.assertTrue(estimation.is_analytical(state))
+            timeline.write()
+            with open(timeline.path) as file:
+                events = json.load(file)["traceEvents"]
+            self.assertEqual(timeline.path, os.path.join(directory, f"run-{os.getpid()}.json"))
+            self.assertTrue({"evaluate", "expand", "rng_hash", "branching_function", "NodeArena.lookup"} <= {event["name"] for event in events})
+            self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+            with open(timeline.path + ".folded") as file:
+                stacks = dict(line.rsplit(" ", 1) for line in file.read().splitlines())
+            self.assertIn("expand;child_depth_function;rng_hash", stacks)
+            self.assertIn("evaluate;NodeArena.lookup", stacks)
+            # every fifth evaluation or expansion is recorded
+            sampled = Timeline(os.path.join(directory, "sampled.json"), sample_every=5)
+            _collect_subtree(SyntheticGraph(timeline=sampled, **parameters), 4, {})
+            sampled_top_level = sum(1 for name, _, _, _ in sampled.events if name in ("evaluate", "expand"))
+            self.assertEqual(sampled_top_level, sampled._candidates // 5)
+            sampled.write()
+            self.assertIs(pickle.loads(pickle.dumps(sampled)), Timeline.shared(sampled.path_template, 5))
+
+    def test_threads(self):
+        """Graphs recording to one timeline from several threads should count every evaluation
+        and expansion towards the sampling, and produce the same states as without a timeline."""
+        parameters: dict[str, Any] = dict(seed=4, max_depth=6, branching_factor_base=3)
+        expected: dict[int, tuple[float, list[int]]] = {}
+        _collect_subtree(SyntheticGraph(**parameters), 4, expected)
+        with tempfile.TemporaryDirectory() as directory:
+            single = Timeline(os.path.join(directory, "single.json"), sample_every=3)
+            _collect_subtree(SyntheticGraph(timeline=single, **parameters), 4, {})
+            shared = Timeline(os.path.join(directory, "threads.json"), sample_every=3)
+            def collect(_: int) -> dict[int, tuple[float, list[int]]]:
+                info: dict[int, tuple[float, list[int]]] = {}
+                _collect_subtree(SyntheticGraph(timeline=shared, **parameters), 4, info)
+                return info
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(collect, range(8)))
+            self.assertTrue(all(info == expected for info in results))
+            self.assertEqual(shared._candidates, 8 * single._candidates)
+            self.assertTrue(any(name == "rng_hash" for name, _, _, _ in shared.events))
+            single.write()
+            shared.write()
+
+    def test_environment(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "environment.json")
+            os.environ["SSSG_TIMELINE"] = path
+            try:
+                state = SyntheticGraph()
+            finally:
+                del os.environ["SSSG_TIMELINE"]
+            self.assertIs(state.globals.timeline, Timeline.shared(path))
+            self.assertIsNone(SyntheticGraph().globals.timeline)
+
+
+class TestVerify(unittest.TestCase):
+
+    def write_config(self, directory: str, source: str) -> str:
+        path = os.path.join(directory, "config.py")
+        with open(path, "w") as file:
+            file.write(source)
+        return path
+
+    def test_deterministic_graph(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = self.write_config(directory, 
+                "parameters = dict(seed=3, branching_factor_base=3, symmetry_frequency=0.3, symmetry_factor=0.5)\n")
+            report = verify.verify(config, plies=3, max_states=200, workers=2)
+            self.assertTrue(report.deterministic)
+            self.assertGreater(report.states, 10)
+            self.assertEqual(verify.main(["--config", config, "--plies", "2", "--workers", "1"]), 0)
+
+    def test_stateful_heuristic(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = self.write_config(directory, "\n".join([
+                "calls = 0",
+                "def heuristic_value_function(randint, randf, params):",
+                "    global calls",
+                "    calls += 1",
+                "    return calls / 10**6",
+                "parameters = dict(heuristic_value_function=heuristic_value_function)",
+                ""]))
+            report = verify.verify(config, plies=3, max_states=200, workers=2)
+            self.assertFalse(report.deterministic)
+            assert report.divergence is not None
+            self.assertEqual(report.divergence.function, "heuristic_value_function")
+
+    def test_diagnose_tspace_records(self):
+        """Children differing only in their records should be blamed on the transposition space
+        function if its sizes are inconsistent, and on the locality draw otherwise."""
+        calls: list[int] = []
+        def changing_size(randint: RandomIntFunction, randf: RandomFloatFunction, globals: GlobalVariables, depth: int) -> int:
+            calls.append(depth)
+            return 1000 + len(calls)
+        for function, record, expected in [(default_transposition_space_function, None, "locality_grouping"),
+                                           (lambda *_: 1000, 5000, "transposition_space_function"), # type: ignore
+                                           (changing_size, None, "transposition_space_function")]:
+            graph = SyntheticGraph(seed=1, transposition_space_function=function)
+            root_id, expansion = graph.id(), graph.expansion()
+            graph.make(0)
+            child_record = extract_tspace_record_from_id(
+                graph.id(), graph.globals.vars.max_transposition_space_size.bit_length())
+            changed = graph.encode_id(graph.true_value(), graph.player(), graph.depth(),
+                                      record if record is not None else (child_record + 1) % 1000)
+            found = Expansion(expansion.branching_factor, expansion.heuristic_value, [changed] + expansion.child_ids[1:])
+            self.assertEqual(verify.diagnose(graph, root_id, expansion, found), expected)
+
+
+def _tree_shape(state: SyntheticGraph, nodes: np.ndarray, terminals: np.ndarray, values: np.ndarray):
+    """Count the states of the tree below the current state, per depth."""
+    nodes[state.depth()] += 1
+    values[state.depth(), state.true_value() + 1] += 1
+    if state.is_terminal():
+        terminals[state.depth()] += 1
+        return
+    for action in state.actions():
+        state.make(action)
+        _tree_shape(state, nodes, terminals, values)
+        state.undo()
+
+
+class TestEstimation(unittest.TestCase):
+    PARAMETERS: dict[str, Any] = dict(
+        max_depth=5, branching_factor_base=3, branching_factor_variance=1, terminal_chance=0.2,
+        terminal_minimum_depth=2, symmetry_frequency=0.3, symmetry_factor=0.5, child_depth_maximum=2,
+        true_value_forced_ratio=0.4, root_true_value=1)
+
+    def test_analytical(self):
+        """The analytical estimate should match the average shape over many seeds."""
+        trials = 300
+        nodes, terminals, values = np.zeros(6), np.zeros(6), np.zeros((6, 3))
+        for seed in range(trials):
+            _tree_shape(SyntheticGraph(seed=seed, **self.PARAMETERS), nodes, terminals, values)
+        estimate = SyntheticGraph(**self.PARAMETERS).estimate_shape()
+        self.assertEqual(estimate.method, "analytical")
+        self.assertEqual(estimate.expansions, 0)
+        for shape in estimate.depths:
+            self.assertAlmostEqual(shape.nodes, nodes[shape.depth] / trials, delta=0.05 * shape.nodes)
+            self.assertAlmostEqual(shape.terminal_fraction, terminals[shape.depth] / nodes[shape.depth], delta=0.03)
+            for value in [-1, 0, 1]:
+                self.assertAlmostEqual(shape.value_fractions[value], values[shape.depth, value + 1] / nodes[shape.depth], delta=0.05)
+
+    def test_probing(self):
+        """Random probes should estimate the shape of the particular graph, which is exact
+        when the branching factor is constant."""
+        state = SyntheticGraph(seed=7, **self.PARAMETERS)
+        nodes = np.zeros(6)
+        _tree_shape(state, nodes, np.zeros(6), np.zeros((6, 3)))
+        estimate = estimation.estimate_shape(state, probes=2000, method="probing")
+        self.assertEqual(estimate.method, "probing")
+        for shape in estimate.depths:
+            self.assertLessEqual(shape.nodes_interval[0], nodes[shape.depth])
+            self.assertLessEqual(nodes[shape.depth], shape.nodes_interval[1])
+        constant = SyntheticGraph(max_depth=6, branching_function=lambda *_: 3) # type: ignore
+        estimate = constant.estimate_shape(probes=10)
+        self.assertEqual(estimate.method, "probing")
+        self.assertEqual([shape.nodes for shape in estimate.depths], [3.0**depth for depth in range(7)])
+        self.assertEqual(estimate.depths[-1].terminal_fraction, 1.0)
+
+
+
+class TestModels(unittest.TestCase):
+
+    def test_alias_sampler(self):
+        rng = random.Random(5)
+        for buckets in [1, 2, 7, 1000]:
+            histogram = {value: rng.randint(0, 50) for value in range(buckets)}
+            histogram[0] += 1
+            sampler = models.AliasSampler(histogram)
+            total = sum(histogram.values())
+            distribution = sampler.distribution()
+            for value, count in histogram.items():
+                self.assertAlmostEqual(distribution.get(value, 0.0), count / total)
+            self.assertTrue(all(histogram[sampler.sample(rng.random())] > 0 for _ in range(100)))
+        self.assertRaises(ValueError, models.AliasSampler, {3: 0})
+        self.assertRaises(ValueError, models.AliasSampler, {3: -1, 4: 2})
+
+    def test_empirical_functions(self):
+        """The scalar, StateView and batch versions should build the same graph, following the tables."""
+        branching_function = models.EmpiricalBranchingFunction({0: {3: 1}, 2: {0: 2, 2: 3, 5: 5}, 4: {0: 1, 1: 1}})
+        transposition_space_function = models.TableTranspositionSpaceFunction({0: 1, 1: None, 3: 40})
+        parameters: dict[str, Any] = dict(max_depth=12, branching_function=branching_function,
+                                          transposition_space_function=transposition_space_function)
+        state = SyntheticGraph(seed=3, **parameters)
+        self.assertEqual([state.transposition_space_size(depth) for depth in range(6)],
+                         [1, state.globals.vars.max_transposition_space_size, state.globals.vars.max_transposition_space_size, 40, 40, 40])
+        plain = SyntheticGraph(seed=3, **dict(parameters, branching_function=lambda *args: branching_function(*args)))
+        branching_factors: dict[int, set[int]] = defaultdict(set)
+        rng = random.Random(0)
+        for _ in range(200):
+            if state.is_terminal():
+                state.goto([])
+                plain.goto([])
+                continue
+            self.assertEqual(state.child_heuristics(), plain.child_heuristics())
+            for child, plain_child in zip(state._current.children, plain._current.children):
+                self.assertEqual(child.branching_factor(), plain_child.branching_factor())
+                branching_factors[min(child.depth, 4)].add(child.branching_factor())
+            action = rng.choice(state.actions())
+            state.make(action)
+            plain.make(action)
+        self.assertEqual(branching_factors[1], {3})
+        self.assertEqual(branching_factors[2], {0, 2, 5})
+        self.assertEqual(branching_factors[4], {0, 1})
+        # the functions are picklable, so graphs using them are too
+        self.assertEqual(pickle.loads(pickle.dumps(state)).expansion(), state.expansion())
+
+
+class TestExperiments(unittest.TestCase):
+
+    def test_run_and_resume(self):
+        solver = functools.partial(alphabeta.alphabeta, depth=3)
+        grid: dict[str, list[Any]] = {"branching_factor_base": [2, 3], "max_depth": [6]}
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in ["jsonl", "csv"]:
+                output = os.path.join(directory, f"sweep.{extension}")
+                records = experiments.run(grid, solver, seeds=[0, 1], workers=2, output=output)
+                self.assertEqual(len(records), 4)
+                for record in records:
+                    self.assertIsNone(record.error)
+                    expected = solver(SyntheticGraph(seed=record.seed, **record.parameters))
+                    self.assertEqual((record.value, record.nodes), (expected.value, expected.nodes))
+                    self.assertGreater(record.peak_memory, 0)
+                    self.assertGreater(record.nodes_per_second, 0) # type: ignore
+                self.assertEqual(sorted(record.key() for record in experiments.read_records(output)),
+                                 sorted(record.key() for record in records))
+                # finished runs are skipped, new seeds and failed runs are not
+                self.assertEqual(experiments.run(grid, solver, seeds=[0, 1], workers=2, output=output), [])
+                records = experiments.run([{"branching_factor_base": 3, "max_depth": 6}, {"max_depth": -1}],
+                                          solver, seeds=[1, 2], workers=2, output=output)
+                self.assertEqual(sorted((record.seed, record.error is None) for record in records),
+                                 [(1, False), (2, False), (2, True)])
+                self.assertEqual(len(experiments.read_records(output)), 7)
+        self.assertNotEqual(experiments.fingerprint({"max_depth": 6}), experiments.fingerprint({"max_depth": 7}))
+        self.assertEqual(experiments.fingerprint({"a": 1, "b": mcts.search}), experiments.fingerprint({"b": mcts.search, "a": 1}))
+
+    def test_describe_functions(self):
+        """Functions sharing a name should be told apart by their code, and described the same
+        way in every process."""
+        first, second = (lambda x: x + 1), (lambda x: x + 2) # type: ignore
+        self.assertNotEqual(experiments.describe(first), experiments.describe(second))
+        self.assertEqual(experiments.describe(first), experiments.describe(lambda x: x + 1)) # type: ignore
+        source = "\n".join([
+            "from sssg import experiments",
+            "def named(name):",
+            "    return name in {'alpha', 'beta', 'gamma', 'delta'} and (lambda: name)",
+            "print(experiments.describe(named))"])
+        descriptions = {subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, check=True,
+                                       env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout for seed in range(4)}
+        self.assertEqual(len(descriptions), 1)
+
+
+class TestAsyncCursor(unittest.TestCase):
+
+    def _play(self, state: SyntheticGraph, seed: int) -> tuple[list[int], list[float]]:
+        rng = random.Random(seed)
+        heuristics: list[float] = []
+        while not state.is_terminal():
+            heuristics.append(state.heuristic_value())
+            state.make(rng.choice(state.actions()))
+        return state.path(), heuristics
+
+    async def _play_async(self, cursor: AsyncCursor, seed: int) -> tuple[list[int], list[float]]:
+        rng = random.Random(seed)
+        heuristics: list[float] = []
+        while not await cursor.is_terminal():
+            heuristics.append(await cursor.heuristic())
+            cursor.make(rng.choice(await cursor.actions()))
+        return cursor.path(), heuristics
+
+    def test_batched_games(self):
+        """Concurrent games should be identical to games played one at a time, while their
+        expansions are gathered into batches."""
+        parameters: dict[str, Any] = dict(
+            branching_factor_base=4, branching_factor_variance=2, max_depth=10, terminal_chance=0.05, terminal_minimum_depth=3)
+        expected = [self._play(SyntheticGraph(**parameters), seed) for seed in range(50)]
+        for max_batch_size, max_wait in [(256, 0.0), (16, 0.0), (64, 0.001)]:
+            scheduler = ExpansionScheduler(max_batch_size=max_batch_size, max_wait=max_wait)
+            state = SyntheticGraph(**parameters)
+            async def games() -> list[tuple[list[int], list[float]]]:
+                return await asyncio.gather(*(self._play_async(AsyncCursor(state, scheduler), seed) for seed in range(50)))
+            self.assertEqual(asyncio.run(games()), expected)
+            stats = scheduler.stats()
+            self.assertEqual(stats.batch_sizes.sum(), stats.batches)
+            self.assertEqual(stats.latencies.sum(), stats.requests)
+            self.assertGreater(stats.mean_batch_size(), 2)
+            self.assertLessEqual(stats.mean_batch_size(), max_batch_size)
+            self.assertGreater(stats.latency_percentile(99), 0)
+        self.assertEqual(state.path(), []) # cursors move forks
+
+    def test_child_heuristics(self):
+        state = SyntheticGraph(branching_factor_base=5)
+        async def evaluate() -> list[float]:
+            return await AsyncCursor(state, ExpansionScheduler()).child_heuristics()
+        self.assertEqual(asyncio.run(evaluate()), SyntheticGraph(branching_factor_base=5).child_heuristics())
+
+    def test_process_backend(self):
+        parameters: dict[str, Any] = dict(branching_factor_base=3, max_depth=6)
+        expected = [self._play(SyntheticGraph(**parameters), seed) for seed in range(10)]
+        backend = ProcessBackend(SyntheticGraph(**parameters), workers=2, chunk_size=4)
+        try:
+            scheduler = ExpansionScheduler(backend)
+            state = SyntheticGraph(**parameters)
+            async def games() -> list[tuple[list[int], list[float]]]:
+                return await asyncio.gather(*(self._play_async(AsyncCursor(state, scheduler), seed) for seed in range(10)))
+            self.assertEqual(asyncio.run(games()), expected)
+        finally:
+            backend.close()
+
 if __name__ == '__main__':
     unittest.main()